@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+FILE:  api_server.py
+
+DESCRIPTION:  Stand-in for the OpenVDM PHP API.  Implements the api/...
+    endpoints used by server/lib/openvdm.py, backed by a fixture file (see
+    tree_generator.py) instead of the OpenVDM database, so the workers can be
+    run and timed without the web application.  Status changes, gearman job
+    tracking and messages are kept in memory.
+
+USAGE: api_server.py [--host <host>] [--port <port>] <fixture>
+
+     BUGS:
+    NOTES: Not a replacement for the PHP API, only the responses consumed by
+           the python workers are implemented.
+   AUTHOR:  Webb Pinner
+  COMPANY:  Capable Solutions
+  VERSION:  2.5
+  CREATED:  2021-06-01
+ REVISION:  2021-06-01
+
+LICENSE INFO: Open Vessel Data Management v2.5 (OpenVDMv2)
+Copyright (C) OceanDataRat.org 2021
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>.
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import datetime
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from os.path import dirname, realpath
+
+sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
+
+from server.lib.read_config import read_config
+
+# same as DEFAULT_CRUISE_CONFIG_FN in server/lib/openvdm.py, not imported so
+# the harness can point OPENVDM_CONFIG_FILE at its own configuration before
+# the OpenVDM class is loaded
+CRUISE_CONFIG_FN = 'ovdmConfig.json'
+
+STATUS_RUNNING = '1'
+STATUS_IDLE = '2'
+STATUS_ERROR = '3'
+
+# fixture list --> id field
+FIXTURE_LISTS = {
+    'collectionSystemTransfers': 'collectionSystemTransferID',
+    'cruiseDataTransfers': 'cruiseDataTransferID',
+    'extraDirectories': 'extraDirectoryID',
+    'shipToShoreTransfers': 'shipToShoreTransferID',
+    'tasks': 'taskID'
+}
+
+
+def _to_api_value(value):
+    """
+    Return the value the way the PHP API returns database columns
+    """
+
+    if value is None:
+        return None
+
+    if isinstance(value, bool):
+        return '1' if value else '0'
+
+    return str(value)
+
+
+class APIStandIn():
+    """
+    In-memory OpenVDM API state loaded from a fixture file
+    """
+
+    def __init__(self, fixture):
+
+        self.lock = threading.Lock()
+        self.warehouse = dict(fixture['warehouse'])
+        self.core_vars = dict(fixture['coreVars'])
+
+        self.lists = {}
+        for list_name, id_field in FIXTURE_LISTS.items():
+            self.lists[list_name] = []
+            for idx, record in enumerate(fixture.get(list_name) or [], start=1):
+                record = {key: _to_api_value(value) for key, value in record.items()}
+                record.setdefault(id_field, str(idx))
+                record.setdefault('status', STATUS_IDLE)
+                record.setdefault('pid', '0')
+                self.lists[list_name].append(record)
+
+        self.jobs = []
+        self.messages = []
+        self.request_counts = Counter()
+
+
+    def _records(self, list_name, **filters):
+        return [record for record in self.lists[list_name] if all(record.get(key) == value for key, value in filters.items())]
+
+
+    def _record(self, list_name, record_id, **filters):
+        return self._records(list_name, **{FIXTURE_LISTS[list_name]: record_id}, **filters)
+
+
+    def _set_status(self, list_name, record_id, status, pid=None):
+        for record in self._record(list_name, record_id):
+            record['status'] = status
+            record['pid'] = str(pid) if pid is not None else '0'
+
+
+    def _show_lowering_components(self):
+        return self.core_vars.get('showLoweringComponents') == 'Yes'
+
+
+    def _lowerings(self):
+        lowering_base_dir = os.path.join(self.warehouse['shipboardDataWarehouseBaseDir'], self.core_vars['cruiseID'], self.warehouse['loweringDataBaseDir'])
+
+        try:
+            return sorted(entry.name for entry in os.scandir(lowering_base_dir) if entry.is_dir())
+        except OSError:
+            return []
+
+
+    def _cruises(self):
+        base_dir = self.warehouse['shipboardDataWarehouseBaseDir']
+
+        try:
+            return sorted(entry.name for entry in os.scandir(base_dir) if os.path.isfile(os.path.join(entry.path, CRUISE_CONFIG_FN)))
+        except OSError:
+            return []
+
+
+    def _cruise_config(self):
+        config = {
+            'cruiseID': self.core_vars['cruiseID'],
+            'cruiseStartDate': self.core_vars['cruiseStartDate'],
+            'cruiseEndDate': self.core_vars['cruiseEndDate'],
+            'warehouseConfig': self.warehouse,
+            'collectionSystemTransfersConfig': self._records('collectionSystemTransfers', cruiseOrLowering='0'),
+            'extraDirectoriesConfig': self.lists['extraDirectories'],
+            'cruiseDataTransfersConfig': self.lists['cruiseDataTransfers'],
+            'shipToShoreTransfersConfig': self.lists['shipToShoreTransfers']
+        }
+
+        if self._show_lowering_components():
+            config['loweringDataBaseDir'] = self.warehouse['loweringDataBaseDir']
+            config['lowerings'] = self._lowerings()
+
+        return config
+
+
+    def _lowering_config(self):
+        return {
+            'loweringID': self.core_vars['loweringID'],
+            'loweringStartDate': self.core_vars['loweringStartDate'],
+            'loweringEndDate': self.core_vars['loweringEndDate'],
+            'collectionSystemTransfersConfig': self._records('collectionSystemTransfers', cruiseOrLowering='1')
+        }
+
+
+    def _apply_operation(self, op, record_id, data):
+        """
+        Apply a status update operation (the single-call endpoints and the
+        operations of api/batch/update)
+        """
+
+        targets = {
+            'Task': 'tasks',
+            'CollectionSystemTransfer': 'collectionSystemTransfers',
+            'CruiseDataTransfer': 'cruiseDataTransfers'
+        }
+
+        for suffix, list_name in targets.items():
+            if op == 'setError' + suffix:
+                self._set_status(list_name, record_id, STATUS_ERROR)
+                return {'status': 'success'}
+            if op == 'setIdle' + suffix:
+                self._set_status(list_name, record_id, STATUS_IDLE)
+                return {'status': 'success'}
+            if op == 'setRunning' + suffix:
+                if 'jobPid' not in data:
+                    return {'status': 'error', 'message': 'missing jobPid'}
+                self._set_status(list_name, record_id, STATUS_RUNNING, data['jobPid'])
+                return {'status': 'success'}
+
+        if op == 'newJob':
+            self.jobs.append({'jobHandle': record_id, 'jobPid': data.get('jobPid'), 'jobName': data.get('jobName', record_id)})
+            return {'status': 'success'}
+
+        if op == 'newMessage':
+            if 'messageTitle' not in data:
+                return {'status': 'error', 'error': 'missing POST data'}
+            self.messages.append({'messageTitle': data['messageTitle'], 'messageBody': data.get('messageBody', ''), 'messageTS': datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")})
+            logging.info("Message: %s: %s", data['messageTitle'], data.get('messageBody', ''))
+            return {'status': 'success'}
+
+        return {'status': 'error', 'message': 'unknown operation: {}'.format(op)}
+
+
+    def handle(self, path, data): # pylint: disable=too-many-return-statements,too-many-branches
+        """
+        Return the response object for the api path (i.e. 'tasks/getTask/1')
+        or None if the endpoint is not implemented
+        """
+
+        controller, _, remainder = path.partition('/')
+        action, _, arg = remainder.partition('/')
+
+        with self.lock:
+            self.request_counts['{}/{}'.format(controller, action)] += 1
+
+            if controller == 'warehouse':
+                if action in ('getCruiseID', 'getCruiseStartDate', 'getCruiseEndDate', 'getLoweringID', 'getLoweringStartDate', 'getLoweringEndDate', 'getSystemStatus', 'getShipToShoreBWLimitStatus', 'getMD5FilesizeLimit', 'getMD5FilesizeLimitStatus'):
+                    key = action[3].lower() + action[4:]
+                    key = key.replace('mD5', 'md5')
+                    return {key: self.core_vars[key]}
+                if action == 'getCruiseSize':
+                    return {'cruiseSize': self.core_vars.get('cruiseSize', 0), 'cruiseSizeUpdated': self.core_vars.get('cruiseSizeUpdated', '')}
+                if action == 'getLoweringSize':
+                    return {'loweringSize': self.core_vars.get('loweringSize', 0), 'loweringSizeUpdated': self.core_vars.get('loweringSizeUpdated', '')}
+                if action in ('setCruiseSize', 'setLoweringSize'):
+                    prefix = 'cruise' if action == 'setCruiseSize' else 'lowering'
+                    self.core_vars[prefix + 'Size'] = data.get('bytes', 0)
+                    self.core_vars[prefix + 'SizeUpdated'] = datetime.datetime.utcnow().strftime("%Y/%m/%d %H:%M:%S")
+                    return {'status': 'success'}
+                if action == 'getShipboardDataWarehouseConfig':
+                    return self.warehouse
+                if action == 'getShowLoweringComponents':
+                    return self._show_lowering_components()
+                if action == 'getCruises':
+                    return self._cruises()
+                if action == 'getLowerings':
+                    return self._lowerings()
+                if action == 'getCruiseConfig':
+                    return self._cruise_config()
+                if action == 'getLoweringConfig':
+                    return self._lowering_config()
+
+            elif controller == 'collectionSystemTransfers':
+                if action == 'getCollectionSystemTransfers':
+                    return self.lists['collectionSystemTransfers']
+                if action == 'getActiveCollectionSystemTransfers':
+                    return self._records('collectionSystemTransfers', enable='1')
+                if action == 'getCollectionSystemTransfer':
+                    return self._record('collectionSystemTransfers', arg)
+
+            elif controller == 'cruiseDataTransfers':
+                if action == 'getCruiseDataTransfers':
+                    return self._records('cruiseDataTransfers', required='0')
+                if action == 'getRequiredCruiseDataTransfers':
+                    return self._records('cruiseDataTransfers', required='1')
+                if action == 'getCruiseDataTransfer':
+                    return self._record('cruiseDataTransfers', arg)
+                if action == 'getRequiredCruiseDataTransfer':
+                    return self._record('cruiseDataTransfers', arg, required='1')
+
+            elif controller == 'extraDirectories':
+                if action == 'getExtraDirectories':
+                    return self._records('extraDirectories', required='0')
+                if action == 'getRequiredExtraDirectories':
+                    return self._records('extraDirectories', required='1')
+                if action == 'getExtraDirectory':
+                    return self._record('extraDirectories', arg)
+                if action == 'getRequiredExtraDirectory':
+                    return self._record('extraDirectories', arg, required='1')
+
+            elif controller == 'shipToShoreTransfers':
+                if action == 'getShipToShoreTransfers':
+                    return self._records('shipToShoreTransfers', required='0')
+                if action == 'getRequiredShipToShoreTransfers':
+                    return self._records('shipToShoreTransfers', required='1')
+                if action == 'getShipToShoreTransfer':
+                    return self._record('shipToShoreTransfers', arg)
+
+            elif controller == 'tasks':
+                if action == 'getTasks':
+                    return self.lists['tasks']
+                if action == 'getActiveTasks':
+                    return self._records('tasks', enable='1')
+                if action == 'getTask':
+                    return self._record('tasks', arg)
+
+            elif controller == 'gearman':
+                if action == 'newJob':
+                    return self._apply_operation('newJob', arg, data)
+                if action == 'clearAllJobsFromDB':
+                    self.jobs = []
+                    return {'status': 'success'}
+
+            elif controller == 'messages':
+                if action == 'newMessage':
+                    return self._apply_operation('newMessage', None, data)
+
+            elif controller == 'batch':
+                if action == 'update':
+                    if 'operations' not in data:
+                        return {'status': 'error', 'message': 'missing POST data'}
+
+                    results = [self._apply_operation(operation.get('op', ''), operation.get('id'), operation.get('data') or {}) for operation in json.loads(data['operations'])]
+                    return {'status': 'success' if all(result['status'] == 'success' for result in results) else 'error', 'results': results}
+
+            if action.startswith('set'):
+                return self._apply_operation(action, arg, data)
+
+        return None
+
+
+    def stats(self):
+        """
+        Return the number of requests made to each endpoint plus the messages
+        sent to the API
+        """
+
+        with self.lock:
+            return {'requests': dict(self.request_counts), 'messages': list(self.messages)}
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes api/... requests to the APIStandIn of the server
+    """
+
+    def _respond(self, data):
+
+        path = urlparse(self.path).path
+        api_path = path.split('api/', 1)[1] if 'api/' in path else None
+
+        response = self.server.api.handle(api_path, data) if api_path else None
+
+        if response is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = json.dumps(response).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """
+        Handle GET requests
+        """
+
+        self._respond({})
+
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """
+        Handle POST requests, the form data is passed to the endpoint
+        """
+
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self._respond({key: values[-1] for key, values in form.items()})
+
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        logging.debug("API: " + format, *args)
+
+
+def start_api_server(fixture_file, host='127.0.0.1', port=0):
+    """
+    Start the stand-in API in a background thread, returns the server.  The
+    site root for the configuration file is server.site_root.
+    """
+
+    server = ThreadingHTTPServer((host, port), APIRequestHandler)
+    server.daemon_threads = True
+    server.api = APIStandIn(read_config(fixture_file))
+    server.site_root = 'http://{}:{}/'.format(host, server.server_address[1])
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    logging.info("Stand-in OpenVDM API listening at %s", server.site_root)
+
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Stand-in OpenVDM API')
+    parser.add_argument('--host', default='127.0.0.1', metavar='host', type=str, help='address to listen on')
+    parser.add_argument('--port', default=8000, metavar='port', type=int, help='port to listen on')
+    parser.add_argument('-v', '--verbosity', dest='verbosity',
+                        default=0, action='count',
+                        help='Increase output verbosity')
+    parser.add_argument('fixture', metavar='fixture', help='fixture file written by tree_generator.py')
+
+    parsed_args = parser.parse_args()
+
+    ############################
+    # Set up logging before we do any other argument parsing (so that we
+    # can log problems with argument parsing).
+
+    LOGGING_FORMAT = '%(asctime)-15s %(levelname)s - %(message)s'
+    logging.basicConfig(format=LOGGING_FORMAT)
+
+    LOG_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+    parsed_args.verbosity = min(parsed_args.verbosity, max(LOG_LEVELS))
+    logging.getLogger().setLevel(LOG_LEVELS[parsed_args.verbosity])
+
+    api_server = ThreadingHTTPServer((parsed_args.host, parsed_args.port), APIRequestHandler)
+    api_server.api = APIStandIn(read_config(parsed_args.fixture))
+
+    print("Site root: http://{}:{}/".format(parsed_args.host, parsed_args.port))
+
+    try:
+        api_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
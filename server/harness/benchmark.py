@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+FILE:  benchmark.py
+
+DESCRIPTION:  Runs OpenVDM worker tasks end-to-end against a synthetic data
+    warehouse and reports how long each job took.  The data warehouse is
+    created by tree_generator.py, the OpenVDM API is replaced by
+    api_server.py and the Gearman server by the in-process job runner, so
+    nothing but python and rsync is required.  Jobs submitted by the tasks
+    (i.e. the updateMD5Summary jobs queued by runCollectionSystemTransfer)
+    are run and timed as well.
+
+USAGE: benchmark.py [--root <dir>] [--systems <n>] [--files <n>]
+                    [--min-size <bytes>] [--max-size <bytes>] [--seed <n>]
+                    [--repeat <n>] [task ...]
+
+ARGUMENTS: task The tasks to run in order, defaults to setting up a cruise,
+            transferring every collection system, rebuilding the MD5 summary
+            and data dashboard and running the cruise data transfers.
+            runCollectionSystemTransfer and testCollectionSystemTransfer are
+            run once per collection system.
+
+     BUGS:
+    NOTES: OPENVDM_CONFIG_FILE is set so the workers read a configuration file
+           pointing at the stand-in API.
+   AUTHOR:  Webb Pinner
+  COMPANY:  Capable Solutions
+  VERSION:  2.5
+  CREATED:  2021-06-01
+ REVISION:  2021-06-01
+
+LICENSE INFO: Open Vessel Data Management v2.5 (OpenVDMv2)
+Copyright (C) OceanDataRat.org 2021
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from os.path import dirname, realpath
+
+sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
+
+from server.lib.read_config import read_config
+from server.harness.api_server import start_api_server
+from server.harness.job_runner import LocalJobRunner, local_gearman
+from server.harness.tree_generator import generate_tree
+
+INSTALL_ROOT = dirname(dirname(dirname(realpath(__file__))))
+
+DEFAULT_TASKS = [
+    'setupNewCruise',
+    'runCollectionSystemTransfer',
+    'rebuildMD5Summary',
+    'rebuildDataDashboard',
+    'runCruiseDataTransfer'
+]
+
+# tasks run once per collection system
+PER_SYSTEM_TASKS = ['runCollectionSystemTransfer', 'testCollectionSystemTransfer']
+
+# tasks run once per cruise data transfer
+PER_CRUISE_DATA_TRANSFER_TASKS = ['runCruiseDataTransfer', 'testCruiseDataTransfer']
+
+# tasks that are given the files of a collection system
+FILE_TASKS = ['updateMD5Summary', 'updateDataDashboard', 'postCollectionSystemTransfer']
+
+
+def write_harness_config(root, site_root):
+    """
+    Write an OpenVDM configuration file based on openvdm.yaml.dist that points
+    at the stand-in API, returns the path to the file
+    """
+
+    with open(os.path.join(INSTALL_ROOT, 'server', 'etc', 'openvdm.yaml.dist'), 'r') as file:
+        config = file.read()
+
+    config = re.sub(r'^siteRoot:.*$', 'siteRoot: "{}"'.format(site_root), config, flags=re.MULTILINE)
+
+    config_file = os.path.join(root, 'openvdm.yaml')
+    with open(config_file, 'w') as file:
+        file.write(config)
+
+    return config_file
+
+
+def build_payloads(task, fixture):
+    """
+    Return the job payloads to submit for the task
+    """
+
+    core_vars = fixture['coreVars']
+    cruise_dir = os.path.join(fixture['warehouse']['shipboardDataWarehouseBaseDir'], core_vars['cruiseID'])
+
+    base = {
+        'cruiseID': core_vars['cruiseID'],
+        'cruiseStartDate': core_vars['cruiseStartDate'],
+        'cruiseEndDate': core_vars['cruiseEndDate'],
+        'loweringID': core_vars['loweringID'],
+        'loweringStartDate': core_vars['loweringStartDate'],
+        'loweringEndDate': core_vars['loweringEndDate'],
+        'systemStatus': core_vars['systemStatus']
+    }
+
+    if task in PER_SYSTEM_TASKS:
+        return [dict(base, collectionSystemTransfer={key: str(value) for key, value in transfer.items()}) for transfer in fixture['collectionSystemTransfers']]
+
+    if task in PER_CRUISE_DATA_TRANSFER_TASKS:
+        return [dict(base, cruiseDataTransfer={'cruiseDataTransferID': str(transfer['cruiseDataTransferID'])}) for transfer in fixture['cruiseDataTransfers']]
+
+    if task in FILE_TASKS:
+        payloads = []
+
+        for transfer in fixture['collectionSystemTransfers']:
+            dest_dir = os.path.join(cruise_dir, transfer['destDir'])
+            files = [os.path.relpath(os.path.join(dirpath, filename), cruise_dir) for dirpath, _, filenames in os.walk(dest_dir) for filename in filenames]
+            payloads.append(dict(base, collectionSystemTransferID=str(transfer['collectionSystemTransferID']), files={'new': files, 'updated': []}))
+
+        return payloads
+
+    return [base]
+
+
+def run_benchmark(root, tasks, repeat):
+    """
+    Run the tasks against the data warehouse in root, returns the runner and
+    the API server
+    """
+
+    fixture_file = os.path.join(root, 'fixture.json')
+    fixture = read_config(fixture_file)
+
+    api_server = start_api_server(fixture_file)
+    os.environ['OPENVDM_CONFIG_FILE'] = write_harness_config(root, api_server.site_root)
+
+    runner = LocalJobRunner()
+
+    with local_gearman(runner) as client_class:
+        client = client_class()
+
+        for _ in range(repeat):
+            for task in tasks:
+                for payload in build_payloads(task, fixture):
+                    client.submit_job(task, json.dumps(payload))
+
+    return runner, api_server
+
+
+def print_report(runner, api_server, elapsed):
+    """
+    Print the job timings and the number of API requests
+    """
+
+    print("{:<36} {:<24} {:>10} {}".format('Task', 'Handle', 'Seconds', 'State'))
+
+    for task, handle, seconds, state in runner.timings():
+        print("{:<36} {:<24} {:>10.3f} {}".format(task, handle, seconds, state))
+
+    stats = api_server.api.stats()
+
+    print("\nAPI requests: {}".format(sum(stats['requests'].values())))
+    for endpoint, count in sorted(stats['requests'].items(), key=lambda item: item[1], reverse=True):
+        print("  {:<60} {:>6}".format(endpoint, count))
+
+    print("\nMessages: {}".format(len(stats['messages'])))
+    for message in stats['messages']:
+        print("  {}: {}".format(message['messageTitle'], message['messageBody']))
+
+    print("\nTotal: {:.3f} seconds".format(elapsed))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Benchmark the OpenVDM workers against a synthetic data warehouse')
+    parser.add_argument('--root', metavar='root', type=str, help='directory for the data warehouse, a temporary directory is used if not specified, an existing data warehouse is re-used')
+    parser.add_argument('--systems', default=3, metavar='systems', type=int, help='number of collection systems')
+    parser.add_argument('--files', default=100, metavar='files', type=int, help='number of files per collection system')
+    parser.add_argument('--min-size', default=1024, metavar='min_size', type=int, help='minimum file size in bytes')
+    parser.add_argument('--max-size', default=65536, metavar='max_size', type=int, help='maximum file size in bytes')
+    parser.add_argument('--seed', default=0, metavar='seed', type=int, help='random seed')
+    parser.add_argument('--repeat', default=1, metavar='repeat', type=int, help='number of times to run the tasks')
+    parser.add_argument('-v', '--verbosity', dest='verbosity',
+                        default=0, action='count',
+                        help='Increase output verbosity')
+    parser.add_argument('tasks', metavar='task', nargs='*', default=DEFAULT_TASKS, help='tasks to run')
+
+    parsed_args = parser.parse_args()
+
+    ############################
+    # Set up logging before we do any other argument parsing (so that we
+    # can log problems with argument parsing).
+
+    LOGGING_FORMAT = '%(asctime)-15s %(levelname)s - %(message)s'
+    logging.basicConfig(format=LOGGING_FORMAT)
+
+    LOG_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+    parsed_args.verbosity = min(parsed_args.verbosity, max(LOG_LEVELS))
+    logging.getLogger().setLevel(LOG_LEVELS[parsed_args.verbosity])
+
+    bench_root = realpath(parsed_args.root) if parsed_args.root else tempfile.mkdtemp(prefix='ovdm_bench_')
+
+    if not os.path.isfile(os.path.join(bench_root, 'fixture.json')):
+        logging.info("Creating synthetic data warehouse in %s", bench_root)
+        generate_tree(bench_root, parsed_args.systems, parsed_args.files, parsed_args.min_size, parsed_args.max_size, seed=parsed_args.seed)
+
+    # the workers expect to be run from the install root
+    os.chdir(INSTALL_ROOT)
+
+    start = time.monotonic()
+    bench_runner, bench_api_server = run_benchmark(bench_root, parsed_args.tasks, parsed_args.repeat)
+    print_report(bench_runner, bench_api_server, time.monotonic() - start)
+
+    bench_api_server.shutdown()
+
+    print("Data warehouse: {}".format(bench_root))
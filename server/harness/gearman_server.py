@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Utilities for running a minimal stand-in Gearman job server so code using
+the real python3_gearman clients can be exercised without gearmand.
+"""
+import time
+import logging
+import threading
+import socketserver
+
+from python3_gearman import protocol
+
+SUBMIT_COMMANDS = [
+    protocol.GEARMAN_COMMAND_SUBMIT_JOB,
+    protocol.GEARMAN_COMMAND_SUBMIT_JOB_HIGH,
+    protocol.GEARMAN_COMMAND_SUBMIT_JOB_LOW
+]
+
+SUBMIT_BG_COMMANDS = [
+    protocol.GEARMAN_COMMAND_SUBMIT_JOB_BG,
+    protocol.GEARMAN_COMMAND_SUBMIT_JOB_HIGH_BG,
+    protocol.GEARMAN_COMMAND_SUBMIT_JOB_LOW_BG
+]
+
+
+class GearmanServerStandIn():
+    """
+    Accepts jobs from python3_gearman clients and answers the status requests
+    of the admin client.  No workers connect, the submitted jobs are completed
+    or failed by calling complete_job/fail_job.
+    """
+
+    def __init__(self):
+
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.handle_count = 0
+
+
+    def submitted(self, task=None):
+        """
+        Return the jobs submitted so far (optionally only those of a task) as
+        a list of dicts with the handle, task, unique, data and whether the
+        job was submitted in the background
+        """
+
+        with self.lock:
+            return [dict(job, handle=handle) for handle, job in self.jobs.items() if task is None or job['task'] == task]
+
+
+    def create_job(self, cmd_args, background, connection):
+        """
+        Record a submitted job, returns the job handle.  The result of a
+        foreground job is sent to connection.
+        """
+
+        with self.lock:
+            self.handle_count += 1
+            handle = 'H:standin:{}'.format(self.handle_count)
+            self.jobs[handle] = {'task': cmd_args['task'], 'unique': cmd_args['unique'], 'data': cmd_args['data'], 'background': background, 'complete': False, 'connection': None if background else connection}
+
+        return handle
+
+
+    def _finish_job(self, handle, cmd_type, cmd_args):
+
+        with self.lock:
+            job = self.jobs[handle]
+            job['complete'] = True
+            connection = job.pop('connection')
+
+        if connection is not None:
+            connection.send_command(cmd_type, cmd_args)
+
+
+    def complete_job(self, handle, data):
+        """
+        Complete the job, the client is sent the result
+        """
+
+        self._finish_job(handle, protocol.GEARMAN_COMMAND_WORK_COMPLETE, {'job_handle': handle, 'data': data})
+
+
+    def fail_job(self, handle):
+        """
+        Fail the job
+        """
+
+        self._finish_job(handle, protocol.GEARMAN_COMMAND_WORK_FAIL, {'job_handle': handle})
+
+
+    def status(self):
+        """
+        Return the admin status lines
+        """
+
+        tasks = {}
+
+        with self.lock:
+            for job in self.jobs.values():
+                if not job['complete']:
+                    tasks[job['task']] = tasks.get(job['task'], 0) + 1
+
+        return ['{}\t{}\t0\t0'.format(task, queued) for task, queued in sorted(tasks.items())]
+
+
+class GearmanConnectionHandler(socketserver.BaseRequestHandler):
+    """
+    Handles a single client connection
+    """
+
+    def setup(self):
+        self.send_lock = threading.Lock()
+
+
+    def send_command(self, cmd_type, cmd_args):
+        """
+        Send a binary response
+        """
+
+        with self.send_lock:
+            self.request.sendall(protocol.pack_binary_command(cmd_type, cmd_args, is_response=True))
+
+
+    def send_text(self, lines):
+        """
+        Send a text (admin) response
+        """
+
+        with self.send_lock:
+            self.request.sendall(''.join(line + '\n' for line in lines).encode('utf-8'))
+
+
+    def handle_binary(self, cmd_type, cmd_args):
+        """
+        Answer a binary request
+        """
+
+        standin = self.server.standin
+
+        if cmd_type in SUBMIT_COMMANDS + SUBMIT_BG_COMMANDS:
+            handle = standin.create_job(cmd_args, cmd_type in SUBMIT_BG_COMMANDS, self)
+            self.send_command(protocol.GEARMAN_COMMAND_JOB_CREATED, {'job_handle': handle})
+
+        elif cmd_type == protocol.GEARMAN_COMMAND_GET_STATUS:
+            job = standin.jobs.get(cmd_args['job_handle'])
+            known = '1' if job is not None and not job['complete'] else '0'
+            self.send_command(protocol.GEARMAN_COMMAND_STATUS_RES, {'job_handle': cmd_args['job_handle'], 'known': known, 'running': '0', 'numerator': '0', 'denominator': '0'})
+
+        elif cmd_type == protocol.GEARMAN_COMMAND_ECHO_REQ:
+            self.send_command(protocol.GEARMAN_COMMAND_ECHO_RES, cmd_args)
+
+        elif cmd_type == protocol.GEARMAN_COMMAND_OPTION_REQ:
+            self.send_command(protocol.GEARMAN_COMMAND_OPTION_RES, cmd_args)
+
+        else:
+            logging.warning("Gearman stand-in ignoring command: %s", protocol.get_command_name(cmd_type))
+
+
+    def handle_text(self, line):
+        """
+        Answer an admin text command
+        """
+
+        if line.strip() == 'status':
+            self.send_text(self.server.standin.status() + ['.'])
+        else:
+            self.send_text(['ERR unknown_command Unknown+server+command'])
+
+
+    def handle(self):
+
+        buf = b''
+
+        while True:
+            try:
+                data = self.request.recv(4096)
+            except OSError:
+                return
+
+            if not data:
+                return
+
+            buf += data
+
+            while len(buf) > 0:
+                if buf.startswith(b'\0'):
+                    cmd_type, cmd_args, cmd_len = protocol.parse_binary_command(buf, is_response=False)
+                    if cmd_len == 0:
+                        break
+
+                    buf = buf[cmd_len:]
+                    self.handle_binary(cmd_type, cmd_args)
+
+                else:
+                    if b'\n' not in buf:
+                        break
+
+                    line, buf = buf.split(b'\n', 1)
+                    self.handle_text(line.decode('utf-8'))
+
+
+class GearmanServer(socketserver.ThreadingTCPServer):
+    """
+    TCP server for the GearmanServerStandIn
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, standin):
+
+        self.standin = standin
+        super().__init__(('127.0.0.1', 0), GearmanConnectionHandler)
+
+
+    @property
+    def address(self):
+        """
+        host:port to pass to the python3_gearman clients
+        """
+
+        return '{}:{}'.format(*self.server_address)
+
+
+def start_gearman_server():
+    """
+    Start a stand-in Gearman server on a free port in a background thread,
+    returns the server.  Call shutdown() to stop it.
+    """
+
+    server = GearmanServer(GearmanServerStandIn())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def wait_for(condition, timeout=5, interval=0.01):
+    """
+    Wait for condition() to return True, returns whether it did within the
+    timeout
+    """
+
+    end_time = time.monotonic() + timeout
+
+    while not condition():
+        if time.monotonic() >= end_time:
+            return False
+
+        time.sleep(interval)
+
+    return True
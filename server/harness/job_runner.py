@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""Utilities for running OpenVDM worker tasks in-process without a Gearman
+server.
+"""
+import time
+import uuid
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+import python3_gearman
+
+# worker module --> {task: task function}
+WORKER_TASKS = {
+    'cruise': {
+        'setupNewCruise': 'task_setup_new_cruise',
+        'finalizeCurrentCruise': 'task_finalize_current_cruise',
+        'exportOVDMConfig': 'task_export_ovdm_config',
+        'rsyncPublicDataToCruiseData': 'task_rsync_publicdata_to_cruise_data'
+    },
+    'cruise_directory': {
+        'createCruiseDirectory': 'task_create_cruise_directory',
+        'setCruiseDataDirectoryPermissions': 'task_set_cruise_data_directory_permissions',
+        'rebuildCruiseDirectory': 'task_rebuild_cruise_directory'
+    },
+    'data_dashboard': {
+        'updateDataDashboard': 'task_update_data_dashboard',
+        'rebuildDataDashboard': 'task_rebuild_data_dashboard'
+    },
+    'lowering': {
+        'setupNewLowering': 'task_setup_new_lowering',
+        'finalizeCurrentLowering': 'task_finalize_current_lowering',
+        'exportLoweringConfig': 'task_export_lowering_config'
+    },
+    'lowering_directory': {
+        'createLoweringDirectory': 'task_create_lowering_directory',
+        'setLoweringDataDirectoryPermissions': 'task_set_lowering_data_directory_permissions',
+        'rebuildLoweringDirectory': 'task_rebuild_lowering_directory'
+    },
+    'md5_summary': {
+        'updateMD5Summary': 'task_update_md5_summary',
+        'rebuildMD5Summary': 'task_rebuild_md5_summary'
+    },
+    'post_hooks': {
+        'postCollectionSystemTransfer': 'task_post_hook',
+        'postDataDashboard': 'task_post_hook',
+        'postSetupNewCruise': 'task_post_hook',
+        'postSetupNewLowering': 'task_post_hook',
+        'postFinalizeCurrentCruise': 'task_post_hook',
+        'postFinalizeCurrentLowering': 'task_post_hook'
+    },
+    'run_collection_system_transfer': {
+        'runCollectionSystemTransfer': 'task_run_collection_system_transfer'
+    },
+    'run_cruise_data_transfer': {
+        'runCruiseDataTransfer': 'task_run_cruise_data_transfer'
+    },
+    'run_ship_to_shore_transfer': {
+        'runShipToShoreTransfer': 'task_run_ship_to_shore_transfer'
+    },
+    'stop_job': {
+        'stopJob': 'task_stop_job'
+    },
+    'test_collection_system_transfer': {
+        'testCollectionSystemTransfer': 'task_test_collection_system_transfer'
+    },
+    'test_cruise_data_transfer': {
+        'testCruiseDataTransfer': 'task_test_cruise_data_transfer'
+    }
+}
+
+
+class LocalJob():
+    """
+    Stand-in for python3_gearman.job.GearmanJob
+    """
+
+    def __init__(self, task, data, unique=None):
+
+        self.handle = 'H:local:{}'.format(uuid.uuid4().hex[:12])
+        self.task = task
+        self.data = data
+        self.unique = unique
+
+
+    def __repr__(self):
+        return '<LocalJob task={!r}, handle={!r}>'.format(self.task, self.handle)
+
+
+class LocalJobRequest():
+    """
+    Stand-in for python3_gearman.job.GearmanJobRequest, also records how long
+    the job took to run
+    """
+
+    def __init__(self, job, background=False):
+
+        self.job = job
+        self.background = background
+
+        self.result = None
+        self.exception = None
+        self.warning_updates = []
+        self.data_updates = []
+        self.status = {'handle': job.handle, 'known': True, 'running': False, 'numerator': 0, 'denominator': 0, 'time_received': None}
+        self.state = python3_gearman.constants.JOB_PENDING
+        self.timed_out = False
+
+        self.started = None
+        self.elapsed = None
+
+
+    @property
+    def complete(self):
+        """
+        Return whether the job has finished
+        """
+
+        return self.state in (python3_gearman.constants.JOB_COMPLETE, python3_gearman.constants.JOB_FAILED)
+
+
+class LocalGearmanWorker(python3_gearman.GearmanWorker):
+    """
+    Replaces the methods of python3_gearman.GearmanWorker that talk to the
+    Gearman server, updates are recorded on the job's LocalJobRequest instead.
+    Used as the second base class of a worker module's OVDMGearmanWorker so
+    it sits between OVDMGearmanWorker and GearmanWorker in the MRO.
+    """
+
+    requests = None
+
+
+    def _request(self, current_job):
+        return self.requests[current_job.handle]
+
+
+    def send_job_status(self, current_job, numerator, denominator, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Record a status update
+        """
+
+        request = self._request(current_job)
+        request.status.update({'running': True, 'numerator': numerator, 'denominator': denominator, 'time_received': time.time()})
+
+
+    def send_job_complete(self, current_job, data, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Record the result of the job
+        """
+
+        request = self._request(current_job)
+        request.result = data
+        request.state = python3_gearman.constants.JOB_COMPLETE
+
+
+    def send_job_failure(self, current_job, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Record the failure of the job
+        """
+
+        self._request(current_job).state = python3_gearman.constants.JOB_FAILED
+
+
+    def send_job_exception(self, current_job, data, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Record an exception raised by the job
+        """
+
+        request = self._request(current_job)
+        request.exception = data
+        request.state = python3_gearman.constants.JOB_FAILED
+
+
+    def send_job_data(self, current_job, data, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Record a data update
+        """
+
+        self._request(current_job).data_updates.append(data)
+
+
+    def send_job_warning(self, current_job, data, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Record a warning update
+        """
+
+        self._request(current_job).warning_updates.append(data)
+
+
+class LocalJobRunner():
+    """
+    Runs OpenVDM worker tasks in-process.  One OVDMGearmanWorker is created
+    per worker module the first time one of its tasks is run, an additional
+    instance is created when a task is submitted while the module's worker is
+    busy (i.e. setupNewCruise waiting on createCruiseDirectory).
+    """
+
+    def __init__(self):
+
+        self.task_modules = {task: module for module, tasks in WORKER_TASKS.items() for task in tasks}
+        self.requests = {}
+        self.idle_workers = {}
+        self.history = []
+        self.lock = threading.Lock()
+
+
+    def _new_worker(self, module_name):
+
+        module = importlib.import_module('server.workers.' + module_name)
+
+        worker_class = type('Local' + module.OVDMGearmanWorker.__name__, (module.OVDMGearmanWorker, LocalGearmanWorker), {'requests': self.requests})
+        worker = worker_class()
+
+        for task, function_name in WORKER_TASKS[module_name].items():
+            worker.register_task(task, getattr(module, function_name))
+
+        return worker
+
+
+    def _checkout_worker(self, module_name):
+
+        with self.lock:
+            workers = self.idle_workers.setdefault(module_name, [])
+            if len(workers) > 0:
+                return workers.pop()
+
+        logging.debug("Creating %s worker", module_name)
+        return self._new_worker(module_name)
+
+
+    def _checkin_worker(self, module_name, worker):
+
+        with self.lock:
+            self.idle_workers[module_name].append(worker)
+
+
+    def create_request(self, task, data, unique=None, background=False):
+        """
+        Return a LocalJobRequest for the task, raises KeyError if no worker
+        handles the task
+        """
+
+        if task not in self.task_modules:
+            raise KeyError("No worker registered for task: {}".format(task))
+
+        request = LocalJobRequest(LocalJob(task, data, unique), background)
+        self.requests[request.job.handle] = request
+
+        return request
+
+
+    def run_request(self, request):
+        """
+        Run the job of the request to completion
+        """
+
+        module_name = self.task_modules[request.job.task]
+        worker = self._checkout_worker(module_name)
+
+        logging.info("Running %s (%s)", request.job.task, request.job.handle)
+
+        request.state = python3_gearman.constants.JOB_CREATED
+        request.status['running'] = True
+        request.started = time.monotonic()
+
+        try:
+            worker.on_job_execute(request.job)
+        finally:
+            request.elapsed = time.monotonic() - request.started
+            request.status['running'] = False
+
+            if not request.complete:
+                request.state = python3_gearman.constants.JOB_FAILED
+
+            self._checkin_worker(module_name, worker)
+            self.history.append(request)
+
+            logging.info("Finished %s (%s) in %.3f seconds", request.job.task, request.job.handle, request.elapsed)
+
+        return request
+
+
+    def run(self, task, data):
+        """
+        Run a task, returns the completed LocalJobRequest
+        """
+
+        return self.run_request(self.create_request(task, data))
+
+
+    def timings(self):
+        """
+        Return (task, handle, seconds, state) for each job run so far
+        """
+
+        return [(request.job.task, request.job.handle, request.elapsed, request.state) for request in self.history]
+
+
+class LocalGearmanClient():
+    """
+    Stand-in for python3_gearman.GearmanClient backed by a LocalJobRunner.
+    Foreground jobs run immediately (or on wait_until_jobs_completed with a
+    positive or no poll_timeout when submitted with wait_until_complete=False),
+    background jobs are queued and run by LocalJobRunner.drain().
+    """
+
+    runner = None
+    background_queue = None
+
+
+    def __init__(self, host_list=None): # pylint: disable=unused-argument
+        pass
+
+
+    def submit_job(self, task, data, unique=None, priority=None, background=False, wait_until_complete=True, max_retries=0, poll_timeout=None): # pylint: disable=too-many-arguments,unused-argument
+        """
+        Submit a single job
+        """
+
+        return self.submit_multiple_jobs([{'task': task, 'data': data, 'unique': unique}], background=background, wait_until_complete=wait_until_complete)[0]
+
+
+    def submit_multiple_jobs(self, jobs_to_submit, background=False, wait_until_complete=True, max_retries=0, poll_timeout=None): # pylint: disable=too-many-arguments,unused-argument
+        """
+        Submit several jobs
+        """
+
+        requests = []
+
+        for job in jobs_to_submit:
+            unique = job.get('unique')
+
+            if background and unique is not None:
+                queued = next((request for request in self.background_queue if request.job.task == job['task'] and request.job.unique == unique), None)
+                if queued is not None:
+                    requests.append(queued)
+                    continue
+
+            request = self.runner.create_request(job['task'], job['data'], unique, background)
+
+            if background:
+                self.background_queue.append(request)
+            elif wait_until_complete:
+                self.runner.run_request(request)
+
+            requests.append(request)
+
+        return requests
+
+
+    def wait_until_jobs_completed(self, job_requests, poll_timeout=None):
+        """
+        Run the submitted foreground jobs that have not run yet.  Like
+        python3_gearman.GearmanClient, which never reads the socket when
+        poll_timeout is not positive, no job is run with such a timeout.
+        """
+
+        if poll_timeout is None or poll_timeout > 0:
+            for request in job_requests:
+                if not request.complete and not request.background and request.started is None:
+                    self.runner.run_request(request)
+
+        for request in job_requests:
+            request.timed_out = not request.complete
+
+        return job_requests
+
+
+    def get_job_status(self, current_request, poll_timeout=None): # pylint: disable=unused-argument
+        """
+        Return the request, its status is always current
+        """
+
+        return current_request
+
+
+@contextmanager
+def local_gearman(runner):
+    """
+    Replace python3_gearman.GearmanClient with a LocalGearmanClient backed by
+    runner for the duration of the context.  The background jobs queued while
+    the context is active are run when it exits.
+    """
+
+    background_queue = []
+    client_class = type('LocalGearmanClient', (LocalGearmanClient,), {'runner': runner, 'background_queue': background_queue})
+
+    original_client_class = python3_gearman.GearmanClient
+    python3_gearman.GearmanClient = client_class
+
+    try:
+        yield client_class
+        drain(runner, background_queue)
+    finally:
+        python3_gearman.GearmanClient = original_client_class
+
+
+def drain(runner, background_queue):
+    """
+    Run queued background jobs (including the jobs they queue) until the queue
+    is empty
+    """
+
+    while len(background_queue) > 0:
+        request = background_queue.pop(0)
+
+        try:
+            runner.run_request(request)
+        except Exception as err:
+            logging.error("Background job %s failed: %s", request.job.task, str(err))
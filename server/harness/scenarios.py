@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+"""Scenarios checking the OpenVDM workers and libraries without a Gearman
+server, OpenVDM API or data warehouse.  Run from the install root with:
+
+    python3 -m unittest server.harness.scenarios
+"""
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from server.harness.gearman_server import start_gearman_server, wait_for
+from server.lib.api_session import CircuitBreaker
+from server.lib.file_filters import CompiledFilters, INCLUDE, EXCLUDE, IGNORE
+from server.lib.file_manifest import spill_files, iter_files, count_files
+from server.lib.hash_cache import HashCache
+from server.lib.parallel_rsync import build_shard_filelists
+from server.lib.rsync_itemize import parse_itemize_line
+from server.lib.rsync_listing import parse_rsync_listing
+from server.lib.smb_mounts import SMBMountManager
+
+
+class StandInOpenVDM():
+    """
+    The parts of OpenVDM needed to create the Gearman clients
+    """
+
+    def __init__(self, gearman_server):
+        self.gearman_server = gearman_server
+
+
+    def get_gearman_server(self):
+        """
+        Return the address of the stand-in Gearman server
+        """
+
+        return self.gearman_server
+
+
+def build_transfer_result(new_files):
+    """
+    Return the result of a passing runCollectionSystemTransfer job
+    """
+
+    return json.dumps({'parts': [{'partName': 'Transfer Files', 'result': 'Pass'}], 'files': {'new': new_files, 'updated': [], 'exclude': []}})
+
+
+class GearmanScenario(unittest.TestCase):
+    """
+    Runs against a stand-in Gearman server with the real python3_gearman
+    clients
+    """
+
+    def setUp(self):
+        self.gearman_server = start_gearman_server()
+        self.ovdm = StandInOpenVDM(self.gearman_server.address)
+
+
+    def tearDown(self):
+        self.gearman_server.shutdown()
+        self.gearman_server.server_close()
+
+
+    def complete_job(self, task, new_files):
+        """
+        Complete the last submitted job of the task, returns its handle
+        """
+
+        self.assertTrue(wait_for(lambda: len(self.gearman_server.standin.submitted(task)) > 0))
+        handle = self.gearman_server.standin.submitted(task)[-1]['handle']
+        self.gearman_server.standin.complete_job(handle, build_transfer_result(new_files))
+
+        return handle
+
+
+class SchedulerScenario(GearmanScenario):
+    """
+    Adaptive collection system transfer scheduling
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        from server.workers.scheduler import TransferScheduler # pylint: disable=import-outside-toplevel
+
+        self.scheduler = TransferScheduler(self.ovdm, 300, 0, 10)
+        self.scheduler.transfers = {
+            'collectionSystemTransfer_1': {
+                'task': 'runCollectionSystemTransfer',
+                'longName': 'System 1',
+                'priority': None,
+                'running': False,
+                'adaptive': True,
+                'settings': {'stalenessSettleDelay': 5, 'transferStreams': 1, 'minInterval': 60, 'maxInterval': 1200},
+                'data': {'collectionSystemTransfer': {'collectionSystemTransferID': '1'}}
+            }
+        }
+
+
+    def test_completed_job_is_rescheduled(self):
+        """
+        A completed job is noticed by the next check_outstanding
+        """
+
+        self.scheduler._reschedule('collectionSystemTransfer_1', 0) # pylint: disable=protected-access
+        self.scheduler.submit_due(0)
+
+        self.complete_job('runCollectionSystemTransfer', ['file.dat'])
+
+        self.assertTrue(wait_for(lambda: self.scheduler.check_outstanding(1) or 'collectionSystemTransfer_1' not in self.scheduler.outstanding, timeout=1))
+        self.assertEqual(self.scheduler.deadlines['collectionSystemTransfer_1'], 1 + 60)
+
+
+    def test_cadence(self):
+        """
+        Catch-up at minInterval, back to the transfer interval, then back off
+        up to maxInterval
+        """
+
+        cadences = []
+        now = 0
+        self.scheduler._reschedule('collectionSystemTransfer_1', now) # pylint: disable=protected-access
+
+        for new_files in [['file.dat'], [], [], [], [], ['file.dat'], []]:
+            self.scheduler.submit_due(now)
+            self.complete_job('runCollectionSystemTransfer', new_files)
+            self.assertTrue(wait_for(lambda now=now: self.scheduler.check_outstanding(now) or 'collectionSystemTransfer_1' not in self.scheduler.outstanding, timeout=1))
+
+            cadences.append(self.scheduler.deadlines['collectionSystemTransfer_1'] - now)
+            now = self.scheduler.deadlines['collectionSystemTransfer_1']
+
+        self.assertEqual(cadences, [60, 300, 600, 1200, 1200, 60, 300])
+
+
+class DirectoryWatcherScenario(GearmanScenario):
+    """
+    Transfers submitted by the local directory watcher
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        from server.workers.directory_watcher import DirectoryWatcher # pylint: disable=import-outside-toplevel
+
+        self.watcher = DirectoryWatcher(self.ovdm, 5, 30)
+        self.watcher.source_dirs = {'1': '/data/System1'}
+
+
+    def test_one_transfer_outstanding(self):
+        """
+        Changed files are held back while a transfer is outstanding and
+        submitted once it completes
+        """
+
+        self.watcher._handle_event('/data/System1/a.dat', 0) # pylint: disable=protected-access
+        self.watcher._submit_ready(10) # pylint: disable=protected-access
+
+        self.watcher._handle_event('/data/System1/b.dat', 10) # pylint: disable=protected-access
+        self.watcher._submit_ready(20) # pylint: disable=protected-access
+        self.assertEqual(len(self.gearman_server.standin.submitted('runCollectionSystemTransfer')), 1)
+
+        self.complete_job('runCollectionSystemTransfer', ['a.dat'])
+        self.assertTrue(wait_for(lambda: self.watcher._check_outstanding() or len(self.watcher.outstanding) == 0, timeout=1)) # pylint: disable=protected-access
+
+        self.watcher._submit_ready(30) # pylint: disable=protected-access
+        jobs = self.gearman_server.standin.submitted('runCollectionSystemTransfer')
+
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(json.loads(jobs[-1]['data'])['changedFiles'], ['b.dat'])
+
+
+class StandInSMBMountManager(SMBMountManager):
+    """
+    SMBMountManager recording mounts instead of calling mount/umount
+    """
+
+    def __init__(self, mount_dir):
+        super().__init__(mount_dir)
+        self.mounted = set()
+
+
+    def _mount(self, mntpoint, server, domain, user, password, mode, vers): # pylint: disable=too-many-arguments
+        self.mounted.add(mntpoint)
+        return True
+
+
+    def _unmount(self, mntpoint):
+        self.mounted.discard(mntpoint)
+
+
+    def _is_healthy(self, mntpoint):
+        return mntpoint in self.mounted
+
+
+class SMBMountScenario(unittest.TestCase):
+    """
+    SMB mounts are shared between jobs and unmounted once no longer used
+    """
+
+    def setUp(self):
+        self.mount_dir = tempfile.mkdtemp()
+        self.mounts = StandInSMBMountManager(self.mount_dir)
+        self.other_worker = subprocess.Popen(['sleep', '60'])
+
+
+    def tearDown(self):
+        self.other_worker.kill()
+        self.other_worker.wait()
+        shutil.rmtree(self.mount_dir)
+
+
+    def hold(self, mntpoint, pid):
+        """
+        Record pid as a holder of the mount
+        """
+
+        state = self.mounts._load_state() # pylint: disable=protected-access
+        state[os.path.basename(mntpoint)]['pids'].append(pid)
+        self.mounts._save_state(state) # pylint: disable=protected-access
+
+
+    def test_reused_between_jobs(self):
+        """
+        The same share is mounted once
+        """
+
+        first = self.mounts.acquire('//server/a', 'WORKGROUP', 'user', 'pass', 'ro', '2.1')
+        second = self.mounts.acquire('//server/a', 'WORKGROUP', 'user', 'pass', 'ro', '2.1', active_shares=[('//server/a', 'WORKGROUP', 'user', 'ro')])
+
+        self.assertEqual(first['mntpoint'], second['mntpoint'])
+        self.assertEqual(len(self.mounts.mounted), 1)
+
+
+    def test_stale_mount_reaped(self):
+        """
+        A mount no longer matching an active transfer is unmounted
+        """
+
+        stale = self.mounts.acquire('//server/a', 'WORKGROUP', 'user', 'pass', 'ro', '2.1')
+        self.mounts.acquire('//server/b', 'WORKGROUP', 'user', 'pass', 'ro', '2.1', active_shares=[])
+
+        self.assertNotIn(stale['mntpoint'], self.mounts.mounted)
+        self.assertEqual(len(self.mounts.mounted), 1)
+
+
+    def test_stale_mount_in_use_deferred(self):
+        """
+        A stale mount held by another running worker is left mounted until
+        that worker exits
+        """
+
+        stale = self.mounts.acquire('//server/a', 'WORKGROUP', 'user', 'pass', 'ro', '2.1')
+        self.hold(stale['mntpoint'], self.other_worker.pid)
+
+        self.mounts.acquire('//server/b', 'WORKGROUP', 'user', 'pass', 'ro', '2.1', active_shares=[])
+        self.assertIn(stale['mntpoint'], self.mounts.mounted)
+
+        self.other_worker.kill()
+        self.other_worker.wait()
+
+        self.mounts.acquire('//server/b', 'WORKGROUP', 'user', 'pass', 'ro', '2.1', active_shares=[])
+        self.assertNotIn(stale['mntpoint'], self.mounts.mounted)
+
+
+    def test_release(self):
+        """
+        Shutting down a worker unmounts the mounts no other running worker
+        holds
+        """
+
+        shared = self.mounts.acquire('//server/a', 'WORKGROUP', 'user', 'pass', 'ro', '2.1')
+        self.hold(shared['mntpoint'], self.other_worker.pid)
+        own = self.mounts.acquire('//server/b', 'WORKGROUP', 'user', 'pass', 'ro', '2.1')
+
+        self.mounts.release()
+
+        self.assertEqual(self.mounts.mounted, {shared['mntpoint']})
+        self.assertNotIn(own['mntpoint'], self.mounts.mounted)
+
+
+class MD5SummaryFilelistScenario(unittest.TestCase):
+    """
+    Files included in the MD5 summary
+    """
+
+    def setUp(self):
+        self.cruise_dir = tempfile.mkdtemp()
+
+        for filepath in ['System1/data.dat', 'System1/.hash_cache/data.dat', 'OpenVDM/TransferLogs/System1.log', 'OpenVDM/TransferLogs/.hash_cache/md5.db', 'OpenVDM/TransferLogs/.scan_index/System1.json', 'OpenVDM/TransferLogs/.manifests/spill.ndjson']:
+            os.makedirs(os.path.dirname(os.path.join(self.cruise_dir, filepath)), exist_ok=True)
+            with open(os.path.join(self.cruise_dir, filepath), 'w') as file:
+                file.write(filepath)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.cruise_dir)
+
+
+    def test_internal_dirs_skipped(self):
+        """
+        Only the internal directories of the transfer log directory are
+        skipped, not directories with the same name elsewhere
+        """
+
+        from server.workers.md5_summary import build_filelist # pylint: disable=import-outside-toplevel
+
+        filelist = build_filelist(self.cruise_dir, os.path.join(self.cruise_dir, 'OpenVDM/TransferLogs'))
+
+        self.assertEqual(sorted(filelist), ['OpenVDM/TransferLogs/System1.log', 'System1/.hash_cache/data.dat', 'System1/data.dat'])
+
+
+class CircuitBreakerScenario(unittest.TestCase):
+    """
+    Requests to an unavailable OpenVDM API
+    """
+
+    def setUp(self):
+        self.circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+
+        for _ in range(2):
+            self.assertTrue(self.circuit_breaker.allow_request())
+            self.circuit_breaker.record_failure()
+
+
+    def test_single_trial_request(self):
+        """
+        Only one request is let through once the circuit is half-open
+        """
+
+        self.assertTrue(self.circuit_breaker.allow_request())
+        self.assertFalse(self.circuit_breaker.allow_request())
+
+        self.circuit_breaker.record_success()
+
+        self.assertTrue(self.circuit_breaker.allow_request())
+        self.assertTrue(self.circuit_breaker.allow_request())
+
+
+    def test_failed_trial_request(self):
+        """
+        A failed trial request re-opens the circuit, the next trial request is
+        let through after the reset timeout
+        """
+
+        self.assertTrue(self.circuit_breaker.allow_request())
+        self.circuit_breaker.record_failure()
+
+        self.assertTrue(self.circuit_breaker.allow_request())
+        self.assertFalse(self.circuit_breaker.allow_request())
+
+
+class RsyncListingScenario(unittest.TestCase):
+    """
+    Parsing rsync --list-only output
+    """
+
+    def test_listing(self):
+        """
+        Sizes with thousands separators, paths with spaces and directories
+        """
+
+        listing = parse_rsync_listing(
+            'drwxr-xr-x          4,096 2021/06/01 12:00:00 .\n'
+            '-rw-r--r--  1,234,567,890 2021/06/01 12:00:01 dir/file one.dat\n'
+        )
+
+        self.assertEqual(list(listing.paths), ['.', 'dir/file one.dat'])
+        self.assertEqual(list(listing.sizes), [4096, 1234567890])
+        self.assertEqual(list(listing.mtimes), [1622548800, 1622548801])
+        self.assertEqual(list(listing.is_file), [False, True])
+
+
+    def test_malformed_lines_skipped(self):
+        """
+        Lines that are not listing entries, including ones splitting into five
+        fields, are skipped
+        """
+
+        listing = parse_rsync_listing(
+            '-rw-r--r--          1,234 2021/06/01 12:00:01 a.dat\n'
+            'rsync: failed to set times on x\n'
+            'sent 1,234 bytes  received 56 bytes\n'
+            '\n'
+        )
+
+        self.assertEqual(list(listing.paths), ['a.dat'])
+        self.assertEqual(list(listing.sizes), [1234])
+
+
+class FileFiltersScenario(unittest.TestCase):
+    """
+    Include/exclude/ignore filters
+    """
+
+    def setUp(self):
+        self.filters = CompiledFilters('*.dat,*.log', '*/bad.*,*.log', 'ignored/*,*.tmp')
+
+
+    def test_precedence(self):
+        """
+        ignore > non-ascii > exclude/include
+        """
+
+        self.assertEqual(self.filters.verdict('data/a.dat'), INCLUDE)
+        self.assertEqual(self.filters.verdict('data/a.txt'), EXCLUDE)
+        self.assertEqual(self.filters.verdict('data/a.log'), EXCLUDE)
+        self.assertEqual(self.filters.verdict('data/bad.dat'), EXCLUDE)
+        self.assertEqual(self.filters.verdict('data/caf\u00e9.dat'), EXCLUDE)
+        self.assertEqual(self.filters.verdict('ignored/a.dat'), IGNORE)
+        self.assertEqual(self.filters.verdict('ignored/bad.log'), IGNORE)
+        self.assertEqual(self.filters.verdict('data/caf\u00e9.tmp'), IGNORE)
+
+
+    def test_no_include_filter(self):
+        """
+        Nothing is included without an include filter
+        """
+
+        self.assertEqual(CompiledFilters('', '', '').verdict('data/a.dat'), EXCLUDE)
+
+
+    def test_rsync_filter_args(self):
+        """
+        Ignore patterns become rsync filters, directories are always listed
+        unless pruned by a pattern ending in /*
+        """
+
+        self.assertEqual(self.filters.rsync_filter_args(), [
+            '--filter=- /ignored/',
+            '--filter=+ */',
+            '--filter=- /ignored/**',
+            '--filter=- /**.tmp'
+        ])
+
+        self.assertEqual(CompiledFilters('*', '', '*/cache/*').rsync_filter_args(), [
+            '--filter=- /?**/cache/',
+            '--filter=+ */',
+            '--filter=- /?**/cache/**'
+        ])
+
+        self.assertEqual(CompiledFilters('*', '*.tmp', '').rsync_filter_args(), [])
+        self.assertEqual(CompiledFilters('*', '', 'a\\b').rsync_filter_args(), [])
+
+
+class RsyncItemizeScenario(unittest.TestCase):
+    """
+    Parsing rsync itemized output
+    """
+
+    def test_new_and_updated_files(self):
+        """
+        New files, updated files and everything else
+        """
+
+        new_file = parse_itemize_line('>f+++++++++ 1234 1234 dir/file one.dat', 0.5)
+        self.assertEqual(new_file.filename, 'dir/file one.dat')
+        self.assertEqual(new_file.length, 1234)
+        self.assertEqual(new_file.elapsed, 0.5)
+        self.assertTrue(new_file.is_new_file())
+        self.assertFalse(new_file.is_updated_file())
+
+        updated_file = parse_itemize_line('>f.st...... 1234 56 a.dat')
+        self.assertFalse(updated_file.is_new_file())
+        self.assertTrue(updated_file.is_updated_file())
+
+        for line in ['cd+++++++++ 0 0 dir/', '.f...p..... 1234 0 a.dat']:
+            event = parse_itemize_line(line)
+            self.assertFalse(event.is_new_file())
+            self.assertFalse(event.is_updated_file())
+
+
+    def test_summary_lines(self):
+        """
+        Lines that are not itemized changes are skipped
+        """
+
+        for line in ['', 'sending incremental file list', 'sent 1,234 bytes  received 56 bytes  2,580.00 bytes/sec', 'total size is 1,234  speedup is 0.95']:
+            self.assertIsNone(parse_itemize_line(line))
+
+
+class ShardFilelistsScenario(unittest.TestCase):
+    """
+    Splitting a transfer across parallel rsync streams
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def read_filelists(self, filelist_filepaths):
+        """
+        Return the filepaths in each filelist
+        """
+
+        filelists = []
+
+        for filelist_filepath in filelist_filepaths:
+            with open(filelist_filepath, 'r') as filelist_file:
+                filelists.append(filelist_file.read().split('\n'))
+
+        return filelists
+
+
+    def test_balanced(self):
+        """
+        Each file is in exactly one shard and shards have similar total sizes
+        """
+
+        filesizes = {'a': 100, 'b': 60, 'c': 40, 'd': 30, 'e': 20, 'f': 10}
+        filelists = self.read_filelists(build_shard_filelists(self.tmpdir, list(filesizes), list(filesizes.values()), 2))
+
+        self.assertEqual(sorted(sum(filelists, [])), sorted(filesizes))
+        self.assertEqual(sorted(sum(filesizes[filepath] for filepath in filelist) for filelist in filelists), [130, 130])
+
+
+    def test_more_shards_than_files(self):
+        """
+        No empty shards are written
+        """
+
+        filelists = self.read_filelists(build_shard_filelists(self.tmpdir, ['a', 'b'], [1, 1], 4))
+
+        self.assertEqual(sorted(filelists), [['a'], ['b']])
+
+
+class FileManifestScenario(unittest.TestCase):
+    """
+    File lists spilled from job payloads to manifests
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.manifest_filepath = os.path.join(self.tmpdir, '.manifests', 'System1.ndjson')
+        self.files = {'new': ['a.dat', 'b.dat'], 'updated': ['c.dat'], 'exclude': []}
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_inline(self):
+        """
+        File lists up to the threshold stay in the payload
+        """
+
+        files = spill_files(self.files, self.manifest_filepath, threshold=3)
+
+        self.assertEqual(files, self.files)
+        self.assertFalse(os.path.exists(self.manifest_filepath))
+        self.assertEqual(list(iter_files(files, 'new')), ['a.dat', 'b.dat'])
+        self.assertEqual(count_files(files, 'updated'), 1)
+        self.assertEqual(count_files(files, 'missing'), 0)
+
+
+    def test_spilled(self):
+        """
+        Larger file lists are written to the manifest and streamed back
+        """
+
+        files = spill_files(self.files, self.manifest_filepath, threshold=2)
+
+        self.assertEqual(files, {'manifest': self.manifest_filepath, 'counts': {'new': 2, 'updated': 1, 'exclude': 0}})
+        self.assertEqual(spill_files(files, self.manifest_filepath, threshold=2), files)
+
+        for list_name, filenames in self.files.items():
+            self.assertEqual(list(iter_files(files, list_name)), filenames)
+            self.assertEqual(count_files(files, list_name), len(filenames))
+
+        self.assertEqual(list(iter_files(files, 'missing')), [])
+
+
+class HashCacheScenario(unittest.TestCase):
+    """
+    Cached MD5 hashes
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmpdir, 'a.dat')
+
+        with open(self.filepath, 'w') as file:
+            file.write('a')
+
+        self.hash_cache = HashCache(os.path.join(self.tmpdir, '.hash_cache', 'md5.db'))
+
+
+    def tearDown(self):
+        self.hash_cache.close()
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_lookup(self):
+        """
+        A cached hash is returned until the file changes
+        """
+
+        os.utime(self.filepath, (time.time() - 60, time.time() - 60))
+        self.hash_cache.store([('a.dat', os.stat(self.filepath), 'hash')])
+
+        self.assertEqual(self.hash_cache.lookup('a.dat', os.stat(self.filepath)), 'hash')
+        self.assertIsNone(self.hash_cache.lookup('b.dat', os.stat(self.filepath)))
+
+        with open(self.filepath, 'a') as file:
+            file.write('b')
+
+        self.assertIsNone(self.hash_cache.lookup('a.dat', os.stat(self.filepath)))
+        self.assertEqual(self.hash_cache.stats, {'hits': 1, 'misses': 2, 'stored': 1, 'removed': 0})
+
+
+    def test_racy_window(self):
+        """
+        Hashes of files modified within the racy window are not cached
+        """
+
+        self.hash_cache.store([('a.dat', os.stat(self.filepath), 'hash')])
+
+        self.assertIsNone(self.hash_cache.lookup('a.dat', os.stat(self.filepath)))
+
+
+    def test_retain(self):
+        """
+        Hashes of files no longer listed are removed
+        """
+
+        os.utime(self.filepath, (time.time() - 60, time.time() - 60))
+        file_stat = os.stat(self.filepath)
+        self.hash_cache.store([('a.dat', file_stat, 'hash'), ('b.dat', file_stat, 'hash')])
+
+        self.hash_cache.retain(['a.dat'])
+
+        self.assertEqual(self.hash_cache.lookup('a.dat', file_stat), 'hash')
+        self.assertIsNone(self.hash_cache.lookup('b.dat', file_stat))
+        self.assertEqual(self.hash_cache.stats['removed'], 1)
+
+
+class MD5SummaryMergeScenario(unittest.TestCase):
+    """
+    Merging new hashes into the MD5 summary
+    """
+
+    def merge(self, md5_summary, new_hashes):
+        """
+        Return the merged summary and the number of rows added and updated
+        """
+
+        from server.workers.md5_summary import merge_md5_summary # pylint: disable=import-outside-toplevel
+
+        output_file = io.StringIO()
+        (row_added, row_updated) = merge_md5_summary(io.StringIO(md5_summary), new_hashes, output_file)
+
+        return (output_file.getvalue(), row_added, row_updated)
+
+
+    def test_streamed(self):
+        """
+        New hashes are merged into a sorted summary, the last hash of a file
+        listed more than once wins
+        """
+
+        new_hashes = [{'filename': 'a b.dat', 'hash': '1'}, {'filename': 'c.dat', 'hash': '2'}, {'filename': 'e.dat', 'hash': '3'}, {'filename': 'e.dat', 'hash': '4'}]
+
+        self.assertEqual(self.merge('0 b.dat\n0 c.dat\n\n0 d.dat\n', new_hashes), ('1 a b.dat\n0 b.dat\n2 c.dat\n0 d.dat\n4 e.dat\n', 2, 1))
+
+
+    def test_unsorted(self):
+        """
+        An unsorted summary is merged in memory, discarding anything already
+        written
+        """
+
+        new_hashes = [{'filename': 'a.dat', 'hash': '1'}, {'filename': 'c.dat', 'hash': '2'}]
+
+        self.assertEqual(self.merge('0 b.dat\n0 d.dat\n0 c.dat\n', new_hashes), ('1 a.dat\n0 b.dat\n2 c.dat\n0 d.dat\n', 1, 1))
+
+
+    def test_summary_lines(self):
+        """
+        Filenames containing spaces and blank lines
+        """
+
+        from server.workers.md5_summary import parse_md5_summary_line # pylint: disable=import-outside-toplevel
+
+        self.assertEqual(parse_md5_summary_line('abc dir/file one.dat\n'), ('abc', 'dir/file one.dat'))
+        self.assertIsNone(parse_md5_summary_line('\n'))
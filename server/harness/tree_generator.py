@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+FILE:  tree_generator.py
+
+DESCRIPTION:  Creates a synthetic data warehouse for benchmarking the OpenVDM
+    workers: a CruiseData directory, a PublicData directory, a Shoreside
+    directory and one source directory per collection system filled with
+    randomly sized files, plus the fixture file used by api_server.py
+    describing the collection system transfers, cruise data transfers, extra
+    directories, ship-to-shore transfers and tasks.
+
+USAGE: tree_generator.py [--systems <n>] [--files <n>] [--min-size <bytes>]
+                         [--max-size <bytes>] [--depth <n>] [--fan-out <n>]
+                         [--seed <n>] <root>
+
+     BUGS:
+    NOTES: All transfers are local transfers so no servers are required.
+   AUTHOR:  Webb Pinner
+  COMPANY:  Capable Solutions
+  VERSION:  2.5
+  CREATED:  2021-06-01
+ REVISION:  2021-06-01
+
+LICENSE INFO: Open Vessel Data Management v2.5 (OpenVDMv2)
+Copyright (C) OceanDataRat.org 2021
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>.
+"""
+
+import os
+import json
+import random
+import getpass
+import logging
+import argparse
+import datetime
+
+DEFAULT_CRUISE_ID = 'Bench_Cruise'
+
+DEFAULT_LOWERING_ID = 'Bench_Lowering'
+
+DEFAULT_LOWERING_DATA_BASE_DIR = 'Vehicle'
+
+# how many days before now the cruise started
+CRUISE_DURATION = 7
+
+DEFAULT_TASKS = [
+    ('setupNewCruise', 'Setup New Cruise', 0),
+    ('finalizeCurrentCruise', 'Finalize Current Cruise', 0),
+    ('rebuildMD5Summary', 'Rebuild MD5 Summary', 0),
+    ('rebuildDataDashboard', 'Rebuild Data Dashboard', 0),
+    ('rebuildCruiseDirectory', 'Rebuild Cruise Directory', 0),
+    ('exportOVDMConfig', 'Re-export the OpenVDM Configuration', 0),
+    ('rsyncPublicDataToCruiseData', 'Sync PublicData within Cruise Directory', 0),
+    ('setupNewLowering', 'Setup New Lowering', 1),
+    ('finalizeCurrentLowering', 'Finalize Current Lowering', 1),
+    ('rebuildLoweringDirectory', 'Rebuild Lowering Directory', 1),
+    ('exportLoweringConfig', 'Re-export the Lowering Configuration', 1)
+]
+
+DEFAULT_EXTRA_DIRECTORIES = [
+    ('Transfer_Logs', 'Transfer Logs', 'OpenVDM/TransferLogs'),
+    ('Dashboard_Data', 'Dashboard Data', 'OpenVDM/DashboardData'),
+    ('From_PublicData', 'Files copied from PublicData share', 'From_PublicData')
+]
+
+DEFAULT_SHIP_TO_SHORE_TRANSFERS = [
+    ('DashboardData', 'Dashboard Data', 2, '*', 1),
+    ('TransferLogs', 'Transfer Logs', 1, '*', 0),
+    ('MD5Summary', 'MD5 Summary', 0, 'MD5_Summary.txt,MD5_Summary.md5', 1),
+    ('OVDM_Config', 'OpenVDM Configuration', 0, 'ovdmConfig.json', 1)
+]
+
+EMPTY_CONNECTION_FIELDS = ['rsyncServer', 'rsyncUser', 'rsyncPass', 'smbServer', 'smbUser', 'smbPass', 'smbDomain', 'sshServer', 'sshUser', 'sshPass']
+
+
+def build_file_paths(files, depth, fan_out, rng):
+    """
+    Return files relative paths spread over a directory tree depth levels deep
+    with fan_out sub-directories per level
+    """
+
+    paths = []
+
+    for idx in range(files):
+        dirs = ['dir{:02d}'.format(rng.randrange(fan_out)) for _ in range(rng.randint(0, depth))]
+        paths.append(os.path.join(*dirs, 'file{:06d}.dat'.format(idx)))
+
+    return paths
+
+
+def write_files(source_dir, paths, min_size, max_size, start_ts, end_ts, rng):
+    """
+    Write the files with random content and modification times between start_ts
+    and end_ts, returns the number of bytes written
+    """
+
+    total = 0
+
+    for path in paths:
+        filepath = os.path.join(source_dir, path)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        size = rng.randint(min_size, max_size)
+        with open(filepath, 'wb') as file:
+            file.write(rng.getrandbits(8 * size).to_bytes(size, 'little') if size > 0 else b'')
+
+        mtime = rng.uniform(start_ts, end_ts)
+        os.utime(filepath, (mtime, mtime))
+        total += size
+
+    return total
+
+
+def build_fixture(root, systems, cruise_start): # pylint: disable=too-many-locals
+    """
+    Return the fixture describing the synthetic data warehouse
+    """
+
+    cruise_data_dir = os.path.join(root, 'CruiseData')
+
+    fixture = {
+        'warehouse': {
+            'shipboardDataWarehouseIP': '127.0.0.1',
+            'shipboardDataWarehouseBaseDir': cruise_data_dir,
+            'shipboardDataWarehouseApacheDir': cruise_data_dir,
+            'shipboardDataWarehouseUsername': getpass.getuser(),
+            'shipboardDataWarehousePublicDataDir': os.path.join(root, 'PublicData'),
+            'loweringDataBaseDir': DEFAULT_LOWERING_DATA_BASE_DIR
+        },
+        'coreVars': {
+            'cruiseID': DEFAULT_CRUISE_ID,
+            'cruiseStartDate': cruise_start.strftime("%Y/%m/%d %H:%M"),
+            'cruiseEndDate': '',
+            'cruiseSize': '0',
+            'cruiseSizeUpdated': '',
+            'loweringID': DEFAULT_LOWERING_ID,
+            'loweringStartDate': cruise_start.strftime("%Y/%m/%d %H:%M"),
+            'loweringEndDate': '',
+            'loweringSize': '0',
+            'loweringSizeUpdated': '',
+            'systemStatus': 'On',
+            'shipToShoreBWLimitStatus': 'Off',
+            'md5FilesizeLimit': '10',
+            'md5FilesizeLimitStatus': 'Off',
+            'showLoweringComponents': 'No'
+        },
+        'collectionSystemTransfers': [],
+        'cruiseDataTransfers': [],
+        'extraDirectories': [],
+        'shipToShoreTransfers': [],
+        'tasks': []
+    }
+
+    for idx, system in enumerate(systems, start=1):
+        transfer = {
+            'collectionSystemTransferID': idx,
+            'name': system,
+            'longName': system + ' (synthetic)',
+            'cruiseOrLowering': 0,
+            'sourceDir': os.path.join(root, 'Sources', system),
+            'destDir': system,
+            'staleness': 0,
+            'useStartDate': 0,
+            'transferType': 1,
+            'localDirIsMountPoint': 0,
+            'sshUseKey': 0,
+            'includeFilter': '*',
+            'excludeFilter': '',
+            'ignoreFilter': '',
+            'enable': 1,
+            'bandwidthLimit': 0
+        }
+        transfer.update({field: '' for field in EMPTY_CONNECTION_FIELDS})
+        fixture['collectionSystemTransfers'].append(transfer)
+
+    ssdw = {
+        'cruiseDataTransferID': 1,
+        'name': 'SSDW',
+        'longName': 'Shoreside Data Warehouse',
+        'transferType': 1,
+        'destDir': os.path.join(root, 'Shoreside'),
+        'localDirIsMountPoint': 0,
+        'sshUseKey': 0,
+        'enable': 1,
+        'required': 1,
+        'bandwidthLimit': 0,
+        'includeOVDMFiles': 0,
+        'includePublicDataFiles': 0,
+        'excludedCollectionSystems': '0',
+        'excludedExtraDirectories': '0'
+    }
+    ssdw.update({field: '' for field in EMPTY_CONNECTION_FIELDS})
+    fixture['cruiseDataTransfers'].append(ssdw)
+
+    for idx, (name, long_name, dest_dir) in enumerate(DEFAULT_EXTRA_DIRECTORIES, start=1):
+        fixture['extraDirectories'].append({'extraDirectoryID': idx, 'name': name, 'longName': long_name, 'destDir': dest_dir, 'enable': 1, 'required': 1})
+
+    for idx, (name, long_name, extra_directory, include_filter, enable) in enumerate(DEFAULT_SHIP_TO_SHORE_TRANSFERS, start=1):
+        fixture['shipToShoreTransfers'].append({'shipToShoreTransferID': idx, 'name': name, 'longName': long_name, 'priority': 1, 'collectionSystem': 0, 'extraDirectory': extra_directory, 'includeFilter': include_filter, 'enable': enable, 'required': 1})
+
+    for idx, (name, long_name, cruise_or_lowering) in enumerate(DEFAULT_TASKS, start=1):
+        fixture['tasks'].append({'taskID': idx, 'name': name, 'longName': long_name, 'cruiseOrLowering': cruise_or_lowering, 'enable': 1})
+
+    return fixture
+
+
+def generate_tree(root, systems=3, files=100, min_size=1024, max_size=65536, depth=2, fan_out=4, seed=0): # pylint: disable=too-many-arguments
+    """
+    Create the synthetic data warehouse under root, returns the path to the
+    fixture file
+    """
+
+    rng = random.Random(seed)
+
+    now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+    cruise_start = now - datetime.timedelta(days=CRUISE_DURATION)
+    start_ts = cruise_start.replace(tzinfo=datetime.timezone.utc).timestamp()
+    end_ts = now.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+    for directory in ('CruiseData', 'PublicData', 'Shoreside'):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    system_names = ['System{:02d}'.format(idx) for idx in range(1, systems + 1)]
+    total = 0
+
+    for system in system_names:
+        paths = build_file_paths(files, depth, fan_out, rng)
+        total += write_files(os.path.join(root, 'Sources', system), paths, min_size, max_size, start_ts, end_ts, rng)
+        logging.info("Created %s files for %s", len(paths), system)
+
+    total += write_files(os.path.join(root, 'PublicData'), build_file_paths(max(files // 10, 1), 1, fan_out, rng), min_size, max_size, start_ts, end_ts, rng)
+
+    logging.info("Wrote %s bytes", total)
+
+    fixture_file = os.path.join(root, 'fixture.json')
+
+    # JSON is a subset of YAML so read_config can parse the fixture
+    with open(fixture_file, 'w') as file:
+        json.dump(build_fixture(root, system_names, cruise_start), file, indent=2)
+
+    return fixture_file
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Create a synthetic OpenVDM data warehouse')
+    parser.add_argument('--systems', default=3, metavar='systems', type=int, help='number of collection systems')
+    parser.add_argument('--files', default=100, metavar='files', type=int, help='number of files per collection system')
+    parser.add_argument('--min-size', default=1024, metavar='min_size', type=int, help='minimum file size in bytes')
+    parser.add_argument('--max-size', default=65536, metavar='max_size', type=int, help='maximum file size in bytes')
+    parser.add_argument('--depth', default=2, metavar='depth', type=int, help='maximum sub-directory depth')
+    parser.add_argument('--fan-out', default=4, metavar='fan_out', type=int, help='sub-directories per level')
+    parser.add_argument('--seed', default=0, metavar='seed', type=int, help='random seed')
+    parser.add_argument('-v', '--verbosity', dest='verbosity',
+                        default=0, action='count',
+                        help='Increase output verbosity')
+    parser.add_argument('root', metavar='root', help='directory to create the data warehouse in')
+
+    parsed_args = parser.parse_args()
+
+    ############################
+    # Set up logging before we do any other argument parsing (so that we
+    # can log problems with argument parsing).
+
+    LOGGING_FORMAT = '%(asctime)-15s %(levelname)s - %(message)s'
+    logging.basicConfig(format=LOGGING_FORMAT)
+
+    LOG_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+    parsed_args.verbosity = min(parsed_args.verbosity, max(LOG_LEVELS))
+    logging.getLogger().setLevel(LOG_LEVELS[parsed_args.verbosity])
+
+    print(generate_tree(parsed_args.root, parsed_args.systems, parsed_args.files, parsed_args.min_size, parsed_args.max_size, parsed_args.depth, parsed_args.fan_out, parsed_args.seed))
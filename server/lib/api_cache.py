@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Utilities for caching slow-changing responses from the OpenVDM API.
+"""
+import copy
+import time
+import logging
+
+
+class APICache():
+    """
+    Read-through cache of OpenVDM API responses.  Each endpoint has its own
+    time-to-live (seconds), endpoints without a ttl are never cached.
+    Indexes of list responses (i.e. by name) are built once per fetch.
+    Cached values are copied on the way out so callers can not modify the
+    cache.
+    """
+
+    def __init__(self, ttls):
+
+        self.ttls = ttls
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def _get_entry(self, endpoint, fetch_func):
+        """
+        Return the cache entry for the endpoint, fetching the value if the
+        entry is missing or expired
+        """
+
+        entry = self.entries.get(endpoint)
+
+        if entry is not None and time.monotonic() - entry['fetchedAt'] < self.ttls.get(endpoint, 0):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+
+        entry = {'value': fetch_func(), 'fetchedAt': time.monotonic(), 'indexes': {}}
+
+        if self.ttls.get(endpoint, 0) > 0:
+            self.entries[endpoint] = entry
+
+        return entry
+
+
+    def get(self, endpoint, fetch_func):
+        """
+        Return the value for the endpoint, fetch_func is called to retrieve the
+        value on a cache miss
+        """
+
+        return copy.deepcopy(self._get_entry(endpoint, fetch_func)['value'])
+
+
+    def lookup(self, endpoint, field, value, fetch_func):
+        """
+        Return the item of the endpoint's list whose field equals value or None
+        if there is no such item
+        """
+
+        entry = self._get_entry(endpoint, fetch_func)
+
+        if field not in entry['indexes']:
+            index = {}
+            for item in entry['value']:
+                index.setdefault(item[field], item)
+
+            entry['indexes'][field] = index
+
+        return copy.deepcopy(entry['indexes'][field].get(value))
+
+
+    def invalidate(self, endpoint=None):
+        """
+        Remove the cached value for the endpoint or all cached values if no
+        endpoint is specified
+        """
+
+        if endpoint is None:
+            logging.debug("Invalidating all cached API responses")
+            self.entries = {}
+        else:
+            self.entries.pop(endpoint, None)
+
+
+    def stats(self):
+        """
+        Return the cache hit/miss counters
+        """
+
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Utilities for making requests to the OpenVDM API over a shared, pooled HTTP
+session.
+"""
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_CONNECT_TIMEOUT = 5 # seconds
+
+DEFAULT_READ_TIMEOUT = 60 # seconds
+
+DEFAULT_GET_RETRIES = 3
+
+DEFAULT_BACKOFF_FACTOR = 0.5 # seconds, doubled for each retry
+
+RETRY_STATUS_CODES = [502, 503, 504]
+
+DEFAULT_FAILURE_THRESHOLD = 5 # consecutive failed requests
+
+DEFAULT_RESET_TIMEOUT = 30 # seconds
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of making a request while the OpenVDM API is considered
+    unavailable
+    """
+
+
+class CircuitBreaker():
+    """
+    Tracks consecutive request failures.  Once failure_threshold requests in a
+    row have failed the circuit opens and requests fail immediately for
+    reset_timeout seconds.  After that a single trial request is allowed
+    through (other requests keep failing until it finishes), the circuit
+    closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_in_flight = False
+        self.lock = threading.Lock()
+
+
+    def allow_request(self):
+        """
+        Return whether a request may be made
+        """
+
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if self.half_open_in_flight or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+
+            # half-open, let a single trial request through
+            self.half_open_in_flight = True
+            return True
+
+
+    def record_success(self):
+        """
+        Record a successful request
+        """
+
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info("OpenVDM API is reachable again")
+
+            self.failures = 0
+            self.opened_at = None
+            self.half_open_in_flight = False
+
+
+    def record_failure(self):
+        """
+        Record a failed request
+        """
+
+        with self.lock:
+            self.failures += 1
+
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logging.error("%s consecutive OpenVDM API requests failed, failing fast for %s seconds", self.failures, self.reset_timeout)
+
+                self.opened_at = time.monotonic()
+
+            self.half_open_in_flight = False
+
+
+    def record_aborted(self):
+        """
+        Record a request that neither succeeded nor failed because of the API
+        (i.e. an invalid request), a trial request may be made again
+        """
+
+        with self.lock:
+            self.half_open_in_flight = False
+
+
+class APISession():
+    """
+    requests.Session wrapper used for all OpenVDM API calls.  Connections are
+    kept alive and re-used, every request has a connect and read timeout,
+    GET requests are retried with exponential backoff on connection errors
+    and gateway errors, and a circuit breaker stops requests while the API is
+    down.
+    """
+
+    def __init__(self, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT), retries=DEFAULT_GET_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+
+        self.timeout = timeout
+        self.circuit_breaker = CircuitBreaker()
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS_CODES, allowed_methods=['GET'], raise_on_status=False)
+
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(max_retries=retry))
+        self.session.mount('https://', HTTPAdapter(max_retries=retry))
+
+
+    def request(self, method, url, **kwargs):
+        """
+        Make a request, raises CircuitOpenError if the API is considered
+        unavailable
+        """
+
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError("OpenVDM API unavailable, not requesting: {}".format(url))
+
+        kwargs.setdefault('timeout', self.timeout)
+
+        try:
+            req = self.session.request(method, url, **kwargs)
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.circuit_breaker.record_failure()
+            raise
+
+        except Exception:
+            self.circuit_breaker.record_aborted()
+            raise
+
+        if req.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+        return req
+
+
+    def get(self, url, **kwargs):
+        """
+        Make a GET request
+        """
+
+        return self.request('GET', url, **kwargs)
+
+
+    def post(self, url, data=None, **kwargs):
+        """
+        Make a POST request, POST requests are not retried
+        """
+
+        return self.request('POST', url, data=data, **kwargs)
+
+
+_API_SESSION = None
+
+
+def get_api_session():
+    """
+    Return the API session shared by everything in this process
+    """
+
+    global _API_SESSION # pylint: disable=global-statement
+
+    if _API_SESSION is None:
+        _API_SESSION = APISession()
+
+    return _API_SESSION
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Utilities for caching the results of collection system transfer connection
+tests between the test and transfer workers.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+
+CONNECTION_TEST_CACHE_DIR = '/tmp/openvdm-connection-tests'
+
+# Fields that change while the transfer is running and do not affect the
+# outcome of the connection test
+VOLATILE_FIELDS = ['status', 'pid']
+
+
+def build_test_key(collection_system_transfer):
+    """
+    Return the cache key for the collection system transfer
+    """
+
+    return 'collectionSystemTransfer_' + str(collection_system_transfer['collectionSystemTransferID'])
+
+
+def build_test_fingerprint(transfer_config, *args):
+    """
+    Return a fingerprint of the transfer configuration and any additional
+    values the connection test depends on (i.e. the cruise ID).
+    """
+
+    config = {key: value for key, value in transfer_config.items() if key not in VOLATILE_FIELDS}
+
+    return hashlib.sha256(json.dumps([config] + list(args), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ConnectionTestCache():
+    """
+    Stores the latest connection test results for each transfer on disk so
+    they can be shared by all workers on this host.  Passing results are
+    re-used until they are older than ttl seconds, the transfer configuration
+    changes or the cache entry is invalidated.  A ttl of 0 disables the
+    cache.
+    """
+
+    def __init__(self, ttl, cache_dir=CONNECTION_TEST_CACHE_DIR):
+
+        self.ttl = int(ttl)
+        self.cache_dir = cache_dir
+
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+
+
+    def _build_filepath(self, key):
+        """
+        Return the cache filepath for the key
+        """
+
+        return os.path.join(self.cache_dir, key + '.json')
+
+
+    def get(self, key, fingerprint):
+        """
+        Return the cached passing test results for the key or None if a new
+        test is required.
+        """
+
+        if self.ttl <= 0:
+            return None
+
+        try:
+            with open(self._build_filepath(key), 'r') as cache_file:
+                entry = json.load(cache_file)
+
+        except (IOError, ValueError):
+            return None
+
+        if entry.get('fingerprint') != fingerprint:
+            logging.debug("Connection test cache for %s does not match the current configuration", key)
+            return None
+
+        if time.time() - entry.get('testedAt', 0) > self.ttl:
+            logging.debug("Connection test cache for %s has expired", key)
+            return None
+
+        results = entry.get('results', {})
+
+        if not results.get('parts') or results['parts'][-1]['result'] != "Pass":
+            return None
+
+        return results
+
+
+    def put(self, key, fingerprint, results):
+        """
+        Store the test results for the key
+        """
+
+        filepath = self._build_filepath(key)
+        tmp_filepath = filepath + '.tmp'
+
+        try:
+            with open(tmp_filepath, 'w') as cache_file:
+                json.dump({'fingerprint': fingerprint, 'testedAt': time.time(), 'results': results}, cache_file)
+
+            os.replace(tmp_filepath, filepath)
+
+        except IOError as err:
+            logging.warning("Unable to save connection test results for %s: %s", key, str(err))
+
+
+    def invalidate(self, key):
+        """
+        Remove the cached test results for the key
+        """
+
+        try:
+            os.remove(self._build_filepath(key))
+            logging.debug("Connection test cache for %s invalidated", key)
+
+        except FileNotFoundError:
+            pass
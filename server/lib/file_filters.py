@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Utilities for compiling and applying the include/exclude/ignore filters used
+by the transfer workers.
+"""
+import re
+import fnmatch
+import logging
+from functools import lru_cache
+
+from server.lib.check_filenames import is_ascii
+
+INCLUDE = 'include'
+EXCLUDE = 'exclude'
+IGNORE = 'ignore'
+
+
+def _split_patterns(filter_str):
+    """
+    Return the patterns in a comma-separated list of fnmatch-style patterns
+    """
+
+    return [pattern for pattern in filter_str.split(',') if pattern != '']
+
+
+def _translate_rsync_pattern(pattern):
+    """
+    Translate an fnmatch-style pattern into an rsync filter pattern that
+    matches the same relative filepaths.  fnmatch's * matches across
+    directories so it becomes rsync's **, a * that makes up a whole path
+    component becomes ?** so rsync does not also match zero directories.
+    Returns None if the pattern can not be translated.
+    """
+
+    if '\\' in pattern or pattern.startswith('/') or pattern.count('[') != pattern.count(']'):
+        return None
+
+    pattern = re.sub(r'\*+', '*', pattern)
+    rsync_pattern = ''
+
+    for idx, char in enumerate(pattern):
+        if char != '*':
+            rsync_pattern += char
+        elif (idx == 0 or pattern[idx - 1] == '/') and pattern[idx + 1:idx + 2] == '/':
+            rsync_pattern += '?**'
+        else:
+            rsync_pattern += '**'
+
+    return rsync_pattern
+
+
+def _compile_patterns(filter_str):
+    """
+    Compile a comma-separated list of fnmatch-style patterns into a single
+    regular expression.  Returns None if the list contains no patterns.
+    """
+
+    patterns = _split_patterns(filter_str)
+
+    if len(patterns) == 0:
+        return None
+
+    return re.compile('|'.join('(?:{})'.format(fnmatch.translate(pattern)) for pattern in patterns))
+
+
+class CompiledFilters():
+    """
+    Pre-compiled include/exclude/ignore filters.  Precedence is:
+        1. ignore filter matches --> ignored
+        2. non-ascii filepath --> excluded
+        3. include filter matches and exclude filter matches --> excluded
+        4. include filter matches --> included
+        5. no include filter match --> excluded
+    """
+
+    def __init__(self, include_filter, exclude_filter, ignore_filter):
+
+        self.include_filter = include_filter
+        self.exclude_filter = exclude_filter
+        self.ignore_filter = ignore_filter
+
+        self._include = _compile_patterns(include_filter)
+        self._exclude = _compile_patterns(exclude_filter)
+        self._ignore = _compile_patterns(ignore_filter)
+
+
+    def is_ignored(self, filepath):
+        """
+        Return whether the filepath matches the ignore filter
+        """
+
+        return self._ignore is not None and self._ignore.match(filepath) is not None
+
+
+    def is_excluded(self, filepath):
+        """
+        Return whether the filepath matches the exclude filter
+        """
+
+        return self._exclude is not None and self._exclude.match(filepath) is not None
+
+
+    def is_included(self, filepath):
+        """
+        Return whether the filepath matches the include filter
+        """
+
+        return self._include is not None and self._include.match(filepath) is not None
+
+
+    def rsync_filter_args(self):
+        """
+        Return the rsync --filter arguments that stop the remote end from
+        listing files matching the ignore filter.  Ignore patterns ending in
+        /* also prune the matching directories.  Directories are otherwise
+        always listed so a pattern like *.log can not hide a directory's
+        contents.  The include/exclude filters and the time window are still
+        applied locally since excluded files must be reported.
+        """
+
+        dir_rules = []
+        file_rules = []
+
+        for pattern in _split_patterns(self.ignore_filter):
+            rsync_pattern = _translate_rsync_pattern(pattern)
+
+            if rsync_pattern is None:
+                logging.debug("Unable to translate ignore pattern to an rsync filter: %s", pattern)
+                continue
+
+            if pattern.endswith('/*') and len(pattern) > 2:
+                dir_pattern = _translate_rsync_pattern(pattern[:-2])
+                if dir_pattern:
+                    dir_rules.append('- /' + dir_pattern + '/')
+
+            file_rules.append('- /' + rsync_pattern)
+
+        if len(file_rules) == 0:
+            return []
+
+        return ['--filter=' + rule for rule in dir_rules + ['+ */'] + file_rules]
+
+
+    def verdict(self, filepath):
+        """
+        Return the verdict (INCLUDE, EXCLUDE or IGNORE) for the filepath
+        """
+
+        if self.is_ignored(filepath):
+            return IGNORE
+
+        if not is_ascii(filepath):
+            logging.debug("%s is not an ascii-encoded unicode string", filepath)
+            return EXCLUDE
+
+        if self.is_included(filepath) and not self.is_excluded(filepath):
+            return INCLUDE
+
+        return EXCLUDE
+
+
+@lru_cache(maxsize=64)
+def _compile_filters(include_filter, exclude_filter, ignore_filter):
+    """
+    Cached constructor for CompiledFilters
+    """
+
+    logging.debug("Compiling filters, include: %s, exclude: %s, ignore: %s", include_filter, exclude_filter, ignore_filter)
+    return CompiledFilters(include_filter, exclude_filter, ignore_filter)
+
+
+def compile_filters(filters):
+    """
+    Return the CompiledFilters for the provided filters dict (the output of a
+    worker's build_filters function).  Compiled filters are cached per unique
+    filter configuration.
+    """
+
+    return _compile_filters(filters.get('includeFilter', ''), filters.get('excludeFilter', ''), filters.get('ignoreFilter', ''))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Utilities for moving large file lists out of Gearman job payloads and into
+on-disk manifest files.
+"""
+import os
+import json
+import time
+import errno
+import logging
+
+MANIFEST_DIRNAME = '.manifests'
+
+MANIFEST_SUFFIX = '.ndjson'
+
+DEFAULT_MANIFEST_THRESHOLD = 1000 # files
+
+MANIFEST_MAX_AGE = 7 * 24 * 60 * 60 # 7 days
+
+
+def build_manifest_dirpath(logfile_dirpath):
+    """
+    Return the path to the manifest directory within the transfer log directory
+    """
+
+    return os.path.join(logfile_dirpath, MANIFEST_DIRNAME)
+
+
+def prune_manifests(manifest_dirpath, max_age=MANIFEST_MAX_AGE):
+    """
+    Remove manifests older than max_age seconds
+    """
+
+    threshold_time = time.time() - max_age
+
+    try:
+        with os.scandir(manifest_dirpath) as entries:
+            for entry in entries:
+                if entry.name.endswith(MANIFEST_SUFFIX) and entry.stat().st_mtime < threshold_time:
+                    logging.debug("Removing expired manifest: %s", entry.path)
+                    os.remove(entry.path)
+    except OSError as err:
+        logging.debug("Unable to prune manifests: %s", str(err))
+
+
+def write_manifest(manifest_filepath, files):
+    """
+    Write the file lists to an NDJSON manifest, one ["<list name>", "<filename>"]
+    array per line
+    """
+
+    try:
+        os.makedirs(os.path.dirname(manifest_filepath))
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            logging.error("Unable to create parent directory for manifest")
+            return {'verdict': False, 'reason': 'Unable to create parent directory(ies) for manifest: {}'.format(manifest_filepath) }
+
+    tmp_filepath = manifest_filepath + '.tmp'
+
+    try:
+        with open(tmp_filepath, 'w') as manifest_file:
+            for list_name, filenames in files.items():
+                for filename in filenames:
+                    manifest_file.write(json.dumps([list_name, filename], separators=(',', ':')) + '\n')
+        os.replace(tmp_filepath, manifest_filepath)
+    except IOError:
+        logging.error("Error saving manifest: %s", manifest_filepath)
+        return {'verdict': False, 'reason': 'Unable to save manifest: {}'.format(manifest_filepath) }
+
+    return {'verdict': True}
+
+
+def spill_files(files, manifest_filepath, threshold=DEFAULT_MANIFEST_THRESHOLD):
+    """
+    Return the files dict to include in a job payload.  If the lists contain
+    more than threshold files in total they are written to manifest_filepath
+    and a {'manifest': <path>, 'counts': {<list name>: <count>}} reference is
+    returned instead.  If the manifest can not be written the files are
+    returned unchanged.
+    """
+
+    if 'manifest' in files or sum(len(filenames) for filenames in files.values()) <= threshold:
+        return files
+
+    prune_manifests(os.path.dirname(manifest_filepath))
+
+    output_results = write_manifest(manifest_filepath, files)
+    if not output_results['verdict']:
+        logging.warning("Unable to write manifest, sending file lists inline: %s", output_results['reason'])
+        return files
+
+    return {'manifest': manifest_filepath, 'counts': {list_name: len(filenames) for list_name, filenames in files.items()}}
+
+
+def iter_files(files, list_name):
+    """
+    Yield the filenames in the named list of a files dict from a job payload,
+    streaming them from the manifest if the lists were spilled to disk
+    """
+
+    if 'manifest' not in files:
+        yield from files.get(list_name) or []
+        return
+
+    with open(files['manifest'], 'r') as manifest_file:
+        for line in manifest_file:
+            entry_list_name, filename = json.loads(line)
+            if entry_list_name == list_name:
+                yield filename
+
+
+def count_files(files, list_name):
+    """
+    Return the number of filenames in the named list of a files dict from a job
+    payload
+    """
+
+    if 'manifest' in files:
+        return files['counts'].get(list_name, 0)
+
+    return len(files.get(list_name) or [])
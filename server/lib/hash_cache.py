@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Utilities for maintaining a persistent cache of file hashes so that
+unchanged files do not need to be re-hashed.
+"""
+import os
+import time
+import errno
+import sqlite3
+import logging
+
+HASH_CACHE_DIRNAME = '.hash_cache'
+
+HASH_CACHE_FN = 'md5.db'
+
+# Files modified this recently are not cached.  Their mtime may not change
+# for writes made within the same timestamp tick.
+RACY_WINDOW = 2
+
+
+def build_hash_cache_filepath(logfile_dirpath):
+    """
+    Return the path to the hash cache within the transfer log directory
+    """
+
+    return os.path.join(logfile_dirpath, HASH_CACHE_DIRNAME, HASH_CACHE_FN)
+
+
+class HashCache():
+    """
+    On-disk (sqlite) cache of file hashes.  Each hash is stored with the
+    size, mtime (ns) and inode of the file when it was hashed, a cached hash
+    is only returned while all three still match.  Filenames are relative to
+    the cruise directory.  A cache that can not be opened is treated as empty
+    and nothing is saved.
+    """
+
+    def __init__(self, cache_filepath):
+
+        self.cache_filepath = cache_filepath
+        self.db = None
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'removed': 0}
+
+        self.open()
+
+
+    def open(self):
+        """
+        Open the cache, creating it if necessary
+        """
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_filepath))
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                logging.warning("Unable to create parent directory for hash cache, hashing all files")
+                return
+
+        try:
+            self.db = sqlite3.connect(self.cache_filepath)
+            self.db.execute('CREATE TABLE IF NOT EXISTS hashes (filename TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, hash TEXT) WITHOUT ROWID')
+        except sqlite3.Error as err:
+            logging.warning("Unable to open hash cache %s, hashing all files", self.cache_filepath)
+            logging.debug(str(err))
+            self.db = None
+
+
+    def lookup(self, filename, file_stat):
+        """
+        Return the cached hash of the file or None if the file is not cached
+        or has changed since it was hashed
+        """
+
+        if self.db is None:
+            return None
+
+        row = self.db.execute('SELECT size, mtime_ns, inode, hash FROM hashes WHERE filename = ?', (filename,)).fetchone()
+
+        if row is None or tuple(row[:3]) != (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino):
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return row[3]
+
+
+    def store(self, entries):
+        """
+        Add or replace cached hashes, entries is a list of (filename, stat,
+        hash) tuples.  Files modified within the racy window are skipped.
+        """
+
+        if self.db is None:
+            return
+
+        threshold_ns = (time.time() - RACY_WINDOW) * 1e9
+        rows = [(filename, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, md5_hash) for filename, file_stat, md5_hash in entries if file_stat.st_mtime_ns < threshold_ns]
+
+        try:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO hashes (filename, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?)', rows)
+            self.stats['stored'] += len(rows)
+        except sqlite3.Error as err:
+            logging.warning("Unable to save hashes to hash cache %s", self.cache_filepath)
+            logging.debug(str(err))
+
+
+    def retain(self, filenames):
+        """
+        Remove the cached hashes of files not in filenames
+        """
+
+        if self.db is None:
+            return
+
+        try:
+            with self.db:
+                self.db.execute('CREATE TEMP TABLE IF NOT EXISTS retained (filename TEXT PRIMARY KEY) WITHOUT ROWID')
+                self.db.execute('DELETE FROM retained')
+                self.db.executemany('INSERT OR IGNORE INTO retained (filename) VALUES (?)', ((filename,) for filename in filenames))
+                self.stats['removed'] += self.db.execute('DELETE FROM hashes WHERE filename NOT IN (SELECT filename FROM retained)').rowcount
+                self.db.execute('DELETE FROM retained')
+        except sqlite3.Error as err:
+            logging.warning("Unable to prune hash cache %s", self.cache_filepath)
+            logging.debug(str(err))
+
+
+    def close(self):
+        """
+        Close the cache
+        """
+
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -9,6 +9,7 @@ import subprocess
 
 from os.path import dirname, realpath
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
+from server.lib.file_manifest import iter_files
 from server.lib.read_config import read_config
 from server.lib.openvdm import DEFAULT_CONFIG_FILE
 
@@ -30,8 +31,9 @@ def build_commands(gearman_worker, command_list):
         command['command'] = [arg.replace('{loweringID}', gearman_worker.lowering_id) for arg in command['command']] if gearman_worker.lowering_id else command['command']
         command['command'] = [arg.replace('{collectionSystemTransferID}', gearman_worker.collection_system_transfer['collectionSystemTransferID']) for arg in command['command']] if gearman_worker.collection_system_transfer else command['command']
         command['command'] = [arg.replace('{collectionSystemTransferName}', gearman_worker.collection_system_transfer['name']) for arg in command['command']] if gearman_worker.collection_system_transfer else command['command']
-        command['command'] = [arg.replace('{newFiles}', json.dumps(gearman_worker.files['new'])) for arg in command['command']] if gearman_worker.files else command['command']
-        command['command'] = [arg.replace('{updatedFiles}', json.dumps(gearman_worker.files['updated']) ) for arg in command['command']] if gearman_worker.files else command['command']
+        command['command'] = [arg.replace('{newFiles}', json.dumps(list(iter_files(gearman_worker.files, 'new')))) if '{newFiles}' in arg else arg for arg in command['command']] if gearman_worker.files else command['command']
+        command['command'] = [arg.replace('{updatedFiles}', json.dumps(list(iter_files(gearman_worker.files, 'updated')))) if '{updatedFiles}' in arg else arg for arg in command['command']] if gearman_worker.files else command['command']
+        command['command'] = [arg.replace('{filesManifest}', gearman_worker.files.get('manifest', '')) for arg in command['command']] if gearman_worker.files else command['command']
 
     logging.debug("Processed Command: %s", json.dumps(command_list))
 
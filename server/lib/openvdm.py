@@ -29,20 +29,23 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>.
 """
 
+import os
 import sys
 import json
 import datetime
 import logging
 
+from contextlib import contextmanager
 from os.path import dirname, realpath
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
-import requests
-
 from server.lib import read_config
+from server.lib.api_cache import APICache
 
 
-DEFAULT_CONFIG_FILE = './server/etc/openvdm.yaml'
+# OPENVDM_CONFIG_FILE overrides the configuration file, used by the offline
+# harness (server/harness) to point the workers at a stand-in API
+DEFAULT_CONFIG_FILE = os.environ.get('OPENVDM_CONFIG_FILE', './server/etc/openvdm.yaml')
 
 DEFAULT_CRUISE_CONFIG_FN = 'ovdmConfig.json'
 
@@ -54,6 +57,52 @@ DEFAULT_MD5_SUMMARY_FN = 'MD5_Summary.txt'
 
 DEFAULT_MD5_SUMMARY_MD5_FN = 'MD5_Summary.md5'
 
+DEFAULT_SSH_CONTROL_PERSIST = 600
+
+DEFAULT_CONNECTION_TEST_TTL = 300
+
+DEFAULT_FILE_MANIFEST_THRESHOLD = 1000
+
+DEFAULT_SCHEDULER_QUEUE_THRESHOLD = 10
+
+DEFAULT_MD5_HASHING_THREADS = 0 # based on the storage
+
+# Time-to-live (in seconds) of the cached responses for the slow-changing API
+# endpoints.  Responses that include transfer/task status are never cached.
+API_CACHE_TTLS = {
+    'shipboardDataWarehouseConfig': 300,
+    'requiredExtraDirectories': 300,
+    'extraDirectories': 60,
+    'tasks': 300,
+    'collectionSystemTransfers': 60
+}
+
+# Batched status update operation --> single-call API endpoint, the single
+# calls are used when the server does not support batched updates
+BATCH_OPERATIONS = {
+    'setErrorTask': 'api/tasks/setErrorTask/',
+    'setRunningTask': 'api/tasks/setRunningTask/',
+    'setIdleTask': 'api/tasks/setIdleTask/',
+    'setErrorCollectionSystemTransfer': 'api/collectionSystemTransfers/setErrorCollectionSystemTransfer/',
+    'setRunningCollectionSystemTransfer': 'api/collectionSystemTransfers/setRunningCollectionSystemTransfer/',
+    'setIdleCollectionSystemTransfer': 'api/collectionSystemTransfers/setIdleCollectionSystemTransfer/',
+    'setErrorCruiseDataTransfer': 'api/cruiseDataTransfers/setErrorCruiseDataTransfer/',
+    'setRunningCruiseDataTransfer': 'api/cruiseDataTransfers/setRunningCruiseDataTransfer/',
+    'setIdleCruiseDataTransfer': 'api/cruiseDataTransfers/setIdleCruiseDataTransfer/',
+    'newJob': 'api/gearman/newJob/',
+    'newMessage': 'api/messages/newMessage'
+}
+
+# Queued operations are sent once this many have accumulated
+BATCH_MAX_OPERATIONS = 100
+
+DEFAULT_COLLECTION_SYSTEM_TRANSFER_SETTINGS = {
+    'stalenessSettleDelay': 5,
+    'transferStreams': 1,
+    'minInterval': 60,
+    'maxInterval': None # the transfer interval
+}
+
 
 class OpenVDM():
 
@@ -63,7 +112,196 @@ class OpenVDM():
 
     def __init__(self, config_file = DEFAULT_CONFIG_FILE):
 
-        self.config = read_config.read_config(config_file)
+        # the configuration, API session and API cache are created on first
+        # use so that instances that never call the API (i.e. the data
+        # dashboard parsers) are cheap to create
+        self.config_file = config_file
+        self._config = None
+        self._api = None
+        self._cache = None
+        self.cache_cruise_id = None
+        self.cache_lowering_id = None
+        self.batch_operations = None
+        self.batch_supported = True
+
+
+    @property
+    def config(self):
+        """
+        The OpenVDM configuration, read on first use
+        """
+
+        if self._config is None:
+            self._config = read_config.read_config(self.config_file)
+
+        return self._config
+
+
+    @property
+    def api(self):
+        """
+        The API session, shared by everything in the process
+        """
+
+        if self._api is None:
+            # imported here so that requests is only loaded by processes
+            # that actually talk to the API
+            from server.lib.api_session import get_api_session # pylint: disable=import-outside-toplevel
+            self._api = get_api_session()
+
+        return self._api
+
+
+    @property
+    def cache(self):
+        """
+        The API response cache, created on first use
+        """
+
+        if self._cache is None:
+            self._cache = APICache(API_CACHE_TTLS)
+
+        return self._cache
+
+
+    def invalidate_cache(self):
+        """
+        Discard the cached API responses, used when a new cruise or lowering is
+        started
+        """
+
+        self.cache.invalidate()
+
+
+    def get_cache_stats(self):
+        """
+        Return the API cache hit/miss counters
+        """
+
+        return self.cache.stats()
+
+
+    @contextmanager
+    def batch(self):
+        """
+        Queue the status updates, job tracking and messages made within the
+        context and send them to the API in as few requests as possible.  The
+        queued operations are sent when the context exits, even if it exits
+        with an exception.  Nested batches are sent by the outermost batch.
+        """
+
+        if self.batch_operations is not None:
+            yield
+            return
+
+        self.batch_operations = []
+
+        try:
+            yield
+        finally:
+            try:
+                self.flush_batch()
+            finally:
+                self.batch_operations = None
+
+
+    def flush_batch(self):
+        """
+        Send the queued operations of the current batch
+        """
+
+        if not self.batch_operations:
+            return
+
+        operations = self.batch_operations
+        self.batch_operations = []
+
+        if self.batch_supported:
+            url = self.config['siteRoot'] + 'api/batch/update'
+
+            try:
+                req = self.api.post(url, data={'operations': json.dumps(operations)})
+            except Exception as err:
+                logging.error("Unable to send %s batched update(s) with OpenVDM API", len(operations))
+                raise err
+
+            if req.status_code == 404:
+                logging.warning("OpenVDM API does not support batched updates, sending updates individually")
+                self.batch_supported = False
+
+            else:
+                try:
+                    return_obj = json.loads(req.text) if 200 <= req.status_code < 300 else None
+                    status = return_obj['status']
+                except (ValueError, TypeError, KeyError):
+                    # i.e. an error page, the operations may not have been applied
+                    logging.error("Invalid response (%s) to batched update(s) from OpenVDM API, sending updates individually", req.status_code)
+                    status = None
+
+                if status is not None:
+                    if status != 'success':
+                        logging.warning("Batched update(s) not applied: %s", json.dumps([result for result in return_obj.get('results', []) if result['status'] != 'success']))
+                    return
+
+        for operation in operations:
+            self._send_operation(operation)
+
+
+    def _send_operation(self, operation):
+        """
+        Send a single status update operation to the API
+        """
+
+        url = self.config['siteRoot'] + BATCH_OPERATIONS[operation['op']] + operation.get('id', '')
+
+        if 'data' in operation:
+            return self.api.post(url, data=operation['data'])
+
+        return self.api.get(url)
+
+
+    def _update(self, operation_name, object_id=None, data=None):
+        """
+        Send a status update operation to the API, or queue it if a batch is in
+        progress.  Returns the response or None if the operation was queued.
+        """
+
+        operation = {'op': operation_name}
+
+        if object_id is not None:
+            operation['id'] = object_id
+
+        if data is not None:
+            operation['data'] = data
+
+        if self.batch_operations is None:
+            return self._send_operation(operation)
+
+        self.batch_operations.append(operation)
+
+        if len(self.batch_operations) >= BATCH_MAX_OPERATIONS:
+            self.flush_batch()
+
+        return None
+
+
+    def _check_cache_scope(self, cruise_id=None, lowering_id=None):
+        """
+        Invalidate the cached API responses if the current cruise or lowering
+        has changed since they were fetched
+        """
+
+        if cruise_id is not None:
+            if self.cache_cruise_id is not None and cruise_id != self.cache_cruise_id:
+                logging.debug("Cruise changed from %s to %s", self.cache_cruise_id, cruise_id)
+                self.invalidate_cache()
+            self.cache_cruise_id = cruise_id
+
+        if lowering_id is not None:
+            if self.cache_lowering_id is not None and lowering_id != self.cache_lowering_id:
+                logging.debug("Lowering changed from %s to %s", self.cache_lowering_id, lowering_id)
+                self.invalidate_cache()
+            self.cache_lowering_id = lowering_id
 
 
     def clear_gearman_jobs_from_db(self):
@@ -74,7 +312,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/gearman/clearAllJobsFromDB'
 
         try:
-            requests.get(url)
+            self.api.get(url)
         except Exception as err:
             logging.error("Unable to clear Gearman Jobs from OpenVDM API")
             raise err
@@ -113,7 +351,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getShowLoweringComponents'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return req.text == 'true'
         except Exception as err:
             logging.error("Unable to retrieve 'showLoweringComponents' flag from OpenVDM API")
@@ -128,7 +366,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getCruiseConfig'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return_obj['configCreatedOn'] = datetime.datetime.utcnow().strftime("%Y/%m/%dT%H:%M:%SZ")
             return return_obj
@@ -145,7 +383,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getLoweringConfig'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return_obj['configCreatedOn'] = datetime.datetime.utcnow().strftime("%Y/%m/%dT%H:%M:%SZ")
             return return_obj
@@ -177,7 +415,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getMD5FilesizeLimit'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['md5FilesizeLimit']
         except Exception as err:
@@ -192,7 +430,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getMD5FilesizeLimitStatus'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['md5FilesizeLimitStatus']
         except Exception as err:
@@ -212,6 +450,76 @@ class OpenVDM():
         else:
             return self.config['hooks'][hook_name]
 
+    def get_collection_system_transfer_settings(self, collection_system_transfer_name):
+        """
+        Return the worker settings for the collection system transfer with the
+        given name.  Settings not defined in the configuration file are set to
+        their default values.
+        """
+
+        settings = dict(DEFAULT_COLLECTION_SYSTEM_TRANSFER_SETTINGS)
+
+        for collection_system_settings in self.config.get('collectionSystemTransferSettings') or []:
+            if collection_system_settings.get('collectionSystemTransferName') == collection_system_transfer_name:
+                settings.update({key: value for key, value in collection_system_settings.items() if key != 'collectionSystemTransferName'})
+                break
+
+        return settings
+
+
+    def get_connection_test_ttl(self):
+        """
+        Return how long (in seconds) a passing connection test is re-used by
+        the transfer workers
+        """
+
+        return self.config.get('connectionTestTTL', DEFAULT_CONNECTION_TEST_TTL)
+
+
+    def get_file_manifest_threshold(self):
+        """
+        Return the number of files above which the file lists passed to the
+        post-transfer tasks are written to a manifest file
+        """
+
+        return self.config.get('fileManifestThreshold', DEFAULT_FILE_MANIFEST_THRESHOLD)
+
+
+    def get_md5_hashing_threads(self):
+        """
+        Return the number of threads used to build the MD5 summary hashes, 0
+        to pick the number based on the storage holding the cruise directory
+        """
+
+        return self.config.get('md5HashingThreads', DEFAULT_MD5_HASHING_THREADS)
+
+
+    def get_worker_pools(self):
+        """
+        Return the worker pool definitions used by worker_pool.py
+        """
+
+        return self.config.get('workerPools') or []
+
+
+    def get_scheduler_queue_threshold(self):
+        """
+        Return the number of waiting Gearman jobs above which the scheduler
+        holds back low-priority transfers
+        """
+
+        return self.config.get('schedulerQueueThreshold', DEFAULT_SCHEDULER_QUEUE_THRESHOLD)
+
+
+    def get_ssh_control_persist(self):
+        """
+        Return how long (in seconds) idle multiplexed ssh connections are kept
+        open
+        """
+
+        return self.config.get('sshControlPersist', DEFAULT_SSH_CONTROL_PERSIST)
+
+
     def get_transfer_interval(self):
         """
         Return the transfer interval
@@ -228,8 +536,9 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getCruiseID'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
+            self._check_cache_scope(cruise_id=return_obj['cruiseID'])
             return return_obj['cruiseID']
         except Exception as err:
             logging.error("Unable to retrieve CruiseID from OpenVDM API")
@@ -243,7 +552,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getCruiseSize'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -259,7 +568,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getCruiseStartDate'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['cruiseStartDate']
         except Exception as err:
@@ -275,7 +584,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getCruiseEndDate'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['cruiseEndDate']
         except Exception as err:
@@ -291,7 +600,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getCruises'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -307,8 +616,9 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getLoweringID'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
+            self._check_cache_scope(lowering_id=return_obj['loweringID'])
             return return_obj['loweringID'] if return_obj['loweringID'] != '' else None
         except Exception as err:
             logging.error("Unable to retrieve LoweringID from OpenVDM API")
@@ -323,7 +633,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getLoweringSize'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -339,7 +649,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getLoweringStartDate'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['loweringStartDate']
         except Exception as err:
@@ -354,7 +664,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getLoweringEndDate'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['loweringEndDate']
         except Exception as err:
@@ -370,7 +680,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getLowerings'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -386,7 +696,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/extraDirectories/getExtraDirectory/' + extra_directory_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj[0] if len(return_obj) > 0 else None
         except Exception as err:
@@ -398,8 +708,7 @@ class OpenVDM():
         Return the extra directory configuration based on the extra_directory_name
         """
 
-        extra_directory = list(filter(lambda directory: directory['name'] == extra_directory_name, self.get_extra_directories()))
-        return extra_directory[0] if len(extra_directory) > 0 else None
+        return self.cache.lookup('extraDirectories', 'name', extra_directory_name, self.get_extra_directories)
 
     def get_extra_directories(self):
         """
@@ -410,7 +719,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/extraDirectories/getExtraDirectories'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -426,7 +735,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/extraDirectories/getRequiredExtraDirectory/' + extra_directory_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj[0]
         except Exception as err:
@@ -438,18 +747,24 @@ class OpenVDM():
         Return the required extra directory configuration based on the extra_directory_name
         """
 
-        extra_directory = list(filter(lambda directory: directory['name'] == extra_directory_name, self.get_required_extra_directories()))
-        return extra_directory[0] if len(extra_directory) > 0 else None
+        return self.cache.lookup('requiredExtraDirectories', 'name', extra_directory_name, self._fetch_required_extra_directories)
 
     def get_required_extra_directories(self):
         """
         Return all required extra directories
         """
 
+        return self.cache.get('requiredExtraDirectories', self._fetch_required_extra_directories)
+
+    def _fetch_required_extra_directories(self):
+        """
+        Retrieve all required extra directories from the OpenVDM API
+        """
+
         url = self.config['siteRoot'] + 'api/extraDirectories/getRequiredExtraDirectories'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -461,10 +776,18 @@ class OpenVDM():
         Return the shipboard data warehouse configuration
         """
 
+        return self.cache.get('shipboardDataWarehouseConfig', self._fetch_shipboard_data_warehouse_config)
+
+    def _fetch_shipboard_data_warehouse_config(self):
+        """
+        Retrieve the shipboard data warehouse configuration from the OpenVDM
+        API
+        """
+
         url = self.config['siteRoot'] + 'api/warehouse/getShipboardDataWarehouseConfig'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -480,7 +803,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getShipToShoreBWLimitStatus'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['shipToShoreBWLimitStatus'] == "On"
         except Exception as err:
@@ -496,7 +819,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/shipToShoreTransfers/getShipToShoreTransfer/' + ship_to_shore_transfer_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return json.loads(req.text)[0]
         except Exception as err:
             logging.error("Unable to retrieve ship-to-shore transfer: %s from OpenVDM API", ship_to_shore_transfer_id)
@@ -510,7 +833,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/shipToShoreTransfers/getShipToShoreTransfers'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return json.loads(req.text)
         except Exception as err:
             logging.error("Unable to retrieve ship-to-shore transfers from OpenVDM API")
@@ -525,7 +848,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/shipToShoreTransfers/getRequiredShipToShoreTransfers'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return json.loads(req.text)
         except Exception as err:
             logging.error("Unable to retrieve required ship-to-shore transfers from OpenVDM API")
@@ -540,7 +863,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/warehouse/getSystemStatus'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj['systemStatus']
         except Exception as err:
@@ -555,7 +878,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/tasks/getTasks'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -571,7 +894,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/tasks/getActiveTasks'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -587,7 +910,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/tasks/getTask/' + task_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             task = json.loads(req.text)
             return task[0] if len(task) > 0 else None
         except Exception as err:
@@ -600,16 +923,7 @@ class OpenVDM():
         Return a task based on the task_name
         """
 
-        url = self.config['siteRoot'] + 'api/tasks/getTasks'
-
-        try:
-            req = requests.get(url)
-            tasks = json.loads(req.text)
-            task = list(filter(lambda task: task['name'] == task_name, tasks))
-            return task[0] if len(task) > 0 else None
-        except Exception as err:
-            logging.error("Unable to retrieve task: %s from OpenVDM API", task_name)
-            raise err
+        return self.cache.lookup('tasks', 'name', task_name, self.get_tasks)
 
 
     def get_collection_system_transfers(self):
@@ -621,7 +935,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/collectionSystemTransfers/getCollectionSystemTransfers'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -637,7 +951,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/collectionSystemTransfers/getActiveCollectionSystemTransfers'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             if not cruise:
                 return_obj = list(filter(lambda transfer: transfer['cruiseOrLowering'] != "0", return_obj))
@@ -657,7 +971,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/collectionSystemTransfers/getCollectionSystemTransfer/' + collection_system_transfer_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj[0] if len(return_obj) > 0 else False
         except Exception as err:
@@ -670,8 +984,8 @@ class OpenVDM():
         Return the collection system transfer configuration based on the collection_system_transfer_name
         """
 
-        collection_system_transfer = list(filter(lambda transfer: transfer['name'] == collection_system_transfer_name, self.get_collection_system_transfers()))
-        return collection_system_transfer[0] if len(collection_system_transfer) > 0 else False
+        collection_system_transfer = self.cache.lookup('collectionSystemTransfers', 'name', collection_system_transfer_name, self.get_collection_system_transfers)
+        return collection_system_transfer if collection_system_transfer is not None else False
 
 
     def get_cruise_data_transfers(self):
@@ -682,7 +996,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/cruiseDataTransfers/getCruiseDataTransfers'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -697,7 +1011,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/cruiseDataTransfers/getRequiredCruiseDataTransfers'
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj
         except Exception as err:
@@ -712,7 +1026,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/cruiseDataTransfers/getCruiseDataTransfer/' + cruise_data_transfer_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj[0]
         except Exception as err:
@@ -728,7 +1042,7 @@ class OpenVDM():
         url = self.config['siteRoot'] + 'api/cruiseDataTransfers/getRequiredCruiseDataTransfer/' + cruise_data_transfer_id
 
         try:
-            req = requests.get(url)
+            req = self.api.get(url)
             return_obj = json.loads(req.text)
             return return_obj[0]
         except Exception as err:
@@ -758,12 +1072,10 @@ class OpenVDM():
         Send a message to OpenVDM
         """
 
-        url = self.config['siteRoot'] + 'api/messages/newMessage'
-
         try:
             payload = {'messageTitle': message_title, 'messageBody':message_body}
-            req = requests.post(url, data=payload)
-            return req.text
+            req = self._update('newMessage', data=payload)
+            return req.text if req is not None else None
         except Exception as err:
             logging.error("Unable to send message: \"%s: %s\" with OpenVDM API", message_title, message_body)
             raise err
@@ -776,10 +1088,8 @@ class OpenVDM():
 
         if job_status == "3":
             # Clear Error for current tranfer in DB via API
-            url = self.config['siteRoot'] + 'api/collectionSystemTransfers/setIdleCollectionSystemTransfer/' + collection_system_transfer_id
-
             try:
-                requests.get(url)
+                self._update('setIdleCollectionSystemTransfer', collection_system_transfer_id)
             except Exception as err:
                 logging.error("Unable to clear error status for collection system transfer: %s with OpenVDM API", collection_system_transfer_id)
                 raise err
@@ -791,10 +1101,8 @@ class OpenVDM():
 
         if job_status == "3":
             # Clear Error for current tranfer in DB via API
-            url = self.config['siteRoot'] + 'api/cruiseDataTransfers/setIdleCruiseDataTransfer/' + cruise_data_transfer_id
-
             try:
-                requests.get(url)
+                self._update('setIdleCruiseDataTransfer', cruise_data_transfer_id)
             except Exception as err:
                 logging.error("Unable to clear error status for cruise data transfer: %s with OpenVDM API", cruise_data_transfer_id)
                 raise err
@@ -815,13 +1123,12 @@ class OpenVDM():
         """
 
         # Set Error for current tranfer in DB via API
-        url = self.config['siteRoot'] + 'api/collectionSystemTransfers/setErrorCollectionSystemTransfer/' + collection_system_transfer_id
-
         try:
-            requests.get(url)
-            collection_system_transfer_name = self.get_collection_system_transfer(collection_system_transfer_id)['name']
-            title = collection_system_transfer_name + ' Data Transfer failed'
-            self.send_msg(title, reason)
+            with self.batch():
+                self._update('setErrorCollectionSystemTransfer', collection_system_transfer_id)
+                collection_system_transfer_name = self.get_collection_system_transfer(collection_system_transfer_id)['name']
+                title = collection_system_transfer_name + ' Data Transfer failed'
+                self.send_msg(title, reason)
         except Exception as err:
             logging.error("Unable to set status of collection system transfer: %s to error with OpenVDM API", collection_system_transfer_id)
             raise err
@@ -832,13 +1139,12 @@ class OpenVDM():
         """
 
         # Set Error for current tranfer test in DB via API
-        url = self.config['siteRoot'] + 'api/collectionSystemTransfers/setErrorCollectionSystemTransfer/' + collection_system_transfer_id
-
         try:
-            requests.get(url)
-            collection_system_transfer_name = self.get_collection_system_transfer(collection_system_transfer_id)['name']
-            title = collection_system_transfer_name + ' Connection test failed'
-            self.send_msg(title, reason)
+            with self.batch():
+                self._update('setErrorCollectionSystemTransfer', collection_system_transfer_id)
+                collection_system_transfer_name = self.get_collection_system_transfer(collection_system_transfer_id)['name']
+                title = collection_system_transfer_name + ' Connection test failed'
+                self.send_msg(title, reason)
         except Exception as err:
             logging.error("Unable to set test status of collection system transfer: %s to error with OpenVDM API", collection_system_transfer_id)
             raise err
@@ -850,13 +1156,12 @@ class OpenVDM():
         """
 
         # Set Error for current tranfer in DB via API
-        url = self.config['siteRoot'] + 'api/cruiseDataTransfers/setErrorCruiseDataTransfer/' + cruise_data_transfer_id
-
         try:
-            requests.get(url)
-            cruise_data_transfer_name = self.get_cruise_data_transfer(cruise_data_transfer_id)['name']
-            title = cruise_data_transfer_name + ' Data Transfer failed'
-            self.send_msg(title, reason)
+            with self.batch():
+                self._update('setErrorCruiseDataTransfer', cruise_data_transfer_id)
+                cruise_data_transfer_name = self.get_cruise_data_transfer(cruise_data_transfer_id)['name']
+                title = cruise_data_transfer_name + ' Data Transfer failed'
+                self.send_msg(title, reason)
         except Exception as err:
             logging.error("Unable to set status of cruise data transfer: %s to error with OpenVDM API", cruise_data_transfer_id)
             raise err
@@ -867,13 +1172,12 @@ class OpenVDM():
         """
 
         # Set Error for current tranfer test in DB via API
-        url = self.config['siteRoot'] + 'api/cruiseDataTransfers/setErrorCruiseDataTransfer/' + cruise_data_transfer_id
-
         try:
-            requests.get(url)
-            cruise_data_transfer_name = self.get_cruise_data_transfer(cruise_data_transfer_id)['name']
-            title = cruise_data_transfer_name + ' Connection test failed'
-            self.send_msg(title, reason)
+            with self.batch():
+                self._update('setErrorCruiseDataTransfer', cruise_data_transfer_id)
+                cruise_data_transfer_name = self.get_cruise_data_transfer(cruise_data_transfer_id)['name']
+                title = cruise_data_transfer_name + ' Connection test failed'
+                self.send_msg(title, reason)
         except Exception as err:
             logging.error("Unable to set test status of cruise data transfer: %s to error with OpenVDM API", cruise_data_transfer_id)
             raise err
@@ -884,13 +1188,12 @@ class OpenVDM():
         """
 
         # Set Error for current task in DB via API
-        url = self.config['siteRoot'] + 'api/tasks/setErrorTask/' + task_id
-
         try:
-            requests.get(url)
-            task_name = self.get_task(task_id)['longName']
-            title = task_name + ' failed'
-            self.send_msg(title, reason)
+            with self.batch():
+                self._update('setErrorTask', task_id)
+                task_name = self.get_task(task_id)['longName']
+                title = task_name + ' failed'
+                self.send_msg(title, reason)
         except Exception as err:
             logging.error("Unable to set error status of task: %s with OpenVDM API", task_id)
             raise err
@@ -901,10 +1204,8 @@ class OpenVDM():
         """
 
         # Set Error for current tranfer in DB via API
-        url = self.config['siteRoot'] + 'api/collectionSystemTransfers/setIdleCollectionSystemTransfer/' + collection_system_transfer_id
-
         try:
-            requests.get(url)
+            self._update('setIdleCollectionSystemTransfer', collection_system_transfer_id)
         except Exception as err:
             logging.error("Unable to set collection system transfer: %s to idle with OpenVDM API", collection_system_transfer_id)
             raise err
@@ -915,10 +1216,8 @@ class OpenVDM():
         """
 
         # Set Error for current tranfer in DB via API
-        url = self.config['siteRoot'] + 'api/cruiseDataTransfers/setIdleCruiseDataTransfer/' + cruise_data_transfer_id
-
         try:
-            requests.get(url)
+            self._update('setIdleCruiseDataTransfer', cruise_data_transfer_id)
         except Exception as err:
             logging.error("Unable to set cruise data transfer: %s to idle with OpenVDM API", cruise_data_transfer_id)
             raise err
@@ -930,10 +1229,8 @@ class OpenVDM():
         """
 
         # Set Idle for the tasks in DB via API
-        url = self.config['siteRoot'] + 'api/tasks/setIdleTask/' + task_id
-
         try:
-            requests.get(url)
+            self._update('setIdleTask', task_id)
         except Exception as err:
             logging.error("Unable to set task: %s to idle with OpenVDM API", task_id)
             raise err
@@ -944,14 +1241,14 @@ class OpenVDM():
         """
 
         collection_system_transfer_name = self.get_collection_system_transfer(collection_system_transfer_id)['name']
-        url = self.config['siteRoot'] + 'api/collectionSystemTransfers/setRunningCollectionSystemTransfer/' + collection_system_transfer_id
         payload = {'jobPid': job_pid}
 
         try:
-            requests.post(url, data=payload)
+            with self.batch():
+                self._update('setRunningCollectionSystemTransfer', collection_system_transfer_id, data=payload)
 
-            # Add to gearman job tracker
-            self.track_gearman_job('Transfer for ' + collection_system_transfer_name, job_pid, job_handle)
+                # Add to gearman job tracker
+                self.track_gearman_job('Transfer for ' + collection_system_transfer_name, job_pid, job_handle)
         except Exception as err:
             logging.error("Unable to set collection system transfer: %s to running with OpenVDM API", collection_system_transfer_name)
             raise err
@@ -974,16 +1271,14 @@ class OpenVDM():
 
         cruise_data_transfer_name = self.get_cruise_data_transfer(cruise_data_transfer_id)['name']
 
-        url = self.config['siteRoot'] + 'api/cruiseDataTransfers/setRunningCruiseDataTransfer/' + cruise_data_transfer_id
         payload = {'jobPid': job_pid}
 
         try:
-            req = requests.post(url, data=payload)
-
-            # Add to gearman job tracker
-            self.track_gearman_job('Transfer for ' + cruise_data_transfer_name, job_pid, job_handle)
+            with self.batch():
+                self._update('setRunningCruiseDataTransfer', cruise_data_transfer_id, data=payload)
 
-            return req.text
+                # Add to gearman job tracker
+                self.track_gearman_job('Transfer for ' + cruise_data_transfer_name, job_pid, job_handle)
         except Exception as err:
             logging.error("Unable to set cruise data transfer: %s to running with OpenVDM API", cruise_data_transfer_name)
             raise err
@@ -1006,14 +1301,14 @@ class OpenVDM():
         task_name = self.get_task(task_id)['longName']
 
         # Set Running for the tasks in DB via API
-        url = self.config['siteRoot'] + 'api/tasks/setRunningTask/' + task_id
         payload = {'jobPid': job_pid}
 
         try:
-            requests.post(url, data=payload)
+            with self.batch():
+                self._update('setRunningTask', task_id, data=payload)
 
-            # Add to gearman job tracker
-            self.track_gearman_job(task_name, job_pid, job_handle)
+                # Add to gearman job tracker
+                self.track_gearman_job(task_name, job_pid, job_handle)
         except Exception as err:
             logging.error("Unable to set task: %s to running with OpenVDM API", task_name)
             raise err
@@ -1025,11 +1320,10 @@ class OpenVDM():
         """
 
         # Add Job to DB via API
-        url = self.config['siteRoot'] + 'api/gearman/newJob/' + job_handle
         payload = {'jobName': job_name, 'jobPid': job_pid}
 
         try:
-            requests.post(url, data=payload)
+            self._update('newJob', job_handle, data=payload)
         except Exception as err:
             logging.error("Unable to add new gearman task tracking with OpenVDM API, Task: %s", job_name)
             raise err
@@ -1045,7 +1339,7 @@ class OpenVDM():
         payload = {'bytes': size_in_bytes}
 
         try:
-            requests.post(url, data=payload)
+            self.api.post(url, data=payload)
         except Exception as err:
             logging.error("Unable to set cruise size with OpenVDM API")
             raise err
@@ -1060,7 +1354,7 @@ class OpenVDM():
         payload = {'bytes': size_in_bytes}
 
         try:
-            requests.post(url, data=payload)
+            self.api.post(url, data=payload)
         except Exception as err:
             logging.error("Unable to set lowering size with OpenVDM API")
             raise err
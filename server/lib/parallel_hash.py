@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Utilities for hashing many files concurrently.
+"""
+import os
+import mmap
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_BUFFER_SIZE = 4194304 # read files in 4MiB chunks
+
+# hashing threads for spinning devices when the number of disks behind them
+# is unknown (hardware RAID, LVM, multipath, single disks)
+DEFAULT_ROTATIONAL_THREADS = 4
+
+# files queued per hashing thread, bounds the memory used for huge filelists
+QUEUED_FILES_PER_THREAD = 4
+
+# seconds between checks for a stop request while waiting on the threads
+WAIT_INTERVAL = 1
+
+_THREAD_LOCAL = threading.local()
+
+
+def _get_sysfs_block_dir(path):
+    """
+    Return the /sys/dev/block directory of the device holding path (the
+    parent device for partitions) or None if it can not be determined
+    """
+
+    try:
+        dev = os.stat(path).st_dev
+    except OSError:
+        return None
+
+    block_dir = '/sys/dev/block/{}:{}'.format(os.major(dev), os.minor(dev))
+
+    if os.path.exists(os.path.join(block_dir, 'partition')):
+        block_dir = os.path.join(block_dir, '..')
+
+    return block_dir if os.path.isdir(os.path.join(block_dir, 'queue')) else None
+
+
+def get_hashing_threads(path, configured=0):
+    """
+    Return the number of hashing threads to use for the files under path.
+    configured > 0 is used as is.  Otherwise:
+    - SSDs, network filesystems and unknown devices get one thread per CPU
+      core;
+    - software (md) RAIDs of spinning disks get one thread per member disk;
+    - other spinning devices, including hardware RAID, LVM and multipath
+      volumes which look like a single disk, get DEFAULT_ROTATIONAL_THREADS.
+    The result never exceeds the number of CPU cores.
+    """
+
+    if int(configured) > 0:
+        return int(configured)
+
+    cpu_count = os.cpu_count() or 1
+    block_dir = _get_sysfs_block_dir(path)
+
+    if block_dir is None:
+        return cpu_count
+
+    try:
+        with open(os.path.join(block_dir, 'queue', 'rotational'), 'r') as file:
+            rotational = file.read().strip() == '1'
+    except IOError:
+        return cpu_count
+
+    if not rotational:
+        return cpu_count
+
+    try:
+        with open(os.path.join(block_dir, 'md', 'raid_disks'), 'r') as file:
+            return max(1, min(int(file.read().strip()), cpu_count))
+    except (IOError, ValueError):
+        return min(DEFAULT_ROTATIONAL_THREADS, cpu_count)
+
+
+def _get_buffer(buffer_size):
+    """
+    Return the read buffer of the calling thread.  Anonymous mmaps are page
+    aligned.
+    """
+
+    buf = getattr(_THREAD_LOCAL, 'buffer', None)
+
+    if buf is None or len(buf) != buffer_size:
+        buf = mmap.mmap(-1, buffer_size)
+        _THREAD_LOCAL.buffer = buf
+
+    return buf
+
+
+def hash_file(filepath, buffer_size=DEFAULT_BUFFER_SIZE, should_stop=None):
+    """
+    Return the md5 hash of the file or None if should_stop() returned True
+    before the file was completely read
+    """
+
+    md5 = hashlib.md5()
+    buf = _get_buffer(buffer_size)
+
+    with open(filepath, 'rb', buffering=0) as file, memoryview(buf) as view:
+
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while True:
+            if should_stop is not None and should_stop():
+                return None
+
+            count = file.readinto(buf)
+            if not count:
+                break
+
+            # hashlib releases the GIL while hashing large buffers
+            md5.update(view[:count])
+
+    return md5.hexdigest()
+
+
+def hash_files(filepaths, filesizes, threads=1, buffer_size=DEFAULT_BUFFER_SIZE, should_stop=None, progress_callback=None): # pylint: disable=too-many-arguments,too-many-locals
+    """
+    Return a dict of filepath: md5 hash for the filepaths, hashed by a pool of
+    threads largest file first so the big files do not finish last.  Files that
+    could not be hashed are logged and left out.  Once should_stop() returns
+    True no more files are started and the hashes calculated so far are
+    returned.  progress_callback(bytes_hashed, total_bytes) is called from the
+    calling thread.
+    """
+
+    ordered = sorted(zip(filepaths, filesizes), key=lambda file: file[1], reverse=True)
+    total_bytes = sum(filesize for _, filesize in ordered)
+    hashed_bytes = 0
+
+    hashes = {}
+    pending = {}
+    queue_limit = max(1, threads) * QUEUED_FILES_PER_THREAD
+    files = iter(ordered)
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+
+        while True:
+
+            stopping = should_stop is not None and should_stop()
+
+            while not stopping and not exhausted and len(pending) < queue_limit:
+                try:
+                    filepath, filesize = next(files)
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                pending[executor.submit(hash_file, filepath, buffer_size, should_stop)] = (filepath, filesize)
+
+            if len(pending) == 0:
+                break
+
+            done, _ = wait(pending, timeout=WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                filepath, filesize = pending.pop(future)
+                hashed_bytes += filesize
+
+                try:
+                    md5_hash = future.result()
+                except Exception as err:
+                    logging.error("Could not generate md5 hash for file: %s", filepath)
+                    logging.debug(str(err))
+                    continue
+
+                if md5_hash is not None:
+                    hashes[filepath] = md5_hash
+
+            if progress_callback is not None and len(done) > 0:
+                progress_callback(hashed_bytes, total_bytes)
+
+    return hashes
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Utilities for splitting a file transfer across multiple concurrent rsync
+streams.
+"""
+import os
+import heapq
+
+DEFAULT_BANDWIDTH_LIMIT = 20000000 # 20GB/s a.k.a. stupid big
+
+
+def split_into_shards(filepaths, filesizes, shard_count):
+    """
+    Split the filepaths into at most shard_count lists with roughly equal total
+    filesize.  Files are assigned largest first to the shard with the smallest
+    running total.
+    """
+
+    shard_count = max(1, min(shard_count, len(filepaths)))
+
+    shards = [[] for _ in range(shard_count)]
+    shard_totals = [(0, idx) for idx in range(shard_count)]
+
+    for filepath, filesize in sorted(zip(filepaths, filesizes), key=lambda file: file[1], reverse=True):
+        shard_total, idx = heapq.heappop(shard_totals)
+        shards[idx].append(filepath)
+        heapq.heappush(shard_totals, (shard_total + filesize, idx))
+
+    return shards
+
+
+def build_shard_filelists(tmpdir, filepaths, filesizes, shard_count, filelist_prefix='rsyncFileList'):
+    """
+    Split the filepaths into shards and write each shard to a --files-from
+    filelist in tmpdir.  Returns the list of filelist paths.  Raises IOError if
+    a filelist could not be written.
+    """
+
+    filelist_filepaths = []
+
+    for idx, shard in enumerate(split_into_shards(filepaths, filesizes, shard_count)):
+        filelist_filepath = os.path.join(tmpdir, '{}_{}.txt'.format(filelist_prefix, idx))
+
+        with open(filelist_filepath, 'w') as filelist_file:
+            filelist_file.write('\n'.join(shard))
+
+        filelist_filepaths.append(filelist_filepath)
+
+    return filelist_filepaths
+
+
+def build_bandwidth_limit_arg(bandwidth_limit, stream_count):
+    """
+    Return the --bwlimit argument for each of stream_count streams so that the
+    total bandwidth_limit (in kB/s, '0' for unlimited) is honored across all
+    streams.
+    """
+
+    if bandwidth_limit == '0':
+        return '--bwlimit=' + str(DEFAULT_BANDWIDTH_LIMIT)
+
+    return '--bwlimit=' + str(max(1, int(bandwidth_limit) // max(1, stream_count)))
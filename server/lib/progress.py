@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Utilities for reporting job progress to the Gearman server.
+"""
+import time
+import logging
+
+DEFAULT_MIN_INTERVAL = 0.5 # seconds
+
+DEFAULT_MIN_STEP = 1 # percent
+
+
+class ProgressReporter():
+    """
+    Rate-limited job status reporting.  A job is split into weighted phases
+    (i.e. [('listing', 10), ('transfer', 80), ('post-processing', 10)]), the
+    weights are relative and do not need to add up to 100.  Progress within the
+    current phase is reported via update(), those updates are only sent to the
+    Gearman server if at least min_interval seconds have passed since the last
+    update and the overall percentage has advanced by at least min_step.  The
+    start of each phase and the completion of the job are always sent.
+    """
+
+    def __init__(self, gearman_worker, gearman_job, phases, min_interval=DEFAULT_MIN_INTERVAL, min_step=DEFAULT_MIN_STEP): # pylint: disable=too-many-arguments
+
+        self.gearman_worker = gearman_worker
+        self.gearman_job = gearman_job
+        self.min_interval = min_interval
+        self.min_step = min_step
+
+        self.phases = {}
+
+        total_weight = float(sum(weight for _, weight in phases))
+        phase_start = 0.0
+
+        for name, weight in phases:
+            phase_end = phase_start + 100 * weight / total_weight
+            self.phases[name] = (phase_start, phase_end)
+            phase_start = phase_end
+
+        self.phase = None
+        self.last_percent = None
+        self.last_sent_time = 0
+
+
+    def start_phase(self, name):
+        """
+        Start the named phase
+        """
+
+        logging.debug("Starting phase: %s", name)
+        self.phase = name
+        self._send(self.phases[name][0], force=True)
+
+
+    def update(self, completed, total):
+        """
+        Report that completed out of total units of work in the current phase
+        are done
+        """
+
+        phase_start, phase_end = self.phases[self.phase]
+
+        fraction = min(float(completed) / float(total), 1.0) if total > 0 else 1.0
+        self._send(phase_start + (phase_end - phase_start) * fraction)
+
+
+    def complete(self):
+        """
+        Report that the job is complete
+        """
+
+        self._send(100, force=True)
+
+
+    def _send(self, percent, force=False):
+        """
+        Send the job status if allowed by the rate limits
+        """
+
+        percent = int(percent)
+        now = time.monotonic()
+
+        if not force:
+            if self.last_percent is not None and percent - self.last_percent < self.min_step:
+                return
+
+            if now - self.last_sent_time < self.min_interval:
+                return
+
+        self.gearman_worker.send_job_status(self.gearman_job, percent, 100)
+        self.last_percent = percent
+        self.last_sent_time = now
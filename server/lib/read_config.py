@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """Utilities for reading/processing JSON data.
 """
+import os
+import copy
 import logging
 
 try:
@@ -26,13 +28,29 @@ def parse_yaml(source):
         raise err
 
 
+# realpath --> (mtime, parsed configuration), shared by everything in the
+# process
+_CONFIG_CACHE = {}
+
+
 def read_config(filename):
     """Read the passed text/stream assuming it's a valid OpenVDM configuration
-    file
+    file.  The parsed configuration is cached per process and only re-read
+    when the file's modification time changes.
     """
     try:
-        with open(filename, 'r') as file:
-            return parse_yaml(file)
+        filepath = os.path.realpath(filename)
+        mtime = os.stat(filepath).st_mtime_ns
+
+        cached = _CONFIG_CACHE.get(filepath)
+        if cached is None or cached[0] != mtime:
+            with open(filepath, 'r') as file:
+                cached = (mtime, parse_yaml(file))
+            _CONFIG_CACHE[filepath] = cached
+
+        # callers get their own copy so the cached configuration can not be
+        # modified
+        return copy.deepcopy(cached[1])
     except IOError as err:
         logging.error("Unable to open configuration file: %s", filename)
         raise err
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Utilities for running rsync and parsing its itemized output into per-file
+transfer events.
+"""
+import time
+import queue
+import logging
+import threading
+import subprocess
+from collections import namedtuple
+
+# itemized changes, file length, bytes transferred, filename
+OUT_FORMAT_ARG = '--out-format=%i %l %b %n'
+
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+
+class ItemizeEvent(namedtuple('ItemizeEvent', ['itemize', 'length', 'transferred', 'filename', 'elapsed'])):
+    """
+    A single line of rsync itemized output.  elapsed is the time (in seconds)
+    since the previous event from the same rsync process, for transferred
+    files this approximates the time spent transferring the file.
+    """
+
+    __slots__ = ()
+
+    def is_file(self):
+        """
+        Return whether the event is for a regular file that was sent or
+        received
+        """
+
+        return len(self.itemize) > 2 and self.itemize[0] in '<>' and self.itemize[1] == 'f'
+
+
+    def is_new_file(self):
+        """
+        Return whether the event is for a newly created file
+        """
+
+        return self.is_file() and self.itemize[2:].strip('+') == ''
+
+
+    def is_updated_file(self):
+        """
+        Return whether the event is for an existing file that was updated
+        """
+
+        return self.is_file() and not self.is_new_file()
+
+
+def parse_itemize_line(line, elapsed=0.0):
+    """
+    Parse a line of rsync output produced with OUT_FORMAT_ARG.  Returns an
+    ItemizeEvent or None if the line is not an itemized change (i.e. the
+    summary lines added by -v).
+    """
+
+    try:
+        itemize, length, transferred, filename = line.split(' ', 3)
+        return ItemizeEvent(itemize, int(length), int(transferred), filename, elapsed)
+    except ValueError:
+        return None
+
+
+class TransferStats():
+    """
+    Accumulates the per-file events of a transfer into throughput statistics.
+    Only the totals are kept, the per-file times are logged at debug level.
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.end_time = None
+        self.file_count = 0
+        self.bytes_transferred = 0
+
+
+    def add(self, event):
+        """
+        Add an ItemizeEvent to the statistics
+        """
+
+        if not event.is_file():
+            return
+
+        self.file_count += 1
+        self.bytes_transferred += event.transferred
+        logging.debug("Transferred %s (%s bytes) in %.3f seconds", event.filename, event.transferred, event.elapsed)
+
+
+    def finish(self):
+        """
+        Mark the end of the transfer
+        """
+
+        self.end_time = time.time()
+
+
+    def results(self):
+        """
+        Return the statistics as a json-able dict.  throughput is in MB/s.
+        """
+
+        elapsed = (self.end_time or time.time()) - self.start_time
+
+        return {
+            'fileCount': self.file_count,
+            'bytesTransferred': self.bytes_transferred,
+            'elapsed': round(elapsed, 3),
+            'throughput': round(self.bytes_transferred / 1000000 / elapsed, 3) if elapsed > 0 else 0
+        }
+
+
+def _read_pipe(idx, pipe_name, pipe, lines):
+    """
+    Push each line of the pipe onto the lines queue, followed by a None line
+    once the pipe closes.
+    """
+
+    for line in pipe:
+        lines.put((idx, pipe_name, line.rstrip('\n')))
+
+    lines.put((idx, pipe_name, None))
+
+
+def run_rsync_itemized(commands, stop_func, transfer_stats=None):
+    """
+    Run the rsync commands concurrently and yield an ItemizeEvent for every
+    itemized line they output.  The commands must include OUT_FORMAT_ARG.
+
+    stdout and stderr of every process are drained by background threads so a
+    full pipe never stalls rsync, and every line is consumed, including those
+    written just before a process exits.  stderr lines are logged as warnings.
+    stop_func is polled while waiting for output, if it returns True all
+    processes are terminated.  If provided, transfer_stats is updated with each
+    event.
+    """
+
+    lines = queue.Queue()
+    procs = []
+
+    for command in commands:
+        logging.debug("Transfer Command: %s", ' '.join(command))
+        procs.append(subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True))
+
+    last_event_times = [time.time()] * len(procs)
+
+    for idx, proc in enumerate(procs):
+        threading.Thread(target=_read_pipe, args=(idx, STDOUT, proc.stdout, lines), daemon=True).start()
+        threading.Thread(target=_read_pipe, args=(idx, STDERR, proc.stderr, lines), daemon=True).start()
+
+    open_pipes = 2 * len(procs)
+
+    while open_pipes > 0:
+        if stop_func():
+            logging.debug("Stopping")
+            for proc in procs:
+                proc.terminate()
+            break
+
+        try:
+            idx, pipe_name, line = lines.get(timeout=0.5)
+        except queue.Empty:
+            continue
+
+        if line is None:
+            open_pipes -= 1
+            continue
+
+        if pipe_name == STDERR:
+            logging.warning("Err Line: %s", line)
+            continue
+
+        logging.debug("Line: %s", line)
+
+        now = time.time()
+        event = parse_itemize_line(line, now - last_event_times[idx])
+        if event is None:
+            continue
+
+        last_event_times[idx] = now
+
+        if transfer_stats is not None:
+            transfer_stats.add(event)
+
+        yield event
+
+    for proc in procs:
+        proc.wait()
+        if proc.returncode != 0:
+            logging.warning("rsync exited with return code: %s", proc.returncode)
+
+    if transfer_stats is not None:
+        transfer_stats.finish()
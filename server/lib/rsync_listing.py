@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Utilities for parsing rsync --list-only output into columnar arrays.
+"""
+import re
+
+import numpy as np
+
+# permissions, size, date, time, path
+LISTING_LINE_RE = re.compile(r'^([-a-zA-Z]{10}) +([\d,]+) (\d{4}/\d{2}/\d{2}) (\d{2}:\d{2}:\d{2}) (.+)$')
+
+
+class RsyncListing():
+    """
+    Columnar representation of an rsync listing.  Each entry has a path, a
+    size (bytes), a modification time (seconds since the epoch, UTC) and
+    whether it is a regular file.  The sizes, mtimes and is_file columns are
+    NumPy arrays so time windows and size comparisons can be evaluated for
+    the whole listing at once.
+    """
+
+    def __init__(self, paths, sizes, mtimes, is_file):
+
+        self.paths = paths
+        self.sizes = sizes
+        self.mtimes = mtimes
+        self.is_file = is_file
+
+
+    def __len__(self):
+
+        return len(self.paths)
+
+
+    def file_indices(self):
+        """
+        Return the indices of the regular files in the listing
+        """
+
+        return np.flatnonzero(self.is_file)
+
+
+    def mtime_mask(self, after, before):
+        """
+        Return a boolean array marking the regular files modified after after
+        and before before (seconds since the epoch, exclusive)
+        """
+
+        return self.is_file & (self.mtimes > after) & (self.mtimes < before)
+
+
+    def file_sizes(self):
+        """
+        Return a dict of filepath: size for the regular files in the listing
+        """
+
+        return {self.paths[idx]: int(self.sizes[idx]) for idx in self.file_indices()}
+
+
+def parse_rsync_listing(output):
+    """
+    Parse the output of rsync --list-only (or rsync -r without a destination).
+    Lines that are not listing entries (i.e. warnings) are skipped.
+    """
+
+    rows = [match.groups() for match in map(LISTING_LINE_RE.match, output.splitlines()) if match is not None]
+
+    if len(rows) == 0:
+        return RsyncListing([], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool))
+
+    perms, sizes, mdates, mtimes, paths = zip(*rows)
+
+    # rsync reports sizes with thousands separators and timestamps as
+    # YYYY/MM/DD HH:MM:SS, both are converted in a single pass per column
+    sizes = np.char.replace(np.array(sizes), ',', '').astype(np.int64)
+    timestamps = np.char.add(np.char.add(np.char.replace(np.array(mdates), '/', '-'), 'T'), np.array(mtimes))
+    mtimes = timestamps.astype('datetime64[s]').astype(np.int64)
+    is_file = np.char.startswith(np.array(perms), '-')
+
+    return RsyncListing(list(paths), sizes, mtimes, is_file)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Utilities for maintaining a persistent index of a source directory scan so
+that unchanged directories do not need to be re-listed on every transfer.
+"""
+import os
+import json
+import time
+import errno
+import logging
+
+from server.lib.file_filters import INCLUDE
+
+SCAN_INDEX_DIRNAME = '.scan_index'
+
+# Directories modified this recently are always re-listed.  Their mtime may
+# not yet reflect entries created within the same timestamp tick (coarse on
+# some SMB servers).
+RACY_WINDOW = 2
+
+
+def build_scan_index_filepath(logfile_dirpath, collection_system_transfer_name):
+    """
+    Return the path to the scan index file for the collection system transfer
+    """
+
+    return os.path.join(logfile_dirpath, SCAN_INDEX_DIRNAME, collection_system_transfer_name + '.json')
+
+
+class ScanIndex():
+    """
+    On-disk index of a source directory.  For each directory the index records
+    its mtime and the names of the files and sub-directories it contained.  For
+    each file it records [size, mtime, inode, verdict], size/mtime/inode are
+    only tracked for included files.  All paths are relative to the source
+    directory.
+
+    The signature is an arbitrary string identifying the configuration the
+    verdicts were built with, if it changes the index is discarded.
+    """
+
+    def __init__(self, index_filepath, signature):
+
+        self.index_filepath = index_filepath
+        self.signature = signature
+        self.dirs = {}
+        self.files = {}
+        self.stats = {'dirsListed': 0, 'dirsReused': 0, 'verdictsReused': 0}
+
+        self.load()
+
+
+    def load(self):
+        """
+        Read the index from disk.  A missing, corrupt or out-of-date index is
+        treated as empty.
+        """
+
+        try:
+            with open(self.index_filepath, 'r') as index_file:
+                contents = json.load(index_file)
+        except FileNotFoundError:
+            logging.debug("No scan index found at %s", self.index_filepath)
+            return
+        except (IOError, ValueError) as err:
+            logging.warning("Unable to read scan index %s, rebuilding", self.index_filepath)
+            logging.debug(str(err))
+            return
+
+        if contents.get('signature') != self.signature:
+            logging.debug("Scan index signature has changed, rebuilding")
+            return
+
+        self.dirs = contents.get('dirs', {})
+        self.files = contents.get('files', {})
+
+
+    def save(self):
+        """
+        Write the index to disk.  The file is written to a temporary file and
+        renamed into place so an interrupted save never leaves a partial index.
+        """
+
+        try:
+            os.makedirs(os.path.dirname(self.index_filepath))
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                logging.error("Unable to create parent directory for scan index")
+                return {'verdict': False, 'reason': 'Unable to create parent directory(ies) for scan index: {}'.format(self.index_filepath) }
+
+        tmp_filepath = self.index_filepath + '.tmp'
+
+        try:
+            with open(tmp_filepath, 'w') as index_file:
+                json.dump({'signature': self.signature, 'dirs': self.dirs, 'files': self.files}, index_file, separators=(',', ':'))
+            os.replace(tmp_filepath, self.index_filepath)
+        except IOError:
+            logging.error("Error saving scan index: %s", self.index_filepath)
+            return {'verdict': False, 'reason': 'Unable to save scan index: {}'.format(self.index_filepath) }
+
+        return {'verdict': True}
+
+
+    def _list_dir(self, source_dir, rel_dirpath, scan_time):
+        """
+        Return the file and sub-directory names for the directory, re-using the
+        cached listing if the directory has not been modified.  Symlinks are
+        skipped.  Returns None if the directory can not be read.
+        """
+
+        dirpath = os.path.join(source_dir, rel_dirpath) if rel_dirpath else source_dir
+
+        try:
+            dir_mtime = os.stat(dirpath).st_mtime
+        except OSError as err:
+            logging.debug("Unable to stat directory %s: %s", dirpath, str(err))
+            return None
+
+        cached_dir = self.dirs.get(rel_dirpath)
+        if cached_dir is not None and cached_dir['mtime'] == dir_mtime and scan_time - dir_mtime > RACY_WINDOW:
+            self.stats['dirsReused'] += 1
+            return cached_dir
+
+        filenames = []
+        subdirs = []
+
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        logging.debug("%s is a symlink, skipping", entry.path)
+                    elif entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        filenames.append(entry.name)
+        except OSError as err:
+            logging.debug("Unable to list directory %s: %s", dirpath, str(err))
+            return None
+
+        self.stats['dirsListed'] += 1
+        return {'mtime': dir_mtime, 'files': filenames, 'subdirs': subdirs}
+
+
+    def scan(self, source_dir, filters):
+        """
+        Scan the source directory and return a list of (filepath, verdict,
+        size, mtime) tuples, one per regular file.  size and mtime are None for
+        files that are not included.  Only directories whose mtime changed are
+        re-listed and only included files are stat'd, verdicts are re-used from
+        the previous scan.  The index is updated in memory, call save() to
+        persist it.
+        """
+
+        scan_time = time.time()
+
+        dirs = {}
+        files = {}
+        results = []
+
+        stack = ['']
+        while stack:
+            rel_dirpath = stack.pop()
+
+            listing = self._list_dir(source_dir, rel_dirpath, scan_time)
+            if listing is None:
+                continue
+
+            dirs[rel_dirpath] = listing
+            stack.extend(os.path.join(rel_dirpath, subdir) for subdir in listing['subdirs'])
+
+            for filename in listing['files']:
+                rel_filepath = os.path.join(rel_dirpath, filename)
+                filepath = os.path.join(source_dir, rel_filepath)
+
+                cached_file = self.files.get(rel_filepath)
+                if cached_file is not None:
+                    verdict = cached_file[3]
+                    self.stats['verdictsReused'] += 1
+                else:
+                    verdict = filters.verdict(filepath)
+
+                if verdict != INCLUDE:
+                    files[rel_filepath] = [None, None, None, verdict]
+                    results.append((filepath, verdict, None, None))
+                    continue
+
+                try:
+                    file_stat = os.stat(filepath)
+                except OSError:
+                    logging.debug("%s removed during scan", filepath)
+                    continue
+
+                files[rel_filepath] = [file_stat.st_size, file_stat.st_mtime, file_stat.st_ino, verdict]
+                results.append((filepath, verdict, file_stat.st_size, file_stat.st_mtime))
+
+        self.dirs = dirs
+        self.files = files
+
+        logging.debug("Scan index stats: %s", json.dumps(self.stats))
+
+        return results
+
+
+    def scan_files(self, source_dir, filters, rel_filepaths):
+        """
+        Evaluate only the provided files (relative to the source directory)
+        and return a list of (filepath, verdict, size, mtime) tuples like
+        scan().  Files that no longer exist or are symlinks are skipped.  The
+        index entries for the files are updated in memory, the directory
+        listings are left untouched so the next full scan re-lists the
+        modified directories.
+        """
+
+        results = []
+
+        for rel_filepath in sorted(set(rel_filepaths)):
+            filepath = os.path.join(source_dir, rel_filepath)
+
+            if os.path.islink(filepath) or not os.path.isfile(filepath):
+                logging.debug("%s is not a regular file, skipping", filepath)
+                self.files.pop(rel_filepath, None)
+                continue
+
+            cached_file = self.files.get(rel_filepath)
+            if cached_file is not None:
+                verdict = cached_file[3]
+                self.stats['verdictsReused'] += 1
+            else:
+                verdict = filters.verdict(filepath)
+
+            if verdict != INCLUDE:
+                self.files[rel_filepath] = [None, None, None, verdict]
+                results.append((filepath, verdict, None, None))
+                continue
+
+            try:
+                file_stat = os.stat(filepath)
+            except OSError:
+                logging.debug("%s removed during scan", filepath)
+                continue
+
+            self.files[rel_filepath] = [file_stat.st_size, file_stat.st_mtime, file_stat.st_ino, verdict]
+            results.append((filepath, verdict, file_stat.st_size, file_stat.st_mtime))
+
+        logging.debug("Scan index stats: %s", json.dumps(self.stats))
+
+        return results
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Utilities for sharing long-lived cifs mounts of SMB shares between the
+OpenVDM workers.
+"""
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import subprocess
+
+SMB_MOUNT_DIR = '/mnt/openvdm'
+
+SMB_MOUNT_STATE_FN = 'mounts.json'
+
+SMB_MOUNT_LOCK_FN = '.lock'
+
+DEFAULT_SMB_VERSION = '2.1'
+
+HEALTH_CHECK_TIMEOUT = 5 # seconds
+
+SMB_TRANSFER_TYPE = '3'
+
+
+def build_active_smb_shares(ovdm):
+    """
+    Return the (server, domain, user, mode) of the shares used by the enabled
+    SMB collection system and cruise data transfers or None if the transfers
+    could not be retrieved from the OpenVDM API
+    """
+
+    try:
+        collection_system_transfers = ovdm.get_active_collection_system_transfers()
+        cruise_data_transfers = ovdm.get_cruise_data_transfers()
+    except Exception as err:
+        logging.warning("Unable to retrieve the active SMB shares: %s", str(err))
+        return None
+
+    active_shares = [(transfer['smbServer'], transfer['smbDomain'], transfer['smbUser'], 'ro') for transfer in collection_system_transfers if transfer['transferType'] == SMB_TRANSFER_TYPE]
+    active_shares.extend([(transfer['smbServer'], transfer['smbDomain'], transfer['smbUser'], 'rw') for transfer in cruise_data_transfers if transfer['transferType'] == SMB_TRANSFER_TYPE and transfer['enable'] == '1'])
+
+    return active_shares
+
+
+def probe_smb_version(server, domain, user, password):
+    """
+    Return the SMB protocol version to use when mounting shares from the
+    server
+    """
+
+    ver_test_command = ['smbclient', '-L', server, '-W', domain, '-m', 'SMB2', '-g', '-N'] if user == 'guest' else ['smbclient', '-L', server, '-W', domain, '-m', 'SMB2', '-g', '-U', user + '%' + password]
+    logging.debug("SMB version test command: %s", ' '.join(ver_test_command))
+
+    proc = subprocess.run(ver_test_command, capture_output=True, text=True, check=False)
+
+    for line in (proc.stdout + proc.stderr).splitlines():
+        if line.startswith('OS=[Windows 5.1]'):
+            return "1.0"
+
+    return DEFAULT_SMB_VERSION
+
+
+class SMBMountManager():
+    """
+    Keeps SMB shares mounted between jobs.  Mounts are keyed by server/share,
+    domain, user and access mode so every worker on this host that needs the
+    same share re-uses the same mountpoint.  The negotiated SMB version and a
+    fingerprint of the credentials are stored in a state file next to the
+    mountpoints.  A mount is only re-created when it fails the health check or
+    the credentials have changed.  The state file also records the workers
+    holding each mount, a worker holds the mount of its last job.  Mounts that
+    no longer match an active transfer are unmounted when the next share is
+    acquired once no other running worker holds them, and every mount when
+    the last worker holding it is shut down.
+    """
+
+    def __init__(self, mount_dir=SMB_MOUNT_DIR):
+
+        self.mount_dir = mount_dir
+        self.state_filepath = os.path.join(self.mount_dir, SMB_MOUNT_STATE_FN)
+        self.lock_filepath = os.path.join(self.mount_dir, SMB_MOUNT_LOCK_FN)
+
+
+    @staticmethod
+    def _build_key(server, domain, user, mode):
+        """
+        Return the key identifying the mount
+        """
+
+        return hashlib.sha1(json.dumps([server, domain, user, mode]).encode('utf-8')).hexdigest()[:16]
+
+
+    @staticmethod
+    def _build_fingerprint(password):
+        """
+        Return a fingerprint of the credentials, used to detect configuration
+        changes without storing the password.
+        """
+
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+
+    def _load_state(self):
+        """
+        Return the mount state
+        """
+
+        try:
+            with open(self.state_filepath, 'r') as state_file:
+                return json.load(state_file)
+
+        except (IOError, ValueError):
+            return {}
+
+
+    def _save_state(self, state):
+        """
+        Save the mount state
+        """
+
+        tmp_filepath = self.state_filepath + '.tmp'
+
+        try:
+            with open(tmp_filepath, 'w') as state_file:
+                json.dump(state, state_file, indent=2)
+
+            os.replace(tmp_filepath, self.state_filepath)
+
+        except IOError as err:
+            logging.warning("Unable to save SMB mount state: %s", str(err))
+
+
+    @staticmethod
+    def _is_running(pid):
+        """
+        Return whether the process is running
+        """
+
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+
+        return True
+
+
+    @staticmethod
+    def _is_mounted(mntpoint):
+        """
+        Return whether mntpoint is a mountpoint.  Reads /proc/mounts instead of
+        stat'ing the mountpoint so a hung share can not block the check.
+        """
+
+        try:
+            with open('/proc/mounts', 'r') as mounts_file:
+                return any(line.split()[1] == mntpoint for line in mounts_file if len(line.split()) > 1)
+
+        except IOError:
+            return os.path.ismount(mntpoint)
+
+
+    def _is_healthy(self, mntpoint):
+        """
+        Return whether mntpoint is mounted and responding
+        """
+
+        if not self._is_mounted(mntpoint):
+            return False
+
+        proc = subprocess.run(['timeout', str(HEALTH_CHECK_TIMEOUT), 'stat', '-t', mntpoint], capture_output=True, check=False)
+
+        return proc.returncode == 0
+
+
+    def _mount(self, mntpoint, server, domain, user, password, mode, vers): # pylint: disable=too-many-arguments
+        """
+        Mount the share at mntpoint, returns whether the mount succeeded
+        """
+
+        options = mode + ',guest' + ',domain=' + domain + ',vers=' + vers if user == 'guest' else mode + ',username=' + user + ',password=' + password + ',domain=' + domain + ',vers=' + vers
+
+        mount_command = ['sudo', 'mount', '-t', 'cifs', server, mntpoint, '-o', options]
+        logging.debug("Mounting %s at %s (%s, vers=%s)", server, mntpoint, mode, vers)
+
+        proc = subprocess.run(mount_command, capture_output=True, text=True, check=False)
+
+        if proc.returncode != 0:
+            logging.warning("Unable to mount %s: %s", server, proc.stderr.rstrip('\n'))
+
+        return proc.returncode == 0
+
+
+    def _unmount(self, mntpoint):
+        """
+        Unmount mntpoint.  A lazy unmount is used so a hung share is detached
+        immediately.
+        """
+
+        if self._is_mounted(mntpoint):
+            logging.debug("Unmounting %s", mntpoint)
+            subprocess.run(['sudo', 'umount', '-l', mntpoint], capture_output=True, check=False)
+
+
+    def _get_other_holders(self, entry):
+        """
+        Return the pids of the running processes other than this one holding
+        the mount
+        """
+
+        return [pid for pid in entry.get('pids', []) if pid != os.getpid() and self._is_running(pid)]
+
+
+    def _reap(self, state, active_shares):
+        """
+        Unmount the shares in state that are not in active_shares and are not
+        held by another running process, returns whether the state was
+        changed.  Shares still held are unmounted once their holders have
+        moved on or exited.
+        """
+
+        active_keys = {self._build_key(*share) for share in active_shares}
+        changed = False
+
+        for key in [key for key in state if key not in active_keys]:
+            holders = self._get_other_holders(state[key])
+
+            if len(holders) > 0:
+                logging.debug("Configuration for %s is no longer in use, unmounting once released by: %s", state[key]['server'], holders)
+                continue
+
+            logging.info("Configuration for %s is no longer in use, unmounting", state[key]['server'])
+            self._unmount(os.path.join(self.mount_dir, key))
+            del state[key]
+            changed = True
+
+        return changed
+
+
+    def acquire(self, server, domain, user, password, mode='ro', vers=None, active_shares=None): # pylint: disable=too-many-arguments,too-many-locals
+        """
+        Return the mountpoint for the share, mounting it if it is not already
+        mounted and healthy.  If vers is provided it is used instead of probing
+        the server when a new mount is required.  If active_shares (see
+        build_active_smb_shares) is provided the mounts of every other share
+        are unmounted first.
+        """
+
+        os.makedirs(self.mount_dir, mode=0o700, exist_ok=True)
+
+        key = self._build_key(server, domain, user, mode)
+        fingerprint = self._build_fingerprint(password)
+        mntpoint = os.path.join(self.mount_dir, key)
+
+        with open(self.lock_filepath, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            state = self._load_state()
+
+            # a worker runs one job at a time, it no longer uses its other mounts
+            changed = False
+            for other_key, other_entry in state.items():
+                if other_key != key and os.getpid() in other_entry.get('pids', []):
+                    other_entry['pids'].remove(os.getpid())
+                    changed = True
+
+            if active_shares is not None:
+                changed = self._reap(state, active_shares + [(server, domain, user, mode)]) or changed
+
+            if changed:
+                self._save_state(state)
+
+            entry = state.get(key)
+
+            if entry is not None and entry['fingerprint'] == fingerprint and self._is_healthy(mntpoint):
+                logging.debug("Re-using SMB mount: %s", mntpoint)
+
+                if os.getpid() not in entry.setdefault('pids', []):
+                    entry['pids'].append(os.getpid())
+                    self._save_state(state)
+
+                return {'verdict': True, 'mntpoint': mntpoint}
+
+            if entry is not None and entry['fingerprint'] != fingerprint:
+                logging.info("Configuration for %s has changed, re-mounting", server)
+                entry = None
+
+            self._unmount(mntpoint)
+            os.makedirs(mntpoint, mode=0o755, exist_ok=True)
+
+            known_vers = vers or (entry['vers'] if entry is not None else None)
+
+            mounted = known_vers is not None and self._mount(mntpoint, server, domain, user, password, mode, known_vers)
+
+            if not mounted:
+                probed_vers = probe_smb_version(server, domain, user, password)
+
+                if probed_vers != known_vers:
+                    known_vers = probed_vers
+                    mounted = self._mount(mntpoint, server, domain, user, password, mode, known_vers)
+
+            if not mounted:
+                state.pop(key, None)
+                self._save_state(state)
+                return {'verdict': False, 'reason': "Could not connect to SMB Share: {} as {}".format(server, user)}
+
+            state[key] = {'server': server, 'domain': domain, 'user': user, 'mode': mode, 'vers': known_vers, 'fingerprint': fingerprint, 'pids': [pid for pid in state.get(key, {}).get('pids', []) if pid != os.getpid()] + [os.getpid()]}
+            self._save_state(state)
+
+        return {'verdict': True, 'mntpoint': mntpoint}
+
+
+    def release(self):
+        """
+        Release the mounts held by this process, used when the worker is shut
+        down.  Mounts still held by other running workers are left mounted.
+        """
+
+        if not os.path.isfile(self.state_filepath):
+            return
+
+        with open(self.lock_filepath, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            state = self._load_state()
+
+            for key in list(state):
+                pids = self._get_other_holders(state[key])
+
+                if len(pids) > 0:
+                    state[key]['pids'] = pids
+                    continue
+
+                logging.debug("Releasing SMB mount for %s", state[key]['server'])
+                self._unmount(os.path.join(self.mount_dir, key))
+                del state[key]
+
+            self._save_state(state)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Utilities for sharing multiplexed ssh connections (ControlMaster) between
+the ssh/rsync commands run by the OpenVDM workers.
+"""
+import os
+import logging
+import subprocess
+
+# Kept short, unix socket paths are limited to ~100 characters
+SSH_CONTROL_DIR = '/tmp/openvdm-ssh'
+
+# %C --> hash of the local host, remote host, port and user
+SSH_CONTROL_PATH = os.path.join(SSH_CONTROL_DIR, '%C')
+
+DEFAULT_CONTROL_PERSIST = 600
+
+
+class SSHControlManager():
+    """
+    Tracks the multiplexed ssh connections used by a worker.  The first ssh
+    connection to a (user, host) becomes the master, subsequent ssh/rsync
+    commands from any worker on this host re-use it.  Idle masters are closed
+    by ssh after control_persist seconds, close_all() closes the masters
+    opened by this worker.  A control_persist of 0 disables multiplexing.
+    """
+
+    def __init__(self, control_persist=DEFAULT_CONTROL_PERSIST):
+
+        self.control_persist = int(control_persist)
+        self.connections = set()
+
+        if self.control_persist > 0:
+            os.makedirs(SSH_CONTROL_DIR, mode=0o700, exist_ok=True)
+
+
+    def ssh_options(self, user, host):
+        """
+        Return the ssh command-line options for connecting to host as user
+        """
+
+        if self.control_persist <= 0:
+            return []
+
+        self.connections.add((user, host))
+
+        return [
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath=' + SSH_CONTROL_PATH,
+            '-o', 'ControlPersist=' + str(self.control_persist)
+        ]
+
+
+    def rsync_rsh(self, user, host):
+        """
+        Return the value for rsync's -e argument for connecting to host as user
+        """
+
+        return ' '.join(['ssh'] + self.ssh_options(user, host))
+
+
+    def close_all(self):
+        """
+        Ask the masters opened by this worker to exit once their current
+        sessions complete.
+        """
+
+        for user, host in self.connections:
+            command = ['ssh', '-O', 'stop', '-o', 'ControlPath=' + SSH_CONTROL_PATH, '-l', user, host]
+            logging.debug("Closing ssh master: %s", ' '.join(command))
+            subprocess.run(command, capture_output=True, check=False)
+
+        self.connections.clear()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Utilities for verifying that files selected for transfer are no longer being
+written to.
+"""
+import os
+import time
+import shutil
+import logging
+import tempfile
+import subprocess
+
+from server.lib.rsync_listing import parse_rsync_listing
+
+
+def local_file_sizes(filepaths):
+    """
+    Return a dict of filepath: size for the provided local filepaths.  Files
+    that can not be stat'd are omitted.
+    """
+
+    file_sizes = {}
+
+    for filepath in filepaths:
+        try:
+            file_sizes[filepath] = os.stat(filepath).st_size
+        except OSError:
+            logging.debug("%s could not be stat'd", filepath)
+
+    return file_sizes
+
+
+def remote_file_sizes(command, filepaths):
+    """
+    Return a dict of filepath: size for the provided remote filepaths using a
+    single rsync listing.  command is the rsync listing command for the source
+    directory, the filepaths (relative to the source directory) are passed to it
+    via --files-from.  Returns None if the listing could not be retrieved.
+    """
+
+    tmpdir = tempfile.mkdtemp()
+    filelist_filepath = os.path.join(tmpdir, 'stalenessFileList.txt')
+
+    try:
+        with open(filelist_filepath, 'w') as filelist_file:
+            filelist_file.write('\0'.join(filepaths))
+
+    except IOError:
+        logging.error("Error saving temporary staleness filelist file: %s", filelist_filepath)
+        shutil.rmtree(tmpdir)
+        return None
+
+    # the source directory is the last argument of the listing command
+    command = command[:-1] + ['--from0', '--files-from=' + filelist_filepath] + command[-1:]
+
+    logging.debug("Staleness command: %s", ' '.join(command))
+
+    proc = subprocess.run(command, capture_output=True, text=True, check=False)
+
+    shutil.rmtree(tmpdir)
+
+    # 23/24 --> some of the files could not be listed/vanished, the rest of the
+    # listing is still valid
+    if proc.returncode not in [0, 23, 24]:
+        logging.error("Error retrieving remote file sizes: %s", proc.stderr)
+        return None
+
+    return parse_rsync_listing(proc.stdout).file_sizes()
+
+
+def find_stale_files(candidates, settle_delay, file_sizes_func):
+    """
+    Wait settle_delay seconds then re-check the size of the candidate files.
+    candidates is a dict of filepath: size, file_sizes_func takes a list of
+    filepaths and returns a dict of filepath: size (or None on failure).
+    Returns the list of candidate filepaths that changed size or disappeared.
+    If the current sizes could not be retrieved all candidates are returned.
+    """
+
+    if len(candidates) == 0:
+        return []
+
+    logging.debug("Waiting %s seconds before checking for changing filesizes", settle_delay)
+    time.sleep(settle_delay)
+
+    current_sizes = file_sizes_func(list(candidates.keys()))
+
+    if current_sizes is None:
+        logging.warning("Unable to verify filesizes, skipping all %s candidate file(s) this run", len(candidates))
+        return list(candidates.keys())
+
+    stale_files = [filepath for filepath, size in candidates.items() if current_sizes.get(filepath) != size]
+
+    for filepath in stale_files:
+        logging.debug("file %s has changed size, removing from include list", filepath)
+
+    return stale_files
@@ -49,8 +49,15 @@ sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 from server.lib.set_owner_group_permissions import set_owner_group_permissions
 from server.lib.check_filenames import bad_filename
 from server.lib.output_json_data_to_file import output_json_data_to_file
+from server.lib.progress import ProgressReporter
+from server.lib.rsync_itemize import OUT_FORMAT_ARG, run_rsync_itemized
 from server.lib.openvdm import OpenVDM, DEFAULT_CRUISE_CONFIG_FN
 
+FINALIZE_CRUISE_PHASES = [('setup', 10), ('collection system transfers', 40), ('publicdata transfer', 40), ('post-processing', 10)]
+
+SYNC_PUBLICDATA_PHASES = [('setup', 10), ('publicdata transfer', 70), ('post-processing', 20)]
+
+
 def build_filelist(source_dir):
     """
     Builds the list of files in the source directory
@@ -134,7 +141,7 @@ def export_ovdm_config(gearman_worker, ovdm_config_file_path, finalize=False):
     return output_json_data_to_file(ovdm_config_file_path, ovdm_config)
 
 
-def transfer_publicdata_dir(gearman_worker, gearman_job):
+def transfer_publicdata_dir(gearman_worker, progress):
     """
     Transfer the contents of the PublicData share to the Cruise Data Directory
     """
@@ -170,33 +177,22 @@ def transfer_publicdata_dir(gearman_worker, gearman_job):
         return {'verdict': False, 'reason': "Error Saving temporary rsync filelist file", 'files': files }
 
     # Build transfer command
-    command = ['rsync', '-tri', '--files-from=' + rsync_filelist_path, publicdata_dir + '/', os.path.join(gearman_worker.cruise_dir, gearman_worker.ovdm.get_required_extra_directory_by_name('From_PublicData')['destDir'])]
-    logging.debug("Command: %s", ' '.join(command))
+    command = ['rsync', '-tr', OUT_FORMAT_ARG, '--files-from=' + rsync_filelist_path, publicdata_dir + '/', os.path.join(gearman_worker.cruise_dir, gearman_worker.ovdm.get_required_extra_directory_by_name('From_PublicData')['destDir'])]
 
-    file_count = 1
-    total_files = len(files['include'])
+    file_index = 0
+    file_count = len(files['include'])
 
     # Transfer files
-    popen = subprocess.Popen(command, stdout=subprocess.PIPE)
-    lines_iterator = iter(popen.stdout.readline, b"")
-
-    for line in lines_iterator:
-        logging.debug("Line: %s", line) # yield line
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1].rstrip('\n')
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(round(20 + (70*file_count/total_files),0)), 100)
-            file_count += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1].rstrip('\n')
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(round(20 + (70*file_count/total_files),0)), 100)
-            file_count += 1
-
-        if gearman_worker.stop:
-            logging.error("Stopping rsync transfer")
-            popen.terminate()
-            break
+    for event in run_rsync_itemized([command], lambda: gearman_worker.stop):
+
+        if event.is_new_file():
+            files['new'].append(event.filename)
+            file_index += 1
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
+            file_index += 1
+            progress.update(file_index, file_count)
 
     # Cleanup
     shutil.rmtree(tmpdir)
@@ -337,6 +333,9 @@ def task_setup_new_cruise(gearman_worker, gearman_job): # pylint: disable=too-ma
 
     ovdm_config_file_path = os.path.join(gearman_worker.cruise_dir, DEFAULT_CRUISE_CONFIG_FN)
 
+    # cached configuration may belong to the previous cruise
+    gearman_worker.ovdm.invalidate_cache()
+
     gearman_worker.send_job_status(gearman_job, 1, 10)
 
     gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
@@ -433,7 +432,8 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
     """
     job_results = {'parts':[]}
 
-    gearman_worker.send_job_status(gearman_job, 1, 10)
+    progress = ProgressReporter(gearman_worker, gearman_job, FINALIZE_CRUISE_PHASES)
+    progress.start_phase('setup')
 
     publicdata_dir = gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehousePublicDataDir']
     from_publicdata_dir = os.path.join(gearman_worker.cruise_dir, gearman_worker.ovdm.get_required_extra_directory_by_name('From_PublicData')['destDir'])
@@ -446,7 +446,7 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
 
     job_results['parts'].append({"partName": "Verify cruise directory exists", "result": "Pass"})
 
-    gearman_worker.send_job_status(gearman_job, 2, 10)
+    progress.start_phase('collection system transfers')
     logging.info("Queuing Collection System Transfers")
 
     gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
@@ -469,19 +469,15 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
 
         collection_system_transfer_jobs.append( {"task": "runCollectionSystemTransfer", "data": json.dumps(gm_data)} )
 
-    gearman_worker.send_job_status(gearman_job, 3, 10)
-
     if len(collection_system_transfer_jobs) > 0:
         logging.info("Submitting runCollectionSystemTransfer jobs")
         submitted_job_request = gm_client.submit_multiple_jobs(collection_system_transfer_jobs, background=False, wait_until_complete=False)
 
-        gearman_worker.send_job_status(gearman_job, 4, 10)
-
         time.sleep(1)
         gm_client.wait_until_jobs_completed(submitted_job_request)
         logging.info("Completed runCollectionSystemTransfers jobs")
 
-    gearman_worker.send_job_status(gearman_job, 5, 10)
+    progress.start_phase('publicdata transfer')
 
     logging.info("Transferring files from PublicData to the cruise data directory")
 
@@ -500,7 +496,7 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
     job_results['parts'].append({"partName": "Verify PublicData directory exists", "result": "Pass"})
 
     logging.debug("Transferring files")
-    output_results = transfer_publicdata_dir(gearman_worker, gearman_job)
+    output_results = transfer_publicdata_dir(gearman_worker, progress)
     logging.debug("Transfer Complete")
 
     if not output_results['verdict']:
@@ -523,7 +519,7 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
 
     job_results['parts'].append({"partName": "Clear out PublicData files", "result": "Pass"})
 
-    gearman_worker.send_job_status(gearman_job, 9, 10)
+    progress.start_phase('post-processing')
 
     if len(files['new']) > 0 or len(files['updated']) > 0:
 
@@ -535,8 +531,6 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
 
         job_results['parts'].append({"partName": "Set file/directory ownership/permissions", "result": "Pass"})
 
-    gearman_worker.send_job_status(gearman_job, 95, 100)
-
     #build OpenVDM Config file
     logging.info("Exporting OpenVDM Configuration")
     output_results = export_ovdm_config(gearman_worker, ovdm_config_file_path, finalize=True)
@@ -572,7 +566,7 @@ def task_finalize_current_cruise(gearman_worker, gearman_job): # pylint: disable
 
     # need to add code for cruise data transfers
 
-    gearman_worker.send_job_status(gearman_job, 10, 10)
+    progress.complete()
     return json.dumps(job_results)
 
 def task_rsync_publicdata_to_cruise_data(gearman_worker, gearman_job):
@@ -584,7 +578,8 @@ def task_rsync_publicdata_to_cruise_data(gearman_worker, gearman_job):
     publicdata_dir = gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehousePublicDataDir']
     from_publicdata_dir = os.path.join(gearman_worker.cruise_dir, gearman_worker.ovdm.get_required_extra_directory_by_name('From_PublicData')['destDir'])
 
-    gearman_worker.send_job_status(gearman_job, 1, 10)
+    progress = ProgressReporter(gearman_worker, gearman_job, SYNC_PUBLICDATA_PHASES)
+    progress.start_phase('setup')
 
     if os.path.exists(from_publicdata_dir):
         job_results['parts'].append({"partName": "Verify From_PublicData directory exists", "result": "Pass"})
@@ -598,10 +593,10 @@ def task_rsync_publicdata_to_cruise_data(gearman_worker, gearman_job):
         job_results['parts'].append({"partName": "Verify PublicData directory exists", "result": "Fail", "reason": "Unable to locate the PublicData directory: " + publicdata_dir})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(gearman_job, 5, 10)
+    progress.start_phase('publicdata transfer')
 
     logging.info("Transferring files from PublicData to the cruise data directory")
-    output_results = transfer_publicdata_dir(gearman_worker, gearman_job)
+    output_results = transfer_publicdata_dir(gearman_worker, progress)
 
     if not output_results['verdict']:
         job_results['parts'].append({"partName": "Transfer files", "result": "Fail", "reason": output_results['reason']})
@@ -613,7 +608,7 @@ def task_rsync_publicdata_to_cruise_data(gearman_worker, gearman_job):
 
     logging.debug("Files Transferred: %s",json.dumps(files, indent=2))
 
-    gearman_worker.send_job_status(gearman_job, 8, 10)
+    progress.start_phase('post-processing')
 
     if len(files['new']) > 0 or len(files['updated']) > 0:
 
@@ -626,8 +621,6 @@ def task_rsync_publicdata_to_cruise_data(gearman_worker, gearman_job):
             job_results['parts'].append({"partName": "Set file/directory ownership/permissions", "result": "Fail", "reason": output_results['reason']})
             return json.dumps(job_results)
 
-        gearman_worker.send_job_status(gearman_job, 9, 100)
-
         logging.info("Initiating MD5 Summary Task")
 
         gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
@@ -643,7 +636,7 @@ def task_rsync_publicdata_to_cruise_data(gearman_worker, gearman_job):
 
     # need to verify update MD5 completed successfully
 
-    gearman_worker.send_job_status(gearman_job, 10, 10)
+    progress.complete()
     return json.dumps(job_results)
 
 
@@ -33,6 +33,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>
 """
 
 import argparse
+import fcntl
 import os
 import sys
 import json
@@ -47,10 +48,20 @@ sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
 from server.lib.set_owner_group_permissions import set_owner_group_permissions
 from server.lib.output_json_data_to_file import output_json_data_to_file
+from server.lib.file_manifest import count_files, iter_files
+from server.lib.progress import ProgressReporter
 from server.lib.openvdm import OpenVDM, DEFAULT_DATA_DASHBOARD_MANIFEST_FN
 
 PYTHON_BINARY = os.path.join(dirname(dirname(dirname(realpath(__file__)))), 'venv/bin/python')
 
+DATA_DASHBOARD_PHASES = [('setup', 10), ('processing', 80), ('manifest', 10)]
+
+# Queued API updates (i.e. parsing error messages) are sent every this many files
+BATCH_FILES = 25
+
+# Serializes manifest updates when multiple data dashboard workers are running
+DATA_DASHBOARD_MANIFEST_LOCK_FILEPATH = '/tmp/openvdm-data-dashboard-manifest.lock'
+
 customTasks = [
     {
         "taskID": "0",
@@ -82,6 +93,7 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker): # pylint: disable=too-ma
 
     def __init__(self):
         self.stop = False
+        self.retire = False
         self.ovdm = OpenVDM()
         self.task = None
         self.shipboard_data_warehouse_config = self.ovdm.get_shipboard_data_warehouse_config()
@@ -224,6 +236,26 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker): # pylint: disable=too-ma
         self.shutdown()
 
 
+    def retire_worker(self):
+        """
+        Function to quit the worker once the current job is complete
+        """
+        self.retire = True
+        logging.warning("Retiring worker...")
+
+
+    def after_poll(self, any_activity): # pylint: disable=unused-argument
+        """
+        Function run after each poll of the Gearman server, returning False
+        stops the worker
+        """
+        if self.retire:
+            logging.warning("Worker retired")
+            return False
+
+        return True
+
+
 def task_update_data_dashboard(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-branches,too-many-statements
     """
     Update the existing dashboard files with new/updated raw data
@@ -239,7 +271,8 @@ def task_update_data_dashboard(gearman_worker, gearman_job): # pylint: disable=t
     payload_obj = json.loads(gearman_job.data)
     logging.debug('Payload: %s', json.dumps(payload_obj, indent=2))
 
-    gearman_worker.send_job_status(gearman_job, 5, 100)
+    progress = ProgressReporter(gearman_worker, gearman_job, DATA_DASHBOARD_PHASES)
+    progress.start_phase('setup')
 
     logging.info('Collection System Transfer: %s', gearman_worker.collection_system_transfer['name'])
 
@@ -256,14 +289,14 @@ def task_update_data_dashboard(gearman_worker, gearman_job): # pylint: disable=t
         logging.warning("Processing script not found: %s", processing_script_filename)
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(gearman_job, 10, 100)
+    progress.start_phase('processing')
 
     #build filelist
     filelist = []
 
-    if payload_obj['files']['new'] or payload_obj['files']['updated']:
-        filelist = payload_obj['files']['new']
-        filelist += payload_obj['files']['updated']
+    if count_files(payload_obj['files'], 'new') or count_files(payload_obj['files'], 'updated'):
+        filelist = list(iter_files(payload_obj['files'], 'new'))
+        filelist += iter_files(payload_obj['files'], 'updated')
         logging.debug('File List: %s', json.dumps(filelist, indent=2))
         job_results['parts'].append({"partName": "Retrieve Filelist", "result": "Pass"})
 
@@ -274,157 +307,163 @@ def task_update_data_dashboard(gearman_worker, gearman_job): # pylint: disable=t
 
     file_count = len(filelist)
     file_index = 0
-    for filename in filelist:  # pylint: disable=too-many-nested-blocks
+    # queue the per-file error messages, they are sent every BATCH_FILES files
+    with gearman_worker.ovdm.batch():
+        for idx, filename in enumerate(filelist):  # pylint: disable=too-many-nested-blocks
 
-        if gearman_worker.stop:
-            break
+            if gearman_worker.stop:
+                break
 
-        logging.info("Processing file: %s", filename)
-        json_filename = os.path.splitext(filename)[0] + '.json'
-        raw_filepath = os.path.join(gearman_worker.cruise_dir, filename)
-        json_filepath = os.path.join(gearman_worker.data_dashboard_dir, json_filename)
+            if idx > 0 and idx % BATCH_FILES == 0:
+                gearman_worker.ovdm.flush_batch()
 
-        if not os.path.isfile(raw_filepath):
-            job_results['parts'].append({"partName": "Verify data file exists", "result": "Fail", "reason": "Unable to find data file: " + filename})
-            logging.warning("File not found %s, skipping", filename)
-            continue
+            logging.info("Processing file: %s", filename)
+            json_filename = os.path.splitext(filename)[0] + '.json'
+            raw_filepath = os.path.join(gearman_worker.cruise_dir, filename)
+            json_filepath = os.path.join(gearman_worker.data_dashboard_dir, json_filename)
 
-        if os.stat(raw_filepath).st_size == 0:
-            logging.warning("File is empty %s, skipping", filename)
-            continue
+            if not os.path.isfile(raw_filepath):
+                job_results['parts'].append({"partName": "Verify data file exists", "result": "Fail", "reason": "Unable to find data file: " + filename})
+                logging.warning("File not found %s, skipping", filename)
+                continue
 
-        command = [PYTHON_BINARY, processing_script_filename, '--dataType', raw_filepath]
+            if os.stat(raw_filepath).st_size == 0:
+                logging.warning("File is empty %s, skipping", filename)
+                continue
 
-        logging.debug("DataType Retrieval Command: %s", ' '.join(command))
+            command = [PYTHON_BINARY, processing_script_filename, '--dataType', raw_filepath]
 
-        datatype_proc = subprocess.run(command, capture_output=True, text=True, check=False)
+            logging.debug("DataType Retrieval Command: %s", ' '.join(command))
 
-        if datatype_proc.stdout:
-            dd_type = datatype_proc.stdout.rstrip('\n')
-            logging.debug("DataType found to be: %s", dd_type)
+            datatype_proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-            command = [PYTHON_BINARY, processing_script_filename, raw_filepath]
+            if datatype_proc.stdout:
+                dd_type = datatype_proc.stdout.rstrip('\n')
+                logging.debug("DataType found to be: %s", dd_type)
 
-            logging.debug("Data Processing Command: %s", ' '.join(command))
+                command = [PYTHON_BINARY, processing_script_filename, raw_filepath]
 
-            data_proc = subprocess.run(command, capture_output=True, text=True, check=False)
+                logging.debug("Data Processing Command: %s", ' '.join(command))
 
-            if data_proc.stdout:
-                try:
-                    logging.debug("Verifying output")
-                    out_obj = json.loads(data_proc.stdout)
-                except Exception as err:
-                    logging.error("Error parsing JSON output from file: %s", filename)
-                    logging.debug(str(err))
-                    job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail", "reason": "Error parsing JSON output from file: " + filename})
-                    continue
-                else:
-                    if not out_obj:
-                        error_title = 'Datafile Parsing error'
-                        error_body = "Parser returned no output. Parsing command: {}", ' '.join(command)
-                        logging.error("%s: %s", error_title, error_body)
-                        gearman_worker.ovdm.send_msg(error_title,error_body)
-                    elif 'error' in out_obj:
-                        error_title = 'Datafile Parsing error'
-                        error_body = out_obj['error']
-                        logging.error("%s: %s", error_title, error_body)
-                        gearman_worker.ovdm.send_msg(error_title,error_body)
-                    else:
-                        output_results = output_json_data_to_file(json_filepath, out_obj)
+                data_proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-                        if output_results['verdict']:
-                            job_results['parts'].append({"partName": "Writing DashboardData file: " + filename, "result": "Pass"})
-                        else:
-                            error_title = 'Data Dashboard Processing failed'
-                            error_body = "Error Writing DashboardData file: " + filename + ". Reason: " + output_results['reason']
+                if data_proc.stdout:
+                    try:
+                        logging.debug("Verifying output")
+                        out_obj = json.loads(data_proc.stdout)
+                    except Exception as err:
+                        logging.error("Error parsing JSON output from file: %s", filename)
+                        logging.debug(str(err))
+                        job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail", "reason": "Error parsing JSON output from file: " + filename})
+                        continue
+                    else:
+                        if not out_obj:
+                            error_title = 'Datafile Parsing error'
+                            error_body = "Parser returned no output. Parsing command: {}", ' '.join(command)
                             logging.error("%s: %s", error_title, error_body)
                             gearman_worker.ovdm.send_msg(error_title,error_body)
-                            job_results['parts'].append({"partName": "Writing Dashboard file: " + filename, "result": "Fail", "reason": output_results['reason']})
+                        elif 'error' in out_obj:
+                            error_title = 'Datafile Parsing error'
+                            error_body = out_obj['error']
+                            logging.error("%s: %s", error_title, error_body)
+                            gearman_worker.ovdm.send_msg(error_title,error_body)
+                        else:
+                            output_results = output_json_data_to_file(json_filepath, out_obj)
 
-                        new_manifest_entries.append({"type":dd_type, "dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data": raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
+                            if output_results['verdict']:
+                                job_results['parts'].append({"partName": "Writing DashboardData file: " + filename, "result": "Pass"})
+                            else:
+                                error_title = 'Data Dashboard Processing failed'
+                                error_body = "Error Writing DashboardData file: " + filename + ". Reason: " + output_results['reason']
+                                logging.error("%s: %s", error_title, error_body)
+                                gearman_worker.ovdm.send_msg(error_title,error_body)
+                                job_results['parts'].append({"partName": "Writing Dashboard file: " + filename, "result": "Fail", "reason": output_results['reason']})
+
+                            new_manifest_entries.append({"type":dd_type, "dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data": raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
+                else:
+                    error_title = 'Data Dashboard Processing failed'
+                    error_body = 'No JSON output recieved from file.  Parsing Command: ' + ' '.join(command)
+                    logging.error("%s: %s", error_title, error_body)
+                    gearman_worker.ovdm.send_msg(error_title,error_body)
+                    remove_manifest_entries.append({"dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data": raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
+
+                    #job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail"})
+                    if data_proc.stderr:
+                        logging.error("Err: %s", data_proc.stderr)
             else:
-                error_title = 'Data Dashboard Processing failed'
-                error_body = 'No JSON output recieved from file.  Parsing Command: ' + ' '.join(command)
-                logging.error("%s: %s", error_title, error_body)
-                gearman_worker.ovdm.send_msg(error_title,error_body)
-                remove_manifest_entries.append({"dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data": raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
-
-                #job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail"})
-                if data_proc.stderr:
-                    logging.error("Err: %s", data_proc.stderr)
-        else:
-            logging.warning("File is of unknown datatype: %s", raw_filepath)
-            remove_manifest_entries.append({"dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data":raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
+                logging.warning("File is of unknown datatype: %s", raw_filepath)
+                remove_manifest_entries.append({"dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data":raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
 
-            if datatype_proc.stderr:
-                logging.error("Err: %s", datatype_proc.stderr)
+                if datatype_proc.stderr:
+                    logging.error("Err: %s", datatype_proc.stderr)
 
-        gearman_worker.send_job_status(gearman_job, int(10 + 70*float(file_index)/float(file_count)), 100)
-        file_index += 1
+            file_index += 1
+            progress.update(file_index, file_count)
 
-    gearman_worker.send_job_status(gearman_job, 8, 10)
+    progress.start_phase('manifest')
 
     if len(new_manifest_entries) > 0:
         logging.info("Updating Manifest file: %s", gearman_worker.data_dashboard_manifest_file_path)
 
-        rows_removed = 0
+        with open(DATA_DASHBOARD_MANIFEST_LOCK_FILEPATH, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
 
-        existing_manifest_entries = []
+            rows_removed = 0
 
-        try:
-            with open(gearman_worker.data_dashboard_manifest_file_path, 'r') as dashboard_manifest_file:
-                existing_manifest_entries = json.load(dashboard_manifest_file)
+            existing_manifest_entries = []
 
-            job_results['parts'].append({"partName": "Reading pre-existing Dashboard manifest file", "result": "Pass"})
+            try:
+                with open(gearman_worker.data_dashboard_manifest_file_path, 'r') as dashboard_manifest_file:
+                    existing_manifest_entries = json.load(dashboard_manifest_file)
 
-        except IOError:
-            logging.error("Error Reading Dashboard Manifest file %s", gearman_worker.data_dashboard_manifest_file_path)
-            job_results['parts'].append({"partName": "Reading pre-existing Dashboard manifest file", "result": "Fail", "reason": "Error reading dashboard manifest file: " + gearman_worker.data_dashboard_manifest_file_path})
-            return json.dumps(job_results)
+                job_results['parts'].append({"partName": "Reading pre-existing Dashboard manifest file", "result": "Pass"})
 
-        logging.debug("Entries to remove: %s", json.dumps(remove_manifest_entries, indent=2))
-        for remove_entry in remove_manifest_entries:
-            for idx, existing_entry in enumerate(existing_manifest_entries):
-                if remove_entry['raw_data'] == existing_entry['raw_data']:
-                    del existing_manifest_entries[idx]
-                    rows_removed += 1
+            except IOError:
+                logging.error("Error Reading Dashboard Manifest file %s", gearman_worker.data_dashboard_manifest_file_path)
+                job_results['parts'].append({"partName": "Reading pre-existing Dashboard manifest file", "result": "Fail", "reason": "Error reading dashboard manifest file: " + gearman_worker.data_dashboard_manifest_file_path})
+                return json.dumps(job_results)
 
-                    if os.path.isfile(os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'],remove_entry['dd_json'])):
-                        logging.info("Deleting orphaned dd_json file %s", os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'],remove_entry['dd_json']))
-                        os.remove(os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'],remove_entry['dd_json']))
-                    break
+            logging.debug("Entries to remove: %s", json.dumps(remove_manifest_entries, indent=2))
+            for remove_entry in remove_manifest_entries:
+                for idx, existing_entry in enumerate(existing_manifest_entries):
+                    if remove_entry['raw_data'] == existing_entry['raw_data']:
+                        del existing_manifest_entries[idx]
+                        rows_removed += 1
 
-        logging.debug("Entries to add/update: %s", json.dumps(new_manifest_entries, indent=2))
-        for new_entry in new_manifest_entries:
-            updated = False
-            for existing_entry in existing_manifest_entries:
-                if new_entry['raw_data'] == existing_entry['raw_data']:
-                    updated = True
-                    job_results['files']['updated'].append(new_entry['dd_json'].replace(gearman_worker.cruise_id + '/',''))
-                    break
+                        if os.path.isfile(os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'],remove_entry['dd_json'])):
+                            logging.info("Deleting orphaned dd_json file %s", os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'],remove_entry['dd_json']))
+                            os.remove(os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'],remove_entry['dd_json']))
+                        break
 
-            if not updated: #added
-                job_results['files']['new'].append(new_entry['dd_json'].replace(gearman_worker.cruise_id + '/',''))
-                existing_manifest_entries.append(new_entry)
+            logging.debug("Entries to add/update: %s", json.dumps(new_manifest_entries, indent=2))
+            for new_entry in new_manifest_entries:
+                updated = False
+                for existing_entry in existing_manifest_entries:
+                    if new_entry['raw_data'] == existing_entry['raw_data']:
+                        updated = True
+                        job_results['files']['updated'].append(new_entry['dd_json'].replace(gearman_worker.cruise_id + '/',''))
+                        break
 
-        if len(job_results['files']['new']) > 0:
-            logging.info("%s row(s) added", len(job_results['files']['new']))
-        if len(job_results['files']['updated']) > 0:
-            logging.info("%s row(s) updated", len(job_results['files']['updated']))
-        if rows_removed:
-            logging.info("%s row(s) removed", rows_removed)
+                if not updated: #added
+                    job_results['files']['new'].append(new_entry['dd_json'].replace(gearman_worker.cruise_id + '/',''))
+                    existing_manifest_entries.append(new_entry)
 
-        output_results = output_json_data_to_file(gearman_worker.data_dashboard_manifest_file_path, existing_manifest_entries)
+            if len(job_results['files']['new']) > 0:
+                logging.info("%s row(s) added", len(job_results['files']['new']))
+            if len(job_results['files']['updated']) > 0:
+                logging.info("%s row(s) updated", len(job_results['files']['updated']))
+            if rows_removed:
+                logging.info("%s row(s) removed", rows_removed)
 
-        if not output_results['verdict']:
-            logging.error("Error Writing Dashboard manifest file: %s", gearman_worker.data_dashboard_manifest_file_path)
-            job_results['parts'].append({"partName": "Writing Dashboard manifest file", "result": "Fail", "reason": output_results['reason']})
-            return json.dumps(job_results)
+            output_results = output_json_data_to_file(gearman_worker.data_dashboard_manifest_file_path, existing_manifest_entries)
 
-        job_results['parts'].append({"partName": "Writing Dashboard manifest file", "result": "Pass"})
-        job_results['files']['updated'].append(os.path.join(gearman_worker.ovdm.get_required_extra_directory_by_name('Dashboard_Data')['destDir'], DEFAULT_DATA_DASHBOARD_MANIFEST_FN))
+            if not output_results['verdict']:
+                logging.error("Error Writing Dashboard manifest file: %s", gearman_worker.data_dashboard_manifest_file_path)
+                job_results['parts'].append({"partName": "Writing Dashboard manifest file", "result": "Fail", "reason": output_results['reason']})
+                return json.dumps(job_results)
 
-        gearman_worker.send_job_status(gearman_job, 9, 10)
+            job_results['parts'].append({"partName": "Writing Dashboard manifest file", "result": "Pass"})
+        job_results['files']['updated'].append(os.path.join(gearman_worker.ovdm.get_required_extra_directory_by_name('Dashboard_Data')['destDir'], DEFAULT_DATA_DASHBOARD_MANIFEST_FN))
 
         logging.info("Setting file ownership/permissions")
         output_results = set_owner_group_permissions(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseUsername'], gearman_worker.data_dashboard_dir)
@@ -435,7 +474,7 @@ def task_update_data_dashboard(gearman_worker, gearman_job): # pylint: disable=t
             job_results['parts'].append({"partName": "Set file/directory ownership", "result": "Fail", "reason": output_results['reason']})
             return json.dumps(job_results)
 
-    gearman_worker.send_job_status(gearman_job, 10, 10)
+    progress.complete()
 
     return json.dumps(job_results)
 
@@ -466,12 +505,16 @@ def task_rebuild_data_dashboard(gearman_worker, gearman_job): # pylint: disable=
 
     collection_system_transfers = gearman_worker.ovdm.get_active_collection_system_transfers()
 
-    gearman_worker.send_job_status(gearman_job, 1, 100)
+    progress = ProgressReporter(gearman_worker, gearman_job, DATA_DASHBOARD_PHASES)
+    progress.start_phase('setup')
 
     new_manifest_entries = []
 
     collection_system_transfer_count = len(collection_system_transfers)
     collection_system_transfer_index = 0
+
+    progress.start_phase('processing')
+
     for collection_system_transfer in collection_system_transfers:  # pylint: disable=too-many-nested-blocks
 
         logging.info('Processing data from: %s', collection_system_transfer['name'])
@@ -481,8 +524,8 @@ def task_rebuild_data_dashboard(gearman_worker, gearman_job): # pylint: disable=
 
         if not os.path.isfile(processing_script_filename):
             logging.warning("Processing script for collection system %s not found, moving on.", collection_system_transfer['name'])
-            gearman_worker.send_job_status(gearman_job, int(10 + (80*float(collection_system_transfer_index)/float(collection_system_transfer_count))), 100)
             collection_system_transfer_index += 1
+            progress.update(collection_system_transfer_index, collection_system_transfer_count)
             continue
 
         # collection_system_transferOutputDir = os.path.join(gearman_worker.data_dashboard_dir, collection_system_transfer['destDir'])
@@ -509,109 +552,115 @@ def task_rebuild_data_dashboard(gearman_worker, gearman_job): # pylint: disable=
         file_index = 0
         logging.info("%s file(s) to process", file_count)
 
-        for filename in filelist:
+        with gearman_worker.ovdm.batch():
+            for idx, filename in enumerate(filelist):
 
-            if gearman_worker.stop:
-                break
+                if gearman_worker.stop:
+                    break
 
-            logging.info("Processing file: %s", filename)
-            json_filename = os.path.splitext(filename)[0] + '.json'
-            logging.debug("jsonFileName: %s", json_filename)
-            raw_filepath = os.path.join(gearman_worker.cruise_dir, filename)
-            logging.debug("rawFilePath: %s", raw_filepath)
-            json_filepath = os.path.join(gearman_worker.data_dashboard_dir, json_filename)
-            logging.debug("jsonFilePath: %s", json_filepath)
+                if idx > 0 and idx % BATCH_FILES == 0:
+                    gearman_worker.ovdm.flush_batch()
 
-            if os.stat(raw_filepath).st_size == 0:
-                logging.warning("File %s is empty", filename)
-                continue
+                logging.info("Processing file: %s", filename)
+                json_filename = os.path.splitext(filename)[0] + '.json'
+                logging.debug("jsonFileName: %s", json_filename)
+                raw_filepath = os.path.join(gearman_worker.cruise_dir, filename)
+                logging.debug("rawFilePath: %s", raw_filepath)
+                json_filepath = os.path.join(gearman_worker.data_dashboard_dir, json_filename)
+                logging.debug("jsonFilePath: %s", json_filepath)
 
-            command = [PYTHON_BINARY, processing_script_filename, '--dataType', raw_filepath]
+                if os.stat(raw_filepath).st_size == 0:
+                    logging.warning("File %s is empty", filename)
+                    continue
 
-            logging.debug("Get Datatype Command: %s", ' '.join(command))
+                command = [PYTHON_BINARY, processing_script_filename, '--dataType', raw_filepath]
 
-            datatype_proc = subprocess.run(command, capture_output=True, text=True, check=False)
+                logging.debug("Get Datatype Command: %s", ' '.join(command))
 
-            if datatype_proc.stdout:
-                dd_type = datatype_proc.stdout.rstrip('\n')
-                logging.debug("Found to be type: %s", dd_type)
+                datatype_proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-                command = [PYTHON_BINARY, processing_script_filename, raw_filepath]
+                if datatype_proc.stdout:
+                    dd_type = datatype_proc.stdout.rstrip('\n')
+                    logging.debug("Found to be type: %s", dd_type)
 
-                logging.debug("Processing Command: %s", ' '.join(command))
+                    command = [PYTHON_BINARY, processing_script_filename, raw_filepath]
 
-                data_proc = subprocess.run(command, capture_output=True, text=True, check=False)
+                    logging.debug("Processing Command: %s", ' '.join(command))
 
-                if data_proc.stdout:
-                    try:
-                        logging.debug("Parsing output")
-                        # logging.debug(data_proc.stdout)
-                        out_obj = json.loads(data_proc.stdout)
-                    except Exception as err:
-                        logging.error(str(err))
-                        error_title = 'Error parsing output'
-                        error_body = 'Invalid JSON output recieved from processing. Command: ' + ' '.join(command)
-                        logging.error("%s: %s", error_title, error_body)
-                        gearman_worker.ovdm.send_msg(error_title, error_body)
-                        job_results['parts'].append({"partName": "Parsing JSON output " + filename, "result": "Fail", "reason": error_title + ':' + error_body})
-                    else:
-                        if out_obj is None:
-                            error_title = 'Error processing file'
-                            error_body = 'No JSON output recieved from file. Processing Command: ' + ' '.join(command)
-                            logging.error("%s: %s", error_title, error_body)
-                            gearman_worker.ovdm.send_msg(error_title, error_body)
-                            job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail", "reason": error_title + ': ' + error_body})
+                    data_proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-                            if data_proc.stderr:
-                                logging.error('err: %s', data_proc.stderr)
-
-                        elif 'error' in out_obj:
-                            error_title = 'Error processing file'
-                            error_body = out_obj['error']
+                    if data_proc.stdout:
+                        try:
+                            logging.debug("Parsing output")
+                            # logging.debug(data_proc.stdout)
+                            out_obj = json.loads(data_proc.stdout)
+                        except Exception as err:
+                            logging.error(str(err))
+                            error_title = 'Error parsing output'
+                            error_body = 'Invalid JSON output recieved from processing. Command: ' + ' '.join(command)
                             logging.error("%s: %s", error_title, error_body)
                             gearman_worker.ovdm.send_msg(error_title, error_body)
-                            job_results['parts'].append({"partName": "Processing Datafile " + filename, "result": "Fail", "reason": error_title + ':' + error_body})
-
+                            job_results['parts'].append({"partName": "Parsing JSON output " + filename, "result": "Fail", "reason": error_title + ':' + error_body})
                         else:
-                            #job_results['parts'].append({"partName": "Processing Datafile " + filename, "result": "Pass"})
-                            output_results = output_json_data_to_file(json_filepath, out_obj)
+                            if out_obj is None:
+                                error_title = 'Error processing file'
+                                error_body = 'No JSON output recieved from file. Processing Command: ' + ' '.join(command)
+                                logging.error("%s: %s", error_title, error_body)
+                                gearman_worker.ovdm.send_msg(error_title, error_body)
+                                job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail", "reason": error_title + ': ' + error_body})
 
-                            if output_results['verdict']:
-                                job_results['parts'].append({"partName": "Writing DashboardData file: " + filename, "result": "Pass"})
-                            else:
-                                error_title = 'Error writing file'
-                                error_body = "Error Writing DashboardData file: " + filename
+                                if data_proc.stderr:
+                                    logging.error('err: %s', data_proc.stderr)
+
+                            elif 'error' in out_obj:
+                                error_title = 'Error processing file'
+                                error_body = out_obj['error']
                                 logging.error("%s: %s", error_title, error_body)
                                 gearman_worker.ovdm.send_msg(error_title, error_body)
+                                job_results['parts'].append({"partName": "Processing Datafile " + filename, "result": "Fail", "reason": error_title + ':' + error_body})
 
-                                job_results['parts'].append({"partName": "Writing Dashboard file: " + filename, "result": "Fail", "reason": output_results['verdict']})
+                            else:
+                                #job_results['parts'].append({"partName": "Processing Datafile " + filename, "result": "Pass"})
+                                output_results = output_json_data_to_file(json_filepath, out_obj)
 
-                            new_manifest_entries.append({"type":dd_type, "dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data": raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
-                else:
-                    error_title = 'Error processing file'
-                    error_body = 'No JSON output recieved from file. Processing Command: ' + ' '.join(command)
-                    logging.error("%s: %s", error_title, error_body)
-                    gearman_worker.ovdm.send_msg(error_title, error_body)
-                    job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail", "reason": error_title + ': ' + error_body})
+                                if output_results['verdict']:
+                                    job_results['parts'].append({"partName": "Writing DashboardData file: " + filename, "result": "Pass"})
+                                else:
+                                    error_title = 'Error writing file'
+                                    error_body = "Error Writing DashboardData file: " + filename
+                                    logging.error("%s: %s", error_title, error_body)
+                                    gearman_worker.ovdm.send_msg(error_title, error_body)
 
-                    if data_proc.stderr:
-                        logging.error('err: %s', data_proc.stderr)
+                                    job_results['parts'].append({"partName": "Writing Dashboard file: " + filename, "result": "Fail", "reason": output_results['verdict']})
 
-            else:
-                logging.warning("File is of unknown datatype, moving on")
+                                new_manifest_entries.append({"type":dd_type, "dd_json": json_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/',''), "raw_data": raw_filepath.replace(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'] + '/','')})
+                    else:
+                        error_title = 'Error processing file'
+                        error_body = 'No JSON output recieved from file. Processing Command: ' + ' '.join(command)
+                        logging.error("%s: %s", error_title, error_body)
+                        gearman_worker.ovdm.send_msg(error_title, error_body)
+                        job_results['parts'].append({"partName": "Parsing JSON output from file " + filename, "result": "Fail", "reason": error_title + ': ' + error_body})
 
-                if datatype_proc.stderr:
-                    logging.error('err: %s', datatype_proc.stderr)
+                        if data_proc.stderr:
+                            logging.error('err: %s', data_proc.stderr)
 
-            gearman_worker.send_job_status(gearman_job, int(10 + 70*float(file_index)/float(file_count)), 100)
-            file_index += 1
+                else:
+                    logging.warning("File is of unknown datatype, moving on")
+
+                    if datatype_proc.stderr:
+                        logging.error('err: %s', datatype_proc.stderr)
+
+                file_index += 1
+                progress.update(collection_system_transfer_index + float(file_index)/float(file_count), collection_system_transfer_count)
 
         collection_system_transfer_index += 1
 
-    gearman_worker.send_job_status(gearman_job, 90, 100)
+    progress.start_phase('manifest')
 
     logging.info("Update Dashboard Manifest file")
-    output_results = output_json_data_to_file(gearman_worker.data_dashboard_manifest_file_path, new_manifest_entries)
+    with open(DATA_DASHBOARD_MANIFEST_LOCK_FILEPATH, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        output_results = output_json_data_to_file(gearman_worker.data_dashboard_manifest_file_path, new_manifest_entries)
 
     if output_results['verdict']:
         job_results['parts'].append({"partName": "Updating manifest file", "result": "Pass"})
@@ -620,8 +669,6 @@ def task_rebuild_data_dashboard(gearman_worker, gearman_job): # pylint: disable=
         job_results['parts'].append({"partName": "Updating manifest file", "result": "Fail", "reason": output_results['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(gearman_job, 95, 100)
-
     logging.info("Setting file ownership/permissions")
     output_results = set_owner_group_permissions(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseUsername'], gearman_worker.data_dashboard_dir)
 
@@ -632,12 +679,10 @@ def task_rebuild_data_dashboard(gearman_worker, gearman_job): # pylint: disable=
         job_results['parts'].append({"partName": "Setting file/directory ownership", "result": "Fail", "reason": output_results['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(gearman_job, 99, 100)
-
     data_dashboard_dest_dir = gearman_worker.ovdm.get_required_extra_directory_by_name('Dashboard_Data')['destDir']
     job_results['files']['updated'] = [os.path.join(data_dashboard_dest_dir, filepath) for filepath in build_filelist(gearman_worker.data_dashboard_dir)]# might need to remove cruise_dir from begining of filepaths
 
-    gearman_worker.send_job_status(gearman_job, 10, 10)
+    progress.complete()
 
     return json.dumps(job_results)
 
@@ -685,8 +730,16 @@ if __name__ == "__main__":
         logging.warning("INT Signal Received")
         new_worker.quit_worker()
 
+    def sigusr1_handler(_signo, _stack_frame):
+        """
+        Signal Handler for USR1
+        """
+        logging.warning("USR1 Signal Received")
+        new_worker.retire_worker()
+
     signal.signal(signal.SIGQUIT, sigquit_handler)
     signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGUSR1, sigusr1_handler)
 
     logging.info("Registering worker tasks...")
 
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+
+FILE:  directory_watcher.py
+
+DESCRIPTION:  This program watches the source directories of the local
+    directory collection system transfers and submits a collection system
+    transfer containing just the changed files shortly after new data is
+    written.  The transfers submitted by scheduler.py continue to perform full
+    scans of the source directories.
+
+USAGE: directory_watcher.py [--debounce <debounce>] [--max-delay <max-delay>]
+    [--refresh <refresh>]
+
+ARGUMENTS: --debounce <debounce> The number of seconds without new events
+            before the changed files are submitted for transfer.
+
+           --max-delay <max-delay> The maximum number of seconds changed files
+            are held back while events keep arriving.
+
+           --refresh <refresh> The interval in seconds between checks for
+            changes to the collection system transfer configurations.
+
+     BUGS:
+    NOTES: Requires inotifywait (inotify-tools).  Only files that are closed
+           after writing or moved into a watched directory are reported, the
+           contents of directories moved into a watched directory are picked
+           up by the next scheduled transfer.
+   AUTHOR:  Webb Pinner
+  COMPANY:  Capable Solutions
+  VERSION:  2.5
+  CREATED:  2021-06-01
+ REVISION:  2021-06-01
+
+LICENSE INFO: Open Vessel Data Management v2.5 (OpenVDMv2)
+Copyright (C) OceanDataRat.org 2021
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import logging
+import threading
+import subprocess
+from os.path import dirname, realpath
+from python3_gearman import GearmanClient
+from python3_gearman.constants import JOB_UNKNOWN
+
+sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
+
+from server.lib.openvdm import OpenVDM
+
+INOTIFY_EVENTS = ['close_write', 'moved_to']
+
+# python3_gearman does not read the socket at all with a poll_timeout of 0
+JOB_POLL_TIMEOUT = 0.01 # seconds
+
+
+def build_source_dir(collection_system_transfer, cruise_id, lowering_id, lowering_data_base_dir):
+    """
+    Replace wildcard string in sourceDir
+    """
+
+    lowering_id = lowering_id if lowering_id is not None else ""
+    return collection_system_transfer['sourceDir'].replace('{cruiseID}', cruise_id).replace('{loweringID}', lowering_id).replace('{loweringDataBaseDir}', lowering_data_base_dir).rstrip('/')
+
+
+def read_events(proc, events):
+    """
+    Push each filepath reported by inotifywait onto the events queue, followed
+    by None once inotifywait exits.
+    """
+
+    for line in proc.stdout:
+        events.put(line.rstrip('\n'))
+
+    events.put(None)
+
+
+class DirectoryWatcher():
+    """
+    Watches the local source directories and submits runCollectionSystemTransfer
+    jobs containing the changed files.  Events are debounced per collection
+    system, only one job per collection system is outstanding at a time and
+    files from a job that was skipped because a transfer was already running
+    are re-submitted.
+    """
+
+    def __init__(self, ovdm, debounce, max_delay):
+
+        self.ovdm = ovdm
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.gm_client = GearmanClient([self.ovdm.get_gearman_server()])
+
+        self.source_dirs = {}
+        self.proc = None
+        self.events = queue.Queue()
+
+        self.pending = {}
+        self.first_event_times = {}
+        self.last_event_times = {}
+        self.outstanding = {}
+
+
+    def refresh(self):
+        """
+        Re-read the collection system transfer configurations and restart
+        inotifywait if the set of watched directories changed
+        """
+
+        warehouse_config = self.ovdm.get_shipboard_data_warehouse_config()
+        cruise_id = self.ovdm.get_cruise_id()
+        lowering_id = self.ovdm.get_lowering_id()
+
+        source_dirs = {}
+
+        for collection_system_transfer in self.ovdm.get_active_collection_system_transfers():
+            if collection_system_transfer['transferType'] != "1": # Local Directory
+                continue
+
+            if collection_system_transfer['cruiseOrLowering'] == "1" and not lowering_id:
+                continue
+
+            source_dir = build_source_dir(collection_system_transfer, cruise_id, lowering_id, warehouse_config['loweringDataBaseDir'])
+
+            if not os.path.isdir(source_dir):
+                logging.debug("Source directory for %s not found: %s", collection_system_transfer['name'], source_dir)
+                continue
+
+            source_dirs[collection_system_transfer['collectionSystemTransferID']] = source_dir
+
+        if source_dirs == self.source_dirs and self.proc is not None and self.proc.poll() is None:
+            return
+
+        # pending paths are relative to the previous source directory
+        for collection_system_transfer_id in list(self.pending.keys()):
+            if source_dirs.get(collection_system_transfer_id) != self.source_dirs.get(collection_system_transfer_id):
+                del self.pending[collection_system_transfer_id]
+
+        self.source_dirs = source_dirs
+        self._restart()
+
+
+    def _restart(self):
+        """
+        (Re)start inotifywait for the current source directories
+        """
+
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            self.proc.wait()
+
+        self.proc = None
+
+        # events from the previous inotifywait process are discarded, any
+        # files they reported are still pending
+        self.events = queue.Queue()
+
+        if len(self.source_dirs) == 0:
+            logging.info("No local directory collection systems to watch")
+            return
+
+        command = ['inotifywait', '-m', '-r', '-q', '--format', '%w%f']
+        for event in INOTIFY_EVENTS:
+            command += ['-e', event]
+        command += sorted(set(self.source_dirs.values()))
+
+        logging.info("Watching %s source directory(ies)", len(self.source_dirs))
+        logging.debug("Watch command: %s", ' '.join(command))
+
+        self.proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        threading.Thread(target=read_events, args=(self.proc, self.events), daemon=True).start()
+
+
+    def _handle_event(self, filepath, now):
+        """
+        Add the filepath to the pending files of the collection system(s)
+        watching it
+        """
+
+        for collection_system_transfer_id, source_dir in self.source_dirs.items():
+            if not filepath.startswith(source_dir + '/'):
+                continue
+
+            logging.debug("Changed file: %s", filepath)
+
+            if collection_system_transfer_id not in self.pending:
+                self.pending[collection_system_transfer_id] = set()
+                self.first_event_times[collection_system_transfer_id] = now
+
+            self.pending[collection_system_transfer_id].add(filepath[len(source_dir) + 1:])
+            self.last_event_times[collection_system_transfer_id] = now
+
+
+    def _check_outstanding(self):
+        """
+        Check on the submitted jobs, files from jobs that were skipped because
+        a transfer was already in-progress or that were lost with the
+        connection to the Gearman server are returned to the pending files.
+        """
+
+        if len(self.outstanding) == 0:
+            return
+
+        try:
+            self.gm_client.wait_until_jobs_completed([job_request for job_request, _ in self.outstanding.values()], poll_timeout=JOB_POLL_TIMEOUT)
+
+        except Exception as err:
+            logging.error("Lost connection to the Gearman server while waiting for transfer jobs")
+            logging.debug(str(err))
+
+        for collection_system_transfer_id, (job_request, changed_files) in list(self.outstanding.items()):
+            if not job_request.complete and job_request.state != JOB_UNKNOWN:
+                continue
+
+            del self.outstanding[collection_system_transfer_id]
+
+            try:
+                results_obj = json.loads(job_request.result)
+                skipped = results_obj['parts'][0]['partName'] == "Transfer In-Progress" and results_obj['parts'][0]['result'] == "Fail"
+            except (TypeError, ValueError, KeyError, IndexError):
+                # the job was lost with the connection to the Gearman server
+                skipped = job_request.state == JOB_UNKNOWN
+
+            if skipped:
+                logging.debug("Transfer was not run, re-queuing %s file(s)", len(changed_files))
+
+                if collection_system_transfer_id not in self.pending:
+                    self.pending[collection_system_transfer_id] = set()
+                    self.first_event_times[collection_system_transfer_id] = time.monotonic()
+                    self.last_event_times[collection_system_transfer_id] = time.monotonic()
+
+                self.pending[collection_system_transfer_id].update(changed_files)
+
+
+    def _submit_ready(self, now):
+        """
+        Submit a transfer for every collection system whose pending files have
+        settled
+        """
+
+        for collection_system_transfer_id in list(self.pending.keys()):
+            if collection_system_transfer_id in self.outstanding:
+                continue
+
+            if collection_system_transfer_id not in self.source_dirs:
+                del self.pending[collection_system_transfer_id]
+                continue
+
+            if now - self.last_event_times[collection_system_transfer_id] < self.debounce and now - self.first_event_times[collection_system_transfer_id] < self.max_delay:
+                continue
+
+            changed_files = sorted(self.pending.pop(collection_system_transfer_id))
+
+            logging.info("Submitting collection system transfer job for %s changed file(s) in: %s", len(changed_files), self.source_dirs[collection_system_transfer_id])
+
+            gm_data = {
+                'collectionSystemTransfer': {
+                    'collectionSystemTransferID': collection_system_transfer_id
+                },
+                'changedFiles': changed_files
+            }
+
+            job_request = self.gm_client.submit_job("runCollectionSystemTransfer", json.dumps(gm_data), background=False, wait_until_complete=False)
+            self.outstanding[collection_system_transfer_id] = (job_request, changed_files)
+
+
+    def run(self, refresh_interval):
+        """
+        Watch the source directories forever
+        """
+
+        next_refresh = 0
+
+        while True:
+
+            if time.monotonic() >= next_refresh:
+                try:
+                    self.refresh()
+                except Exception as err:
+                    logging.error("Unable to refresh the watched directories")
+                    logging.debug(str(err))
+
+                next_refresh = time.monotonic() + refresh_interval
+
+            try:
+                filepath = self.events.get(timeout=1)
+
+                while filepath is not None:
+                    self._handle_event(filepath, time.monotonic())
+                    filepath = self.events.get_nowait()
+
+                logging.warning("inotifywait exited, restarting with the next refresh")
+
+            except queue.Empty:
+                pass
+
+            self._check_outstanding()
+            self._submit_ready(time.monotonic())
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='OpenVDM Local Directory Watcher')
+    parser.add_argument('--debounce', default=5, metavar='debounce', type=int, help='seconds without new events before submitting a transfer')
+    parser.add_argument('--max-delay', default=30, metavar='max_delay', type=int, help='maximum seconds changed files are held back')
+    parser.add_argument('--refresh', default=60, metavar='refresh', type=int, help='seconds between configuration checks')
+    parser.add_argument('-v', '--verbosity', dest='verbosity',
+                        default=0, action='count',
+                        help='Increase output verbosity')
+
+    parsed_args = parser.parse_args()
+
+    ############################
+    # Set up logging before we do any other argument parsing (so that we
+    # can log problems with argument parsing).
+
+    LOGGING_FORMAT = '%(asctime)-15s %(levelname)s - %(message)s'
+    logging.basicConfig(format=LOGGING_FORMAT)
+
+    LOG_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+    parsed_args.verbosity = min(parsed_args.verbosity, max(LOG_LEVELS))
+    logging.getLogger().setLevel(LOG_LEVELS[parsed_args.verbosity])
+
+    logging.debug("Creating Geaman Client...")
+    directory_watcher = DirectoryWatcher(OpenVDM(), parsed_args.debounce, parsed_args.max_delay)
+
+    directory_watcher.run(parsed_args.refresh)
@@ -234,6 +234,9 @@ def task_setup_new_lowering(gearman_worker, gearman_job):
 
     lowering_config_filepath = os.path.join(gearman_worker.lowering_dir, DEFAULT_LOWERING_CONFIG_FN)
 
+    # cached configuration may belong to the previous lowering
+    gearman_worker.ovdm.invalidate_cache()
+
     gearman_worker.send_job_status(gearman_job, 1, 10)
 
     gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
@@ -36,7 +36,6 @@ import argparse
 import os
 import sys
 import json
-import hashlib
 import signal
 import time
 import logging
@@ -45,6 +44,11 @@ import python3_gearman
 
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
+from server.lib.file_manifest import count_files, iter_files, MANIFEST_DIRNAME
+from server.lib.hash_cache import HashCache, HASH_CACHE_DIRNAME, build_hash_cache_filepath
+from server.lib.parallel_hash import get_hashing_threads, hash_file, hash_files
+from server.lib.progress import ProgressReporter
+from server.lib.scan_index import SCAN_INDEX_DIRNAME
 from server.lib.set_owner_group_permissions import set_owner_group_permissions
 from server.lib.openvdm import OpenVDM, DEFAULT_MD5_SUMMARY_FN, DEFAULT_MD5_SUMMARY_MD5_FN
 
@@ -57,18 +61,27 @@ CUSTOM_TASKS = [
     }
 ]
 
-BUF_SIZE = 65536  # read files in 64kb chunks
+MD5_SUMMARY_PHASES = [('listing', 20), ('hashing', 60), ('summary', 20)]
 
+# internal state kept under the transfer log directory, it changes with every
+# run and is not part of the summary
+INTERNAL_DIRNAMES = [HASH_CACHE_DIRNAME, SCAN_INDEX_DIRNAME, MANIFEST_DIRNAME]
 
-def build_filelist(source_dir):
+
+def build_filelist(source_dir, logfile_dirpath=None):
     """
-    Build the filelist
+    Build the filelist.  The internal directories of the transfer log
+    directory (logfile_dirpath) are skipped.
     """
 
     logging.debug("sourceDir: %s", source_dir)
 
+    internal_dirpaths = [os.path.normpath(os.path.join(logfile_dirpath, dirname)) for dirname in INTERNAL_DIRNAMES] if logfile_dirpath else []
+
     return_files = []
-    for root, _, filenames in os.walk(source_dir):
+    for root, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = [dirname for dirname in dirnames if os.path.normpath(os.path.join(root, dirname)) not in internal_dirpaths]
+
         for filename in filenames:
             if filename not in (DEFAULT_MD5_SUMMARY_FN, DEFAULT_MD5_SUMMARY_MD5_FN):
                 return_files.append(os.path.join(root, filename))
@@ -77,62 +90,164 @@ def build_filelist(source_dir):
     return return_files
 
 
-def hash_file(filepath):
+def build_logfile_dirpath(gearman_worker):
     """
-    Build the md5 hash for the given file
+    Build the path to the transfer log directory
     """
-    try:
-        md5 = hashlib.md5()
-        with open(filepath, 'rb') as file:
-            while True:
-                data = file.read(BUF_SIZE)
-                if not data:
-                    break
-                md5.update(data)
-        return md5.hexdigest()
-    except Exception as err:
-        raise err
-
-def build_md5_hashes(gearman_worker, gearman_job, filelist):
+
+    return os.path.join(gearman_worker.cruise_dir, gearman_worker.ovdm.get_required_extra_directory_by_name('Transfer_Logs')['destDir'])
+
+
+def build_md5_hashes(gearman_worker, progress, filelist, hash_cache=None, verify=False): # pylint: disable=too-many-locals,too-many-branches
     """
-    Build the md5 hashes for the files in the filelist
+    Build the md5 hashes for the files in the filelist.  The hashes of
+    unchanged files are taken from the hash cache unless verify is set, then
+    every file is hashed and cached hashes that no longer match are reported.
     """
 
     filesize_limit = gearman_worker.ovdm.get_md5_filesize_limit()
     filesize_limit_status = gearman_worker.ovdm.get_md5_filesize_limit_status()
 
     hashes = []
+    cached_hashes = {}
+    hash_files_info = []
 
-    for idx, filename in enumerate(filelist):
-
-        if gearman_worker.stop:
-            logging.debug("Stopping job")
-            break
+    for filename in filelist:
 
         filepath = os.path.join(gearman_worker.cruise_dir, filename)
 
-        if filesize_limit_status == 'On' and filesize_limit != '0':
-            if os.stat(filepath).st_size < int(filesize_limit) * 1000000:
-                try:
-                    hashes.append({'hash': hash_file(filepath), 'filename': filename})
-                except Exception as err:
-                    logging.error("Could not generate md5 hash for file: %s", filename)
-                    logging.debug(str(err))
+        try:
+            file_stat = os.stat(filepath)
+        except OSError as err:
+            logging.error("Could not generate md5 hash for file: %s", filename)
+            logging.debug(str(err))
+            continue
 
-            else:
-                hashes.append({'hash': '********************************', 'filename': filename})
-        else:
-            try:
-                hashes.append({'hash': hash_file(filepath), 'filename': filename})
-            except Exception as err:
-                logging.error("Could not generate md5 hash for file: %s", filename)
-                logging.error(str(err))
+        if filesize_limit_status == 'On' and filesize_limit != '0' and file_stat.st_size >= int(filesize_limit) * 1000000:
+            hashes.append({'hash': '********************************', 'filename': filename})
+            continue
+
+        cached_hash = hash_cache.lookup(filename, file_stat) if hash_cache is not None else None
+
+        if cached_hash is not None and not verify:
+            hashes.append({'hash': cached_hash, 'filename': filename})
+            continue
 
-        gearman_worker.send_job_status(gearman_job, int(20 + 60*float(idx)/float(len(filelist))), 100)
+        cached_hashes[filename] = cached_hash
+        hash_files_info.append((filename, filepath, file_stat))
+
+    threads = get_hashing_threads(gearman_worker.cruise_dir, gearman_worker.ovdm.get_md5_hashing_threads())
+    logging.debug("Hashing %s files using %s threads, %s hashes re-used", len(hash_files_info), threads, len(filelist) - len(hash_files_info))
+
+    file_hashes = hash_files([filepath for _, filepath, _ in hash_files_info], [file_stat.st_size for _, _, file_stat in hash_files_info], threads, should_stop=lambda: gearman_worker.stop, progress_callback=progress.update)
+
+    if gearman_worker.stop:
+        logging.debug("Stopping job")
+
+    cache_entries = []
+    mismatched = []
+
+    for filename, filepath, file_stat in hash_files_info:
+        if filepath in file_hashes:
+            hashes.append({'hash': file_hashes[filepath], 'filename': filename})
+            cache_entries.append((filename, file_stat, file_hashes[filepath]))
+
+            if cached_hashes[filename] is not None and cached_hashes[filename] != file_hashes[filepath]:
+                mismatched.append(filename)
+
+    if hash_cache is not None:
+        hash_cache.store(cache_entries)
+        logging.debug("Hash cache stats: %s", json.dumps(hash_cache.stats))
+
+    if len(mismatched) > 0:
+        logging.warning("%s file(s) no longer match their cached md5 hash: %s", len(mismatched), ', '.join(mismatched))
+        gearman_worker.ovdm.send_msg('MD5 Summary verification', '{} file(s) changed without a change to their size or modification time: {}'.format(len(mismatched), ', '.join(mismatched[:10])))
 
     return hashes
 
 
+def parse_md5_summary_line(line):
+    """
+    Return the (hash, filename) of an MD5 summary line or None for blank lines
+    """
+
+    line = line.rstrip('\n')
+
+    if line == '':
+        return None
+
+    (md5_hash, filename) = line.split(' ', 1)
+    return (md5_hash, filename)
+
+
+def merge_md5_summary(md5_summary_file, new_hashes, output_file):
+    """
+    Merge the new hashes into the existing MD5 summary (sorted by filename)
+    and write the result to output_file.  The existing summary is streamed
+    so only the new hashes are held in memory.  If the existing summary turns
+    out not to be sorted it is merged in memory instead.  Returns the number
+    of rows added and updated.
+    """
+
+    # the last hash wins if a file is listed more than once
+    new_rows = sorted({new_hash['filename']: new_hash['hash'] for new_hash in new_hashes}.items())
+
+    row_added = 0
+    row_updated = 0
+    idx = 0
+    previous_filename = None
+
+    try:
+        for line in md5_summary_file:
+            row = parse_md5_summary_line(line)
+            if row is None:
+                continue
+
+            (md5_hash, filename) = row
+
+            if previous_filename is not None and filename < previous_filename:
+                raise ValueError("MD5 summary is not sorted at: {}".format(filename))
+
+            previous_filename = filename
+
+            while idx < len(new_rows) and new_rows[idx][0] < filename:
+                output_file.write(new_rows[idx][1] + ' ' + new_rows[idx][0] + '\n')
+                row_added += 1
+                idx += 1
+
+            if idx < len(new_rows) and new_rows[idx][0] == filename:
+                output_file.write(new_rows[idx][1] + ' ' + filename + '\n')
+                row_updated += 1
+                idx += 1
+            else:
+                output_file.write(md5_hash + ' ' + filename + '\n')
+
+    except ValueError as err:
+        logging.warning("Unable to stream MD5 summary, merging in memory")
+        logging.debug(str(err))
+
+        md5_summary_file.seek(0)
+        output_file.seek(0)
+        output_file.truncate()
+
+        existing_rows = {row[1]: row[0] for row in map(parse_md5_summary_line, md5_summary_file) if row is not None}
+
+        row_updated = sum(1 for filename, _ in new_rows if filename in existing_rows)
+        row_added = len(new_rows) - row_updated
+        existing_rows.update(new_rows)
+
+        for filename, md5_hash in sorted(existing_rows.items()):
+            output_file.write(md5_hash + ' ' + filename + '\n')
+
+        return (row_added, row_updated)
+
+    for filename, md5_hash in new_rows[idx:]:
+        output_file.write(md5_hash + ' ' + filename + '\n')
+        row_added += 1
+
+    return (row_added, row_updated)
+
+
 def build_md5_summary_md5(gearman_worker):
     """
     Build the md5 hash for the md5 summary file
@@ -157,8 +272,10 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker): # pylint: disable=too-ma
     Class for the current Gearman worker
     """
 
-    def __init__(self):
+    def __init__(self, verify=False):
         self.stop = False
+        self.retire = False
+        self.verify = verify
         self.ovdm = OpenVDM()
         self.task = None
         self.cruise_id = self.ovdm.get_cruise_id()
@@ -269,6 +386,26 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker): # pylint: disable=too-ma
         self.shutdown()
 
 
+    def retire_worker(self):
+        """
+        Function to quit the worker once the current job is complete
+        """
+        self.retire = True
+        logging.warning("Retiring worker...")
+
+
+    def after_poll(self, any_activity): # pylint: disable=unused-argument
+        """
+        Function run after each poll of the Gearman server, returning False
+        stops the worker
+        """
+        if self.retire:
+            logging.warning("Worker retired")
+            return False
+
+        return True
+
+
 def task_update_md5_summary(gearman_worker, gearman_job): # pylint: disable=too-many-branches,too-many-statements,too-many-locals
     """
     Update the existing MD5 summary files
@@ -279,94 +416,75 @@ def task_update_md5_summary(gearman_worker, gearman_job): # pylint: disable=too-
     payload_obj = json.loads(gearman_job.data)
     logging.debug("Payload: %s", json.dumps(payload_obj, indent=2))
 
-    gearman_worker.send_job_status(gearman_job, 1, 10)
+    progress = ProgressReporter(gearman_worker, gearman_job, MD5_SUMMARY_PHASES)
+    progress.start_phase('listing')
 
     logging.debug("Building filelist")
     filelist = []
 
     job_results['parts'].append({"partName": "Retrieve Filelist", "result": "Pass"})
 
-    if payload_obj['files']['new'] or payload_obj['files']['updated']:
-        filelist.extend(payload_obj['files']['new'])
-        filelist.extend(payload_obj['files']['updated'])
+    if count_files(payload_obj['files'], 'new') or count_files(payload_obj['files'], 'updated'):
+        filelist.extend(iter_files(payload_obj['files'], 'new'))
+        filelist.extend(iter_files(payload_obj['files'], 'updated'))
     else:
         return json.dumps(job_results)
 
     #filelist = [os.path.join(gearman_worker.cruiseID, filename) for filename in filelist]
     logging.debug('Filelist: %s', json.dumps(filelist, indent=2))
 
-    gearman_worker.send_job_status(gearman_job, 2, 10)
+    progress.start_phase('hashing')
 
     logging.debug("Building hashes")
-    new_hashes = build_md5_hashes(gearman_worker, gearman_job, filelist)
+    hash_cache = HashCache(build_hash_cache_filepath(build_logfile_dirpath(gearman_worker)))
+    new_hashes = build_md5_hashes(gearman_worker, progress, filelist, hash_cache, gearman_worker.verify or payload_obj.get('verify', False))
+    hash_cache.close()
     logging.debug('Hashes: %s', json.dumps(new_hashes, indent=2))
 
-    gearman_worker.send_job_status(gearman_job, 8, 10)
+    progress.start_phase('summary')
 
     if gearman_worker.stop:
         return json.dumps(job_results)
 
     job_results['parts'].append({"partName": "Calculate Hashes", "result": "Pass"})
 
-    existing_hashes = []
-
     logging.debug("Processing existing MD5 summary file")
 
     try:
-        with open(gearman_worker.md5_summary_filepath, 'r') as md5_summary_file:
-
-            for line in md5_summary_file:
-                (md5_hash, filename) = line.split(' ', 1)
-                existing_hashes.append({'hash': md5_hash, 'filename': filename.rstrip('\n')})
+        md5_summary_file = open(gearman_worker.md5_summary_filepath, 'r')
 
     except IOError:
         logging.error("Error Reading pre-existing MD5 Summary file: %s", gearman_worker.md5_summary_filepath)
         job_results['parts'].append({"partName": "Reading pre-existing MD5 Summary file", "result": "Fail", "reason": "Error Reading pre-existing MD5 Summary file: " + gearman_worker.md5_summary_filepath})
         return json.dumps(job_results)
 
-    #logging.debug('Existing Hashes:', json.dumps(existing_hashes, indent=2))
     job_results['parts'].append({"partName": "Reading pre-existing MD5 Summary file", "result": "Pass"})
 
-    row_added = 0
-    row_updated = 0
-
-    for new_hash in new_hashes:
-        updated = False
-        for existing_hash in existing_hashes:
-            if new_hash['filename'] == existing_hash['filename']:
-                existing_hash['hash'] = new_hash['hash']
-                updated = True
-                row_updated += 1
-                break
-
-        if not updated:
-            existing_hashes.append({'hash': new_hash['hash'], 'filename': new_hash['filename']})
-            row_added += 1
-
-    if row_added > 0:
-        logging.debug("%s row(s) added", row_added)
-    if row_updated > 0:
-        logging.debug("%s row(s) updated", row_updated)
-
-    gearman_worker.send_job_status(gearman_job, 85, 100)
-
-    #logging.debug("Sorting hashes")
-    sorted_hashes = sorted(existing_hashes, key=lambda hashes: hashes['filename'])
-
     logging.debug("Building MD5 Summary file")
+    tmp_filepath = gearman_worker.md5_summary_filepath + '.tmp'
+
     try:
-        with open(gearman_worker.md5_summary_filepath, 'w') as md5_summary_file:
+        with md5_summary_file, open(tmp_filepath, 'w') as tmp_file:
+            row_added, row_updated = merge_md5_summary(md5_summary_file, new_hashes, tmp_file)
 
-            for filehash in sorted_hashes:
-                md5_summary_file.write(filehash['hash'] + ' ' + filehash['filename'] + '\n')
+        os.replace(tmp_filepath, gearman_worker.md5_summary_filepath)
 
         job_results['parts'].append({"partName": "Writing MD5 Summary file", "result": "Pass"})
 
     except IOError:
         logging.error("Error updating MD5 Summary file: %s", gearman_worker.md5_summary_filepath)
         job_results['parts'].append({"partName": "Writing MD5 Summary file", "result": "Fail", "reason": "Error updating MD5 Summary file: " + gearman_worker.md5_summary_filepath})
+
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+
         return json.dumps(job_results)
 
+    if row_added > 0:
+        logging.debug("%s row(s) added", row_added)
+    if row_updated > 0:
+        logging.debug("%s row(s) updated", row_updated)
+
     output_results = set_owner_group_permissions(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseUsername'], gearman_worker.md5_summary_filepath)
 
     if output_results['verdict']:
@@ -375,8 +493,6 @@ def task_update_md5_summary(gearman_worker, gearman_job): # pylint: disable=too-
         logging.error("Failed to set directory ownership")
         job_results['parts'].append({"partName": "Set MD5 Summary file ownership/permissions", "result": "Fail", "reason": output_results['reason']})
 
-    gearman_worker.send_job_status(gearman_job, 9, 10)
-
     logging.debug("Building MD5 Summary MD5 file")
 
     output_results = build_md5_summary_md5(gearman_worker)
@@ -394,7 +510,7 @@ def task_update_md5_summary(gearman_worker, gearman_job): # pylint: disable=too-
         logging.error("Failed to set directory ownership")
         job_results['parts'].append({"partName": "Set MD5 Summary MD5 file ownership/permissions", "result": "Fail", "reason": output_results['reason']})
 
-    gearman_worker.send_job_status(gearman_job, 10, 10)
+    progress.complete()
     return json.dumps(job_results)
 
 
@@ -408,7 +524,8 @@ def task_rebuild_md5_summary(gearman_worker, gearman_job): # pylint: disable=too
     payload_obj = json.loads(gearman_job.data)
     logging.debug("Payload: %s", json.dumps(payload_obj, indent=2))
 
-    gearman_worker.send_job_status(gearman_job, 1, 10)
+    progress = ProgressReporter(gearman_worker, gearman_job, MD5_SUMMARY_PHASES)
+    progress.start_phase('listing')
 
     if os.path.exists(gearman_worker.cruise_dir):
         job_results['parts'].append({"partName": "Verify Cruise Directory exists", "result": "Pass"})
@@ -418,30 +535,35 @@ def task_rebuild_md5_summary(gearman_worker, gearman_job): # pylint: disable=too
         return json.dumps(job_results)
 
     logging.info("Building filelist")
-    filelist = build_filelist(gearman_worker.cruise_dir)
+    filelist = build_filelist(gearman_worker.cruise_dir, build_logfile_dirpath(gearman_worker))
     logging.debug('Filelist: %s', json.dumps(filelist, indent=2))
 
     job_results['parts'].append({"partName": "Retrieve Filelist", "result": "Pass"})
 
-    gearman_worker.send_job_status(gearman_job, 2, 10)
+    progress.start_phase('hashing')
 
     logging.info("Building hashes")
-    new_hashes = build_md5_hashes(gearman_worker, gearman_job, filelist)
+    hash_cache = HashCache(build_hash_cache_filepath(build_logfile_dirpath(gearman_worker)))
+    new_hashes = build_md5_hashes(gearman_worker, progress, filelist, hash_cache, gearman_worker.verify or payload_obj.get('verify', False))
     logging.debug("Hashes: %s", json.dumps(new_hashes, indent=2))
 
+    # drop the cached hashes of files that have been removed
+    if not gearman_worker.stop:
+        hash_cache.retain(filelist)
+
+    hash_cache.close()
+
     if gearman_worker.stop:
         job_results['parts'].append({"partName": "Calculate Hashes", "result": "Fail", "reason": "Job was stopped by user"})
         return json.dumps(job_results)
 
     job_results['parts'].append({"partName": "Calculate Hashes", "result": "Pass"})
 
-    gearman_worker.send_job_status(gearman_job, 85, 100)
+    progress.start_phase('summary')
 
     logging.debug("Sorting Hashes")
     sorted_hashes = sorted(new_hashes, key=lambda hashes: hashes['filename'])
 
-    gearman_worker.send_job_status(gearman_job, 9, 10)
-
     logging.info("Building MD5 Summary file")
     try:
         #logging.debug("Saving new MD5 Summary file")
@@ -465,8 +587,6 @@ def task_rebuild_md5_summary(gearman_worker, gearman_job): # pylint: disable=too
         logging.error("Failed to set directory ownership")
         job_results['parts'].append({"partName": "Set MD5 Summary file ownership/permissions", "result": "Fail", "reason": output_results['reason']})
 
-    gearman_worker.send_job_status(gearman_job, 95, 100)
-
     logging.info("Building MD5 Summary MD5 file")
 
     output_results = build_md5_summary_md5(gearman_worker)
@@ -485,7 +605,7 @@ def task_rebuild_md5_summary(gearman_worker, gearman_job): # pylint: disable=too
         job_results['parts'].append({"partName": "Set MD5 Summary MD5 file ownership/permissions", "result": "Fail", "reason": output_results['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(gearman_job, 10, 10)
+    progress.complete()
     return json.dumps(job_results)
 
 
@@ -494,6 +614,7 @@ def task_rebuild_md5_summary(gearman_worker, gearman_job): # pylint: disable=too
 # -------------------------------------------------------------------------------------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Handle MD5 Summary related tasks')
+    parser.add_argument('--verify', action='store_true', help='Hash every file instead of re-using cached hashes and report files whose cached hash no longer matches')
     parser.add_argument('-v', '--verbosity', dest='verbosity',
                         default=0, action='count',
                         help='Increase output verbosity')
@@ -513,7 +634,7 @@ if __name__ == "__main__":
 
     logging.debug("Creating Worker...")
 
-    new_worker = OVDMGearmanWorker()
+    new_worker = OVDMGearmanWorker(verify=parsed_args.verify)
     new_worker.set_client_id(__file__)
 
     logging.debug("Defining Signal Handlers...")
@@ -531,8 +652,16 @@ if __name__ == "__main__":
         logging.warning("INT Signal Received")
         new_worker.quit_worker()
 
+    def sigusr1_handler(_signo, _stack_frame):
+        """
+        Signal Handler for USR1
+        """
+        logging.warning("USR1 Signal Received")
+        new_worker.retire_worker()
+
     signal.signal(signal.SIGQUIT, sigquit_handler)
     signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGUSR1, sigusr1_handler)
 
     logging.info("Registering worker tasks...")
 
@@ -67,27 +67,28 @@ if __name__ == "__main__":
 
     time.sleep(5)
 
-    logging.info("Setting all tasks to idle.")
-    tasks = openVDM.get_tasks()
-    for task in tasks:
-        openVDM.set_idle_task(task['taskID'])
-
-    logging.info("Setting all Collection System Transfers to idle.")
-    collection_system_transfers = openVDM.get_collection_system_transfers()
-    for collection_system_transfer in collection_system_transfers:
-        if not collection_system_transfer['status'] == '3':
-            openVDM.set_idle_collection_system_transfer(collection_system_transfer['collectionSystemTransferID'])
-
-    logging.info("Setting all Cruise Data Transfers to idle.")
-    cruise_data_transfers = openVDM.get_cruise_data_transfers()
-    for cruise_data_transfer in cruise_data_transfers:
-        if not cruise_data_transfer['status'] == '3':
-            openVDM.set_idle_cruise_data_transfer(cruise_data_transfer['cruiseDataTransferID'])
-
-    required_cruise_data_transfers = openVDM.get_required_cruise_data_transfers()
-    for required_cruise_data_transfer in required_cruise_data_transfers:
-        if not required_cruise_data_transfer['status'] == '3':
-            openVDM.set_idle_cruise_data_transfer(required_cruise_data_transfer['cruiseDataTransferID'])
+    with openVDM.batch():
+        logging.info("Setting all tasks to idle.")
+        tasks = openVDM.get_tasks()
+        for task in tasks:
+            openVDM.set_idle_task(task['taskID'])
+
+        logging.info("Setting all Collection System Transfers to idle.")
+        collection_system_transfers = openVDM.get_collection_system_transfers()
+        for collection_system_transfer in collection_system_transfers:
+            if not collection_system_transfer['status'] == '3':
+                openVDM.set_idle_collection_system_transfer(collection_system_transfer['collectionSystemTransferID'])
+
+        logging.info("Setting all Cruise Data Transfers to idle.")
+        cruise_data_transfers = openVDM.get_cruise_data_transfers()
+        for cruise_data_transfer in cruise_data_transfers:
+            if not cruise_data_transfer['status'] == '3':
+                openVDM.set_idle_cruise_data_transfer(cruise_data_transfer['cruiseDataTransferID'])
+
+        required_cruise_data_transfers = openVDM.get_required_cruise_data_transfers()
+        for required_cruise_data_transfer in required_cruise_data_transfers:
+            if not required_cruise_data_transfer['status'] == '3':
+                openVDM.set_idle_cruise_data_transfer(required_cruise_data_transfer['cruiseDataTransferID'])
 
     logging.info("Clearing all jobs from Gearman.")
     openVDM.clear_gearman_jobs_from_db()
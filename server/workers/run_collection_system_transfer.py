@@ -34,8 +34,6 @@ along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>
 
 import argparse
 import calendar
-import datetime
-import fnmatch
 import json
 import logging
 import os
@@ -51,15 +49,32 @@ import python3_gearman
 
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
-from server.lib.check_filenames import is_ascii
+from server.lib.connection_tests import ConnectionTestCache, build_test_fingerprint, build_test_key
+from server.lib.file_filters import compile_filters, EXCLUDE, IGNORE
+from server.lib.file_manifest import build_manifest_dirpath, spill_files
 from server.lib.output_json_data_to_file import output_json_data_to_file
+from server.lib.parallel_rsync import build_shard_filelists, build_bandwidth_limit_arg
+from server.lib.progress import ProgressReporter
+from server.lib.rsync_itemize import OUT_FORMAT_ARG, TransferStats, run_rsync_itemized
+from server.lib.rsync_listing import parse_rsync_listing
+from server.lib.scan_index import ScanIndex, build_scan_index_filepath
 from server.lib.set_owner_group_permissions import set_owner_group_permissions
+from server.lib.smb_mounts import SMBMountManager, build_active_smb_shares
+from server.lib.ssh_control import SSHControlManager
+from server.lib.staleness import find_stale_files, local_file_sizes, remote_file_sizes
 from server.lib.openvdm import OpenVDM
 
+TRANSFER_PHASES = [('connection test', 10), ('listing', 10), ('transfer', 70), ('post-processing', 10)]
 
-def build_filelist(gearman_worker, source_dir): # pylint: disable=too-many-locals,too-many-branches,too-many-statements
+
+def build_filelist(gearman_worker, source_dir, changed_files=None): # pylint: disable=too-many-locals,too-many-branches,too-many-statements
     """
-    Build the list of files to include, exclude or ignore
+    Build the list of files to include, exclude or ignore.  If changed_files
+    (paths relative to source_dir) is provided only those files are evaluated
+    instead of scanning the entire source directory.  The changed files are
+    reported by the directory watcher once they have been closed after
+    writing or moved into place so they are not subject to the staleness
+    window.
     """
 
     return_files = {'include':[], 'exclude':[], 'new':[], 'updated':[], 'filesize':[]}
@@ -78,75 +93,46 @@ def build_filelist(gearman_worker, source_dir): # pylint: disable=too-many-local
 
     filters = build_filters(gearman_worker)
 
-    for root, _, filenames in os.walk(source_dir): # pylint: disable=too-many-nested-blocks
-        for filename in filenames:
-            filepath = os.path.join(root, filename)
-
-            if os.path.islink(filepath):
-                logging.debug("%s is a symlink, skipping", filepath)
-                continue
-
-            exclude = False
-            ignore = False
-            include = False
-            for ignore_filter in filters['ignoreFilter'].split(','):
-                #logging.debug(ignore_filter)
-                if fnmatch.fnmatch(filepath, ignore_filter):
-                    logging.debug("%s ignored by ignore filter", filepath)
-                    ignore = True
-                    break
-
-            if ignore:
-                continue
-
-            if not is_ascii(filepath):
-                logging.debug("%s is not an ascii-encoded unicode string", filepath)
-                return_files['exclude'].append(filepath)
-                exclude = True
-                continue
-
-            for include_filter in filters['includeFilter'].split(','):
-                if fnmatch.fnmatch(filepath, include_filter):
-                    for exclude_filter in filters['excludeFilter'].split(','):
-                        if fnmatch.fnmatch(filepath, exclude_filter):
-                            logging.debug("%s excluded by exclude filter", filepath)
-                            return_files['exclude'].append(filepath)
-                            exclude = True
-                            break
-
-                    if exclude:
-                        break
-
-                    file_mod_time = os.stat(filepath).st_mtime
-                    logging.debug("file_mod_time: %s", file_mod_time)
-
-                    if file_mod_time < data_start_time or file_mod_time > data_end_time:
-                        logging.debug("%s ignored for time reasons", filepath)
-                        ignore = True
-                        break
-
-                    logging.debug("%s is a valid file for transfer", filepath)
-                    include = True
-                    break
-
-            if include:
-                return_files['include'].append(filepath)
-                return_files['filesize'].append(os.stat(filepath).st_size)
-
-            elif not exclude:
-                logging.debug("%s excluded because file does not match any of the filters", filepath)
-                return_files['exclude'].append(filepath)
+    scan_index_signature = json.dumps([gearman_worker.collection_system_transfer['transferType'], build_source_dir(gearman_worker), filters], sort_keys=True)
+    scan_index = ScanIndex(build_scan_index_filepath(build_logfile_dirpath(gearman_worker), gearman_worker.collection_system_transfer['name']), scan_index_signature)
 
-    if not gearman_worker.collection_system_transfer['staleness'] == '0':
-        logging.debug("Checking for changing filesizes")
-        time.sleep(5)
-        for idx, filepath in enumerate(return_files['include']):
-            if not os.stat(filepath).st_size == return_files['filesize'][idx]:
-                logging.debug("file %s has changed size, removing from include list", filepath)
-                del return_files['include'][idx]
-                del return_files['filesize'][idx]
+    if changed_files is not None:
+        logging.debug("Evaluating %s changed file(s)", len(changed_files))
+        scan_results = scan_index.scan_files(source_dir, compile_filters(filters), changed_files)
+    else:
+        scan_results = scan_index.scan(source_dir, compile_filters(filters))
+
+    for filepath, verdict, size, mtime in scan_results:
+
+        if verdict == IGNORE:
+            logging.debug("%s ignored by ignore filter", filepath)
+            continue
+
+        if verdict == EXCLUDE:
+            logging.debug("%s excluded by filters", filepath)
+            return_files['exclude'].append(filepath)
+            continue
 
-    del return_files['filesize']
+        logging.debug("file_mod_time: %s", mtime)
+
+        if mtime < data_start_time or mtime > data_end_time:
+            logging.debug("%s ignored for time reasons", filepath)
+            continue
+
+        if changed_files is None and mtime > threshold_time:
+            logging.debug("%s ignored because it was modified within the staleness window", filepath)
+            continue
+
+        logging.debug("%s is a valid file for transfer", filepath)
+        return_files['include'].append(filepath)
+        return_files['filesize'].append(size)
+
+    output_results = scan_index.save()
+    if not output_results['verdict']:
+        logging.warning("Unable to save scan index: %s", output_results['reason'])
+
+    if changed_files is None and not gearman_worker.collection_system_transfer['staleness'] == '0':
+        remove_stale_files(gearman_worker, return_files, local_file_sizes)
 
     return_files['include'] = [filename.split(source_dir + '/',1).pop() for filename in return_files['include']]
     return_files['exclude'] = [filename.split(source_dir + '/',1).pop() for filename in return_files['exclude']]
@@ -154,6 +140,26 @@ def build_filelist(gearman_worker, source_dir): # pylint: disable=too-many-local
     return {'verdict': True, 'files': return_files}
 
 
+def remove_stale_files(gearman_worker, return_files, file_sizes_func):
+    """
+    Remove files that are still being written to from the include list.  Only
+    the included files are re-checked, file_sizes_func is used to retrieve
+    their current sizes.
+    """
+
+    logging.debug("Checking for changing filesizes")
+
+    settle_delay = gearman_worker.ovdm.get_collection_system_transfer_settings(gearman_worker.collection_system_transfer['name'])['stalenessSettleDelay']
+    stale_files = set(find_stale_files(dict(zip(return_files['include'], return_files['filesize'])), settle_delay, file_sizes_func))
+
+    if len(stale_files) == 0:
+        return
+
+    include_filesizes = [(filepath, size) for filepath, size in zip(return_files['include'], return_files['filesize']) if filepath not in stale_files]
+    return_files['include'] = [filepath for filepath, _ in include_filesizes]
+    return_files['filesize'] = [size for _, size in include_filesizes]
+
+
 def build_rsync_filelist(gearman_worker, source_dir): # pylint: disable=too-many-locals,too-many-branches,too-many-statements
     """
     Build the list of files to include, exclude or ignore, for an rsync server
@@ -164,7 +170,6 @@ def build_rsync_filelist(gearman_worker, source_dir): # pylint: disable=too-many
 
     staleness = int(gearman_worker.collection_system_transfer['staleness']) * 60
     threshold_time = time.time() - staleness # 5 minutes
-    epoch = datetime.datetime.strptime('1970/01/01 00:00:00', "%Y/%m/%d %H:%M:%S")
     data_start_time = calendar.timegm(time.strptime(gearman_worker.data_start_date, "%Y/%m/%d %H:%M"))
     data_end_time = calendar.timegm(time.strptime(gearman_worker.data_end_date, "%Y/%m/%d %H:%M"))
 
@@ -172,7 +177,7 @@ def build_rsync_filelist(gearman_worker, source_dir): # pylint: disable=too-many
     logging.debug("    Start: %s", data_start_time)
     logging.debug("      End: %s", data_end_time)
 
-    filters = build_filters(gearman_worker)
+    filters = compile_filters(build_filters(gearman_worker))
 
     # Create temp directory
     tmpdir = tempfile.mkdtemp()
@@ -191,7 +196,7 @@ def build_rsync_filelist(gearman_worker, source_dir): # pylint: disable=too-many
 
         return {'verdict': False, 'reason': 'Error Saving temporary rsync password file: ' + rsync_password_filepath}
 
-    command = ['rsync', '-r', '--password-file=' + rsync_password_filepath, '--no-motd', 'rsync://' + gearman_worker.collection_system_transfer['rsyncUser'] + '@' + gearman_worker.collection_system_transfer['rsyncServer'] + source_dir + '/']
+    command = ['rsync', '-r'] + filters.rsync_filter_args() + ['--password-file=' + rsync_password_filepath, '--no-motd', 'rsync://' + gearman_worker.collection_system_transfer['rsyncUser'] + '@' + gearman_worker.collection_system_transfer['rsyncServer'] + source_dir + '/']
 
     logging.debug("Command: %s", ' '.join(command))
 
@@ -199,78 +204,31 @@ def build_rsync_filelist(gearman_worker, source_dir): # pylint: disable=too-many
 
     logging.debug("proc.stdout: %s", proc.stdout)
 
-    for line in proc.stdout.splitlines(): # pylint: disable=too-many-nested-blocks
-        logging.debug('line: %s', line.rstrip('\n'))
-        file_or_dir, size, mdate, mtime, filepath = line.split(None, 4)
-        if file_or_dir.startswith('-'):
-            exclude = False
-            ignore = False
-            include = False
-            for ignore_filter in filters['ignoreFilter'].split(','):
-                #logging.debug("ignore_filter")
-                if fnmatch.fnmatch(filepath, ignore_filter):
-                    logging.debug("%s ignored because file matched ignore filter", filepath)
-                    ignore = True
-                    break
-
-            if ignore:
-                continue
-
-            if not is_ascii(filepath):
-                logging.debug("%s is not an ascii-encoded unicode string", filepath)
-                return_files['exclude'].append(filepath)
-                exclude = True
-                continue
-
-            for include_filter in filters['includeFilter'].split(','):
-                if fnmatch.fnmatch(filepath, include_filter):
-                    for exclude_filter in filters['excludeFilter'].split(','):
-                        if fnmatch.fnmatch(filepath, exclude_filter):
-                            logging.debug("%s excluded because file matches exclude filter", filepath)
-                            return_files['exclude'].append(filepath)
-                            exclude = True
-                            break
-
-                    if exclude:
-                        break
-
-                    file_mod_time = datetime.datetime.strptime(mdate + ' ' + mtime, "%Y/%m/%d %H:%M:%S")
-                    file_mod_time_seconds = (file_mod_time - epoch).total_seconds()
-                    logging.debug("file_mod_time_seconds: %s", file_mod_time_seconds)
-                    if file_mod_time_seconds > data_start_time and file_mod_time_seconds < threshold_time and file_mod_time_seconds < data_end_time:  # pylint: disable=chained-comparison
-                        logging.debug("%s is a valid file for transfer", filepath)
-                        include = True
-                    else:
-                        logging.debug("%s ignored for time reasons", filepath)
-
-            if include:
-                return_files['include'].append(filepath)
-                return_files['filesize'].append(size)
-
-            elif not exclude:
-                logging.debug("%s excluded because file does not match any include or ignore filters", filepath)
-                return_files['exclude'].append(filepath)
+    listing = parse_rsync_listing(proc.stdout)
+    in_time_window = listing.mtime_mask(data_start_time, min(threshold_time, data_end_time))
+
+    for idx in listing.file_indices():
+        filepath = listing.paths[idx]
+        verdict = filters.verdict(filepath)
+
+        if verdict == IGNORE:
+            logging.debug("%s ignored because file matched ignore filter", filepath)
+            continue
+
+        if verdict == EXCLUDE:
+            logging.debug("%s excluded by filters", filepath)
+            return_files['exclude'].append(filepath)
+            continue
+
+        if in_time_window[idx]:
+            logging.debug("%s is a valid file for transfer", filepath)
+            return_files['include'].append(filepath)
+            return_files['filesize'].append(int(listing.sizes[idx]))
+        else:
+            logging.debug("%s ignored for time reasons", filepath)
 
     if not gearman_worker.collection_system_transfer['staleness'] == '0':
-        logging.debug("Checking for changing filesizes")
-        time.sleep(5)
-        proc = subprocess.run(command, capture_output=True, text=True, check=False)
-
-        for line in proc.stdout.splitlines():
-            file_or_dir, size, mdate, mtime, filepath = line.split(None, 4)
-
-            try:
-                younger_file_idx = return_files['include'].index(filepath)
-                if return_files['filesize'][younger_file_idx] != size:
-                    logging.debug("file %s has changed size, removing from include list", filepath)
-                    del return_files['filesize'][younger_file_idx]
-                    del return_files['include'][younger_file_idx]
-            except ValueError:
-                pass
-            except Exception as err:
-                logging.error(str(err))
-
-    del return_files['filesize']
+        remove_stale_files(gearman_worker, return_files, lambda filepaths: remote_file_sizes(command, filepaths))
 
     # Cleanup
     shutil.rmtree(tmpdir)
@@ -293,7 +251,6 @@ def build_ssh_filelist(gearman_worker, source_dir): # pylint: disable=too-many-b
 
     staleness = int(gearman_worker.collection_system_transfer['staleness']) * 60
     threshold_time = time.time() - staleness # 5 minutes
-    epoch = datetime.datetime.strptime('1970/01/01 00:00:00', "%Y/%m/%d %H:%M:%S")
     data_start_time = calendar.timegm(time.strptime(gearman_worker.data_start_date, "%Y/%m/%d %H:%M"))
     data_end_time = calendar.timegm(time.strptime(gearman_worker.data_end_date, "%Y/%m/%d %H:%M"))
 
@@ -301,85 +258,43 @@ def build_ssh_filelist(gearman_worker, source_dir): # pylint: disable=too-many-b
     logging.debug("    Start: %s", data_start_time)
     logging.debug("      End: %s", data_end_time)
 
-    filters = build_filters(gearman_worker)
+    filters = compile_filters(build_filters(gearman_worker))
+
+    # only list the files that are not ignored
+    command = ['rsync', '-r'] + filters.rsync_filter_args() + ['-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']), gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir + '/']
+
+    if gearman_worker.collection_system_transfer['sshUseKey'] != '1':
+        command = ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass']] + command
 
-    command = ['rsync', '-r', '-e', 'ssh', gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir + '/'] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'rsync', '-r', '-e', 'ssh', gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir + '/']
     logging.debug("Command: %s", ' '.join(command))
 
     proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-    for line in proc.stdout.splitlines(): # pylint: disable=too-many-nested-blocks
-        logging.debug('line: %s', line.rstrip('\n'))
-        file_or_dir, size, mdate, mtime, filepath = line.split(None, 4)
-        if file_or_dir.startswith('-'):
-            exclude = False
-            ignore = False
-            include = False
-            for ignore_filter in filters['ignoreFilter'].split(','):
-                #logging.debug("filt")
-                if fnmatch.fnmatch(filepath, ignore_filter):
-                    logging.debug("%s ignored because file matched ignore filter", filepath)
-                    ignore = True
-                    break
-
-            if ignore:
-                continue
-
-            if not is_ascii(filepath):
-                logging.debug("%s is not an ascii-encoded unicode string", filepath)
-                return_files['exclude'].append(filepath)
-                exclude = True
-                continue
-
-            for include_filter in filters['includeFilter'].split(','):
-                if fnmatch.fnmatch(filepath, include_filter):
-                    for exclude_filter in filters['excludeFilter'].split(','):
-                        if fnmatch.fnmatch(filepath, exclude_filter):
-                            logging.debug("%s excluded because file matches exclude filter", filepath)
-                            return_files['exclude'].append(filepath)
-                            exclude = True
-                            break
-
-                    if exclude:
-                        break
-
-                    file_mod_time = datetime.datetime.strptime(mdate + ' ' + mtime, "%Y/%m/%d %H:%M:%S")
-                    file_mod_time_seconds = (file_mod_time - epoch).total_seconds()
-                    logging.debug("file_mod_time_seconds: %s", file_mod_time_seconds)
-                    if file_mod_time_seconds > data_start_time and file_mod_time_seconds < threshold_time and file_mod_time_seconds < data_end_time: # pylint: disable=chained-comparison
-                        logging.debug("%s is a valid file for transfer", filepath)
-                        include = True
-                    else:
-                        logging.debug("%s ignored for time reasons", filepath)
-
-            if include:
-                return_files['include'].append(filepath)
-                return_files['filesize'].append(size)
-
-            elif not exclude:
-                logging.debug("%s excluded because file does not match any include or ignore filters", filepath)
-                return_files['exclude'].append(filepath)
+    listing = parse_rsync_listing(proc.stdout)
+    in_time_window = listing.mtime_mask(data_start_time, min(threshold_time, data_end_time))
+
+    for idx in listing.file_indices():
+        filepath = listing.paths[idx]
+        verdict = filters.verdict(filepath)
+
+        if verdict == IGNORE:
+            logging.debug("%s ignored because file matched ignore filter", filepath)
+            continue
+
+        if verdict == EXCLUDE:
+            logging.debug("%s excluded by filters", filepath)
+            return_files['exclude'].append(filepath)
+            continue
+
+        if in_time_window[idx]:
+            logging.debug("%s is a valid file for transfer", filepath)
+            return_files['include'].append(filepath)
+            return_files['filesize'].append(int(listing.sizes[idx]))
+        else:
+            logging.debug("%s ignored for time reasons", filepath)
 
     if not gearman_worker.collection_system_transfer['staleness'] == '0':
-        logging.debug("Checking for changing filesizes")
-        time.sleep(5)
-        proc = subprocess.run(command, capture_output=True, text=True, check=False)
-
-        for line in proc.stdout.splitlines():
-            file_or_dir, size, mdate, mtime, filepath = line.split(None, 4)
-
-            try:
-                younger_file_idx = return_files['include'].index(filepath)
-                if return_files['filesize'][younger_file_idx] != size:
-                    logging.debug("file %s has changed size, removing from include list", filepath)
-                    del return_files['filesize'][younger_file_idx]
-                    del return_files['include'][younger_file_idx]
-            except ValueError:
-                pass
-            except Exception as err:
-                logging.error(str(err))
-
-    del return_files['filesize']
+        remove_stale_files(gearman_worker, return_files, lambda filepaths: remote_file_sizes(command, filepaths))
 
     return_files['include'] = [filename.split(source_dir + '/',1).pop() for filename in return_files['include']]
     return_files['exclude'] = [filename.split(source_dir + '/',1).pop() for filename in return_files['exclude']]
@@ -389,6 +304,15 @@ def build_ssh_filelist(gearman_worker, source_dir): # pylint: disable=too-many-b
     return {'verdict': True, 'files': return_files}
 
 
+def get_transfer_streams(gearman_worker, file_count):
+    """
+    Return the number of concurrent rsync streams to use for the transfer
+    """
+
+    transfer_streams = int(gearman_worker.ovdm.get_collection_system_transfer_settings(gearman_worker.collection_system_transfer['name'])['transferStreams'])
+    return max(1, min(transfer_streams, file_count))
+
+
 def build_filters(gearman_worker):
     """
     Replace wildcard string in filters
@@ -430,7 +354,7 @@ def build_logfile_dirpath(gearman_worker):
     return os.path.join(cruise_dir, gearman_worker.ovdm.get_required_extra_directory_by_name('Transfer_Logs')['destDir'])
 
 
-def transfer_local_source_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-statements
+def transfer_local_source_dir(gearman_worker, progress): # pylint: disable=too-many-locals,too-many-statements
     """
     Preform a collection system transfer from a local directory
     """
@@ -449,7 +373,8 @@ def transfer_local_source_dir(gearman_worker, gearman_job): # pylint: disable=to
     logging.debug("Destination Dir: %s", dest_dir)
 
     logging.debug("Build file list")
-    output_results = build_filelist(gearman_worker, source_dir)
+    progress.start_phase('listing')
+    output_results = build_filelist(gearman_worker, source_dir, gearman_worker.changed_files)
     if not output_results['verdict']:
         return { 'verdict': False, 'reason': "Error building filelist", 'files':[] }
     files = output_results['files']
@@ -459,66 +384,39 @@ def transfer_local_source_dir(gearman_worker, gearman_job): # pylint: disable=to
     file_index = 0
     file_count = len(files['include'])
 
+    filesizes = files.pop('filesize')
+    transfer_streams = get_transfer_streams(gearman_worker, file_count)
+
     # Create temp directory
     tmpdir = tempfile.mkdtemp()
-    rsync_filelist_filepath = os.path.join(tmpdir, 'rsyncFileList.txt')
-
-    logging.debug("Mod file list")
-    local_transfer_filelist = files['include']
-    local_transfer_filelist = [filename.replace(source_dir, '', 1) for filename in local_transfer_filelist]
 
-    logging.debug("Start")
     try:
-        with open(rsync_filelist_filepath, 'w') as rsync_filelist_file:
-            for file in local_transfer_filelist:
-                try:
-                    rsync_filelist_file.write(str(file) + '\n')
-                except Exception as err:
-                    logging.warning("File not ascii: %s", file)
-                    logging.debug(str(err))
+        rsync_filelist_filepaths = build_shard_filelists(tmpdir, files['include'], filesizes, transfer_streams)
 
     except IOError:
-        logging.error("Error Saving temporary rsync filelist file %s", rsync_filelist_filepath)
+        logging.error("Error Saving temporary rsync filelist file")
 
         # Cleanup
         shutil.rmtree(tmpdir)
-        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file: ' + rsync_filelist_filepath, 'files': []}
+        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file', 'files': []}
 
-    logging.debug("Done")
+    bandwidth_limit = build_bandwidth_limit_arg(gearman_worker.collection_system_transfer['bandwidthLimit'], len(rsync_filelist_filepaths))
 
-    bandwidth_limit = '--bwlimit=' + gearman_worker.collection_system_transfer['bandwidthLimit'] if gearman_worker.collection_system_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
+    commands = [['rsync', '-tr', OUT_FORMAT_ARG, bandwidth_limit, '--files-from=' + rsync_filelist_filepath, source_dir + '/', dest_dir] for rsync_filelist_filepath in rsync_filelist_filepaths]
 
-    command = ['rsync', '-tri', bandwidth_limit, '--files-from=' + rsync_filelist_filepath, source_dir + '/', dest_dir]
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-    logging.debug('Transfer Command: %s', ' '.join(command))
+    for event in run_rsync_itemized(commands, lambda: gearman_worker.stop, transfer_stats):
 
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
-    while True:
-
-        line = proc.stdout.readline().rstrip('\n')
-
-        if proc.poll() is not None:
-            break
-
-        if not line:
-            continue
-
-        logging.debug("Line: %s", line)
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     files['new'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/'), filename) for filename in files['new']]
     files['updated'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/'), filename) for filename in files['updated']]
@@ -526,10 +424,10 @@ def transfer_local_source_dir(gearman_worker, gearman_job): # pylint: disable=to
     # Cleanup
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
-def transfer_smb_source_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-statements
+def transfer_smb_source_dir(gearman_worker, progress): # pylint: disable=too-many-locals,too-many-statements
     """
     Preform a collection system transfer from a samba server
     """
@@ -540,38 +438,21 @@ def transfer_smb_source_dir(gearman_worker, gearman_job): # pylint: disable=too-
 
     # filters = build_filters(gearman_worker)
 
-    # Create temp directory
-    tmpdir = tempfile.mkdtemp()
+    # Mount SMB Share
+    logging.debug("Mounting SMB Share")
 
-    # Create mountpoint
-    mntpoint = os.path.join(tmpdir, 'mntpoint')
-    os.mkdir(mntpoint, 0o755)
+    mount_results = gearman_worker.smb_mounts.acquire(gearman_worker.collection_system_transfer['smbServer'], gearman_worker.collection_system_transfer['smbDomain'], gearman_worker.collection_system_transfer['smbUser'], gearman_worker.collection_system_transfer['smbPass'], 'ro', active_shares=build_active_smb_shares(gearman_worker.ovdm))
+    if not mount_results['verdict']:
+        return { 'verdict': False, 'reason': mount_results['reason'], 'files':[] }
+    mntpoint = mount_results['mntpoint']
 
     dest_dir = os.path.join(cruise_dir, gearman_worker.shipboard_data_warehouse_config['loweringDataBaseDir'], gearman_worker.lowering_id, build_dest_dir(gearman_worker)) if gearman_worker.collection_system_transfer['cruiseOrLowering'] == "1" else  os.path.join(cruise_dir, build_dest_dir(gearman_worker))
     source_dir = os.path.join(mntpoint, build_source_dir(gearman_worker)).rstrip('/')
     logging.debug("Source Dir: %s", source_dir)
     logging.debug("Destination Dir: %s", dest_dir)
 
-    # Mount SMB Share
-    logging.debug("Mounting SMB Share")
-
-    ver_test_command = ['smbclient', '-L', gearman_worker.collection_system_transfer['smbServer'], '-W', gearman_worker.collection_system_transfer['smbDomain'], '-m', 'SMB2', '-g', '-N'] if gearman_worker.collection_system_transfer['smbUser'] == 'guest' else ['smbclient', '-L', gearman_worker.collection_system_transfer['smbServer'], '-W', gearman_worker.collection_system_transfer['smbDomain'], '-m', 'SMB2', '-g', '-U', gearman_worker.collection_system_transfer['smbUser'] + '%' + gearman_worker.collection_system_transfer['smbPass']]
-    logging.debug("SMB version test command: %s", ' '.join(ver_test_command))
-
-    vers="2.1"
-    proc = subprocess.run(ver_test_command, capture_output=True, text=True, check=False)
-
-    for line in proc.stdout.splitlines():
-        if line.startswith('OS=[Windows 5.1]'):
-            vers="1.0"
-            break
-
-    mount_command = ['sudo', 'mount', '-t', 'cifs', gearman_worker.collection_system_transfer['smbServer'], mntpoint, '-o', 'ro' + ',guest' + ',domain=' + gearman_worker.collection_system_transfer['smbDomain'] + ',vers=' + vers] if gearman_worker.collection_system_transfer['smbUser'] == 'guest' else ['sudo', 'mount', '-t', 'cifs', gearman_worker.collection_system_transfer['smbServer'], mntpoint, '-o', 'ro' + ',username=' + gearman_worker.collection_system_transfer['smbUser'] + ',password=' + gearman_worker.collection_system_transfer['smbPass'] + ',domain=' + gearman_worker.collection_system_transfer['smbDomain'] + ',vers=' + vers]
-    logging.debug("Mount command: %s", ' '.join(mount_command))
-
-    proc = subprocess.call(mount_command)
-
     logging.debug("Build file list")
+    progress.start_phase('listing')
     output_results = build_filelist(gearman_worker, source_dir)
     if not output_results['verdict']:
         return { 'verdict': False, 'reason': "Error building filelist", 'files':[] }
@@ -582,72 +463,50 @@ def transfer_smb_source_dir(gearman_worker, gearman_job): # pylint: disable=too-
     file_index = 0
     file_count = len(files['include'])
 
-    rsync_filelist_filepath = os.path.join(tmpdir, 'rsyncFileList.txt')
+    filesizes = files.pop('filesize')
+    transfer_streams = get_transfer_streams(gearman_worker, file_count)
+
+    # Create temp directory
+    tmpdir = tempfile.mkdtemp()
 
     try:
-        with open(rsync_filelist_filepath, 'w') as rsync_filelist_file:
-            rsync_filelist_file.write('\n'.join(files['include']))
+        rsync_filelist_filepaths = build_shard_filelists(tmpdir, files['include'], filesizes, transfer_streams)
 
     except IOError:
         logging.error("Error Saving temporary rsync filelist file")
 
         # Cleanup
-        time.sleep(2)
-        subprocess.call(['umount', mntpoint])
         shutil.rmtree(tmpdir)
 
-        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file: ' + rsync_filelist_filepath, 'files': []}
-
-    bandwidth_limit = '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
+        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file', 'files': []}
 
-    if gearman_worker.collection_system_transfer['bandwidthLimit'] != '0':
-        bandwidth_limit = '--bwlimit=' + gearman_worker.collection_system_transfer['bandwidthLimit']
+    bandwidth_limit = build_bandwidth_limit_arg(gearman_worker.collection_system_transfer['bandwidthLimit'], len(rsync_filelist_filepaths))
 
-    command = ['rsync', '-trim', bandwidth_limit, '--files-from=' + rsync_filelist_filepath, source_dir, dest_dir]
+    commands = [['rsync', '-trm', OUT_FORMAT_ARG, bandwidth_limit, '--files-from=' + rsync_filelist_filepath, source_dir, dest_dir] for rsync_filelist_filepath in rsync_filelist_filepaths]
 
-    logging.debug("Transfer Command: %s", ' '.join(command))
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    for event in run_rsync_itemized(commands, lambda: gearman_worker.stop, transfer_stats):
 
-    while True:
-
-        line = proc.stdout.readline().rstrip('\n')
-
-        if proc.poll() is not None:
-            break
-
-        if not line:
-            continue
-
-        logging.debug('line %s', line)
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1].rstrip('\n')
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1].rstrip('\n')
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     files['new'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['new']]
     files['updated'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['updated']]
 
     # Cleanup
-    time.sleep(2)
-    logging.debug('Unmounting SMB Share')
-    subprocess.call(['umount', mntpoint])
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
-def transfer_rsync_source_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-statements
+def transfer_rsync_source_dir(gearman_worker, progress): # pylint: disable=too-many-locals,too-many-statements
     """
     Preform a collection system transfer from a rsync server
     """
@@ -664,6 +523,7 @@ def transfer_rsync_source_dir(gearman_worker, gearman_job): # pylint: disable=to
     logging.debug("Destination Dir: %s", dest_dir)
 
     logging.debug("Build file list")
+    progress.start_phase('listing')
     output_results = build_rsync_filelist(gearman_worker, source_dir)
 
     if not output_results['verdict']:
@@ -694,11 +554,11 @@ def transfer_rsync_source_dir(gearman_worker, gearman_job): # pylint: disable=to
 
         return {'verdict': False, 'reason': 'Error Saving temporary rsync password file: ' + rsync_password_filepath}
 
-    rsync_filelist_filepath = os.path.join(tmpdir, 'rsyncFileList.txt')
+    filesizes = files.pop('filesize')
+    transfer_streams = get_transfer_streams(gearman_worker, file_count)
 
     try:
-        with open(rsync_filelist_filepath, 'w') as rsync_filelist_file:
-            rsync_filelist_file.write('\n'.join(files['include']))
+        rsync_filelist_filepaths = build_shard_filelists(tmpdir, files['include'], filesizes, transfer_streams)
 
     except IOError:
         logging.error("Error Saving temporary rsync filelist file")
@@ -706,42 +566,25 @@ def transfer_rsync_source_dir(gearman_worker, gearman_job): # pylint: disable=to
         # Cleanup
         shutil.rmtree(tmpdir)
 
-        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file: ' + rsync_filelist_filepath, 'files':[]}
+        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file', 'files':[]}
 
-    bandwidth_limit = '--bwlimit=' + gearman_worker.collection_system_transfer['bandwidthLimit'] if gearman_worker.collection_system_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
+    bandwidth_limit = build_bandwidth_limit_arg(gearman_worker.collection_system_transfer['bandwidthLimit'], len(rsync_filelist_filepaths))
 
-    command = ['rsync', '-tri', bandwidth_limit, '--no-motd', '--files-from=' + rsync_filelist_filepath, '--password-file=' + rsync_password_filepath, 'rsync://' + gearman_worker.collection_system_transfer['rsyncUser'] + '@' + gearman_worker.collection_system_transfer['rsyncServer'] + source_dir, dest_dir]
+    commands = [['rsync', '-tr', OUT_FORMAT_ARG, bandwidth_limit, '--no-motd', '--files-from=' + rsync_filelist_filepath, '--password-file=' + rsync_password_filepath, 'rsync://' + gearman_worker.collection_system_transfer['rsyncUser'] + '@' + gearman_worker.collection_system_transfer['rsyncServer'] + source_dir, dest_dir] for rsync_filelist_filepath in rsync_filelist_filepaths]
 
-    logging.debug('Transfer Command: %s', ' '.join(command))
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    for event in run_rsync_itemized(commands, lambda: gearman_worker.stop, transfer_stats):
 
-    while True:
-
-        line = proc.stdout.readline().rstrip('\n')
-
-        if proc.poll() is not None:
-            break
-
-        if not line:
-            continue
-
-        logging.debug('Line: %s', line)
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     files['new'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['new']]
     files['updated'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['updated']]
@@ -749,10 +592,10 @@ def transfer_rsync_source_dir(gearman_worker, gearman_job): # pylint: disable=to
     # Cleanup
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
-def transfer_ssh_source_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals
+def transfer_ssh_source_dir(gearman_worker, progress): # pylint: disable=too-many-locals
     """
     Preform a collection system transfer from a ssh server
     """
@@ -769,6 +612,7 @@ def transfer_ssh_source_dir(gearman_worker, gearman_job): # pylint: disable=too-
     logging.debug("Destination Dir: %s", dest_dir)
 
     logging.debug("Build file list")
+    progress.start_phase('listing')
     output_results = build_ssh_filelist(gearman_worker, source_dir)
     if not output_results['verdict']:
         return {'verdict': False, 'reason': output_results['reason'], 'files':[]}
@@ -778,14 +622,14 @@ def transfer_ssh_source_dir(gearman_worker, gearman_job): # pylint: disable=too-
     # Create temp directory
     tmpdir = tempfile.mkdtemp()
 
-    ssh_filelist_filepath = os.path.join(tmpdir, 'sshFileList.txt')
-
     file_index = 0
     file_count = len(files['include'])
 
+    filesizes = files.pop('filesize')
+    transfer_streams = get_transfer_streams(gearman_worker, file_count)
+
     try:
-        with open(ssh_filelist_filepath, 'w') as ssh_filelist_file:
-            ssh_filelist_file.write('\n'.join(files['include']))
+        ssh_filelist_filepaths = build_shard_filelists(tmpdir, files['include'], filesizes, transfer_streams, 'sshFileList')
 
     except IOError:
         logging.debug("Error Saving temporary ssh filelist file")
@@ -793,42 +637,25 @@ def transfer_ssh_source_dir(gearman_worker, gearman_job): # pylint: disable=too-
         # Cleanup
         shutil.rmtree(tmpdir)
 
-        return {'verdict': False, 'reason': 'Error Saving temporary rsync filelist file: ' + ssh_filelist_filepath, 'files':[]}
-
-    bandwidth_limit = '--bwlimit=' + gearman_worker.collection_system_transfer['bandwidthLimit'] if gearman_worker.collection_system_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
-
-    command = ['rsync', '-tri', bandwidth_limit, '--files-from=' + ssh_filelist_filepath, '-e', 'ssh', gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir, dest_dir] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'rsync', '-tri', bandwidth_limit, '--files-from=' + ssh_filelist_filepath, '-e', 'ssh', gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir, dest_dir]
-
-    logging.debug("Transfer Command: %s", ' '.join(command))
+        return {'verdict': False, 'reason': 'Error Saving temporary ssh filelist file', 'files':[]}
 
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    bandwidth_limit = build_bandwidth_limit_arg(gearman_worker.collection_system_transfer['bandwidthLimit'], len(ssh_filelist_filepaths))
 
-    while True:
+    commands = [['rsync', '-tr', OUT_FORMAT_ARG, bandwidth_limit, '--files-from=' + ssh_filelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']), gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir, dest_dir] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'rsync', '-tr', OUT_FORMAT_ARG, bandwidth_limit, '--files-from=' + ssh_filelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']), gearman_worker.collection_system_transfer['sshUser'] + '@' + gearman_worker.collection_system_transfer['sshServer'] + ':' + source_dir, dest_dir] for ssh_filelist_filepath in ssh_filelist_filepaths]
 
-        line = proc.stdout.readline().rstrip('\n')
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-        if proc.poll() is not None:
-            break
+    for event in run_rsync_itemized(commands, lambda: gearman_worker.stop, transfer_stats):
 
-        if not line:
-            continue
-
-        logging.debug("Line: %s", line)
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     files['new'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['new']]
     files['updated'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['updated']]
@@ -836,7 +663,7 @@ def transfer_ssh_source_dir(gearman_worker, gearman_job): # pylint: disable=too-
     # Cleanup
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
 class OVDMGearmanWorker(python3_gearman.GearmanWorker):  # pylint: disable=too-many-instance-attributes
@@ -846,13 +673,18 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):  # pylint: disable=too-m
 
     def __init__(self):
         self.stop = False
+        self.retire = False
         self.ovdm = OpenVDM()
+        self.ssh_control = SSHControlManager(self.ovdm.get_ssh_control_persist())
+        self.smb_mounts = SMBMountManager()
+        self.connection_tests = ConnectionTestCache(self.ovdm.get_connection_test_ttl())
         self.transfer_start_date = None
         self.cruise_id = self.ovdm.get_cruise_id()
         self.lowering_id = self.ovdm.get_lowering_id()
         self.data_start_date = None
         self.data_end_date = None
         self.system_status = self.ovdm.get_system_status()
+        self.changed_files = None
         self.collection_system_transfer = {}
         self.shipboard_data_warehouse_config = self.ovdm.get_shipboard_data_warehouse_config()
         super().__init__(host_list=[self.ovdm.get_gearman_server()])
@@ -881,6 +713,7 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):  # pylint: disable=too-m
             return self.on_job_complete(current_job, json.dumps({'parts':[{"partName": "Located Collection System Tranfer Data", "result": "Fail", "reason": "Could not find retrieve data for collection system transfer from OpenVDM API"}], 'files':{'new':[],'updated':[], 'exclude':[]}}))
 
         self.system_status = payload_obj['systemStatus'] if 'systemStatus' in payload_obj else self.ovdm.get_system_status()
+        self.changed_files = payload_obj['changedFiles'] if 'changedFiles' in payload_obj else None
         self.collection_system_transfer.update(payload_obj['collectionSystemTransfer'])
 
         if self.system_status == "Off" or self.collection_system_transfer['enable'] == '0':
@@ -932,6 +765,7 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):  # pylint: disable=too-m
 
         self.send_job_data(current_job, json.dumps([{"partName": "Worker crashed", "result": "Fail", "reason": "Unknown"}]))
         self.ovdm.set_error_collection_system_transfer(self.collection_system_transfer['collectionSystemTransferID'], 'Worker crashed')
+        self.connection_tests.invalidate(build_test_key(self.collection_system_transfer))
 
         exc_type, _, exc_tb = sys.exc_info()
         fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
@@ -949,6 +783,11 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):  # pylint: disable=too-m
 
         if results_obj['files']['new'] or results_obj['files']['updated']:
 
+            # large file lists are handed to the subsequent jobs as a manifest
+            manifest_filepath = os.path.join(build_manifest_dirpath(build_logfile_dirpath(self)), self.collection_system_transfer['name'] + '_' + self.transfer_start_date + '.ndjson')
+            results_obj['files'] = spill_files(results_obj['files'], manifest_filepath, self.ovdm.get_file_manifest_threshold())
+            job_result = json.dumps(results_obj)
+
             logging.debug("Preparing subsequent Gearman jobs")
             gm_client = python3_gearman.GearmanClient([self.ovdm.get_gearman_server()])
 
@@ -990,9 +829,33 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):  # pylint: disable=too-m
         """
         self.stop = True
         logging.warning("Quitting worker...")
+        self.ssh_control.close_all()
+        self.smb_mounts.release()
         self.shutdown()
 
 
+    def retire_worker(self):
+        """
+        Function to quit the worker once the current job is complete
+        """
+        self.retire = True
+        logging.warning("Retiring worker...")
+
+
+    def after_poll(self, any_activity): # pylint: disable=unused-argument
+        """
+        Function run after each poll of the Gearman server, returning False
+        stops the worker
+        """
+        if self.retire:
+            logging.warning("Worker retired")
+            self.ssh_control.close_all()
+            self.smb_mounts.release()
+            return False
+
+        return True
+
+
 def task_run_collection_system_transfer(gearman_worker, current_job): # pylint: disable=too-many-return-statements,too-many-branches,too-many-statements
     """
     Run the collection system transfer
@@ -1019,18 +882,28 @@ def task_run_collection_system_transfer(gearman_worker, current_job): # pylint:
     logging.debug("Setting transfer status to 'Running'")
     gearman_worker.ovdm.set_running_collection_system_transfer(gearman_worker.collection_system_transfer['collectionSystemTransferID'], os.getpid(), current_job.handle)
 
+    progress = ProgressReporter(gearman_worker, current_job, TRANSFER_PHASES)
+
     logging.info("Testing connection")
-    gearman_worker.send_job_status(current_job, 1, 10)
+    progress.start_phase('connection test')
 
-    gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
+    connection_test_key = build_test_key(gearman_worker.collection_system_transfer)
+    connection_test_fingerprint = build_test_fingerprint(gearman_worker.collection_system_transfer, gearman_worker.cruise_id, gearman_worker.lowering_id)
 
-    gm_data = {
-        'collectionSystemTransfer': gearman_worker.collection_system_transfer,
-        'cruiseID': gearman_worker.cruise_id
-    }
+    results_obj = gearman_worker.connection_tests.get(connection_test_key, connection_test_fingerprint)
+
+    if results_obj is not None:
+        logging.info("Using cached connection test results")
+    else:
+        gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
 
-    completed_job_request = gm_client.submit_job("testCollectionSystemTransfer", json.dumps(gm_data))
-    results_obj = json.loads(completed_job_request.result)
+        gm_data = {
+            'collectionSystemTransfer': gearman_worker.collection_system_transfer,
+            'cruiseID': gearman_worker.cruise_id
+        }
+
+        completed_job_request = gm_client.submit_job("testCollectionSystemTransfer", json.dumps(gm_data))
+        results_obj = json.loads(completed_job_request.result)
 
     logging.debug('Connection Test Results: %s', json.dumps(results_obj, indent=2))
 
@@ -1042,8 +915,6 @@ def task_run_collection_system_transfer(gearman_worker, current_job): # pylint:
         job_results['parts'].append({"partName": "Connection Test", "result": "Fail", "reason": results_obj['parts'][-1]['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(current_job, 2, 10)
-
     if gearman_worker.collection_system_transfer['cruiseOrLowering'] == "1" and gearman_worker.lowering_id is None:
         logging.info("Verifying lowering_id is set")
         job_results['parts'].append({'partName': 'Destination Directory Test', "result": "Fail", 'reason': 'Lowering ID is not defined'})
@@ -1052,13 +923,13 @@ def task_run_collection_system_transfer(gearman_worker, current_job): # pylint:
     logging.info("Transferring files")
     output_results = None
     if gearman_worker.collection_system_transfer['transferType'] == "1": # Local Directory
-        output_results = transfer_local_source_dir(gearman_worker, current_job)
+        output_results = transfer_local_source_dir(gearman_worker, progress)
     elif  gearman_worker.collection_system_transfer['transferType'] == "2": # Rsync Server
-        output_results = transfer_rsync_source_dir(gearman_worker, current_job)
+        output_results = transfer_rsync_source_dir(gearman_worker, progress)
     elif  gearman_worker.collection_system_transfer['transferType'] == "3": # SMB Server
-        output_results = transfer_smb_source_dir(gearman_worker, current_job)
+        output_results = transfer_smb_source_dir(gearman_worker, progress)
     elif  gearman_worker.collection_system_transfer['transferType'] == "4": # SSH Server
-        output_results = transfer_ssh_source_dir(gearman_worker, current_job)
+        output_results = transfer_ssh_source_dir(gearman_worker, progress)
     else:
         logging.error("Unknown Transfer Type")
         job_results['parts'].append({"partName": "Transfer Files", "result": "Fail", "reason": "Unknown transfer type"})
@@ -1066,13 +937,17 @@ def task_run_collection_system_transfer(gearman_worker, current_job): # pylint:
 
     if not output_results['verdict']:
         logging.error("Transfer of remote files failed: %s", output_results['reason'])
+        gearman_worker.connection_tests.invalidate(connection_test_key)
         job_results['parts'].append({"partName": "Transfer Files", "result": "Fail", "reason": output_results['reason']})
         return json.dumps(job_results)
 
     logging.debug("Transfer completed successfully")
     job_results['files'] = output_results['files']
+    job_results['transferStats'] = output_results['stats']
     job_results['parts'].append({"partName": "Transfer Files", "result": "Pass"})
 
+    logging.info("%s file(s) transferred, %s bytes at %s MB/s", job_results['transferStats']['fileCount'], job_results['transferStats']['bytesTransferred'], job_results['transferStats']['throughput'])
+
     if len(job_results['files']['new']) > 0:
         logging.debug("%s file(s) added", len(job_results['files']['new']))
     if len(job_results['files']['updated']) > 0:
@@ -1080,7 +955,7 @@ def task_run_collection_system_transfer(gearman_worker, current_job): # pylint:
     if len(job_results['files']['exclude']) > 0:
         logging.warning("%s misnamed file(s) encountered", len(job_results['files']['exclude']))
 
-    gearman_worker.send_job_status(current_job, 9, 10)
+    progress.start_phase('post-processing')
 
     if job_results['files']['new'] or job_results['files']['updated']:
 
@@ -1144,7 +1019,7 @@ def task_run_collection_system_transfer(gearman_worker, current_job): # pylint:
         job_results['parts'].append({"partName": "Set transfer logfile ownership/permissions", "result": "Fail", "reason": output_results['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(current_job, 10, 10)
+    progress.complete()
 
     time.sleep(2)
 
@@ -1193,8 +1068,16 @@ if __name__ == "__main__":
         logging.warning("INT Signal Received")
         new_worker.quit_worker()
 
+    def sigusr1_handler(_signo, _stack_frame):
+        """
+        Signal Handler for USR1
+        """
+        logging.warning("USR1 Signal Received")
+        new_worker.retire_worker()
+
     signal.signal(signal.SIGQUIT, sigquit_handler)
     signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGUSR1, sigusr1_handler)
 
     logging.info("Registering worker tasks...")
 
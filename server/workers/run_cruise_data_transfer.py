@@ -38,7 +38,6 @@ import tempfile
 import shutil
 import json
 import time
-import fnmatch
 import subprocess
 import signal
 import logging
@@ -48,21 +47,27 @@ import python3_gearman
 
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
-from server.lib.check_filenames import is_ascii
+from server.lib.file_filters import compile_filters, EXCLUDE, IGNORE
+from server.lib.progress import ProgressReporter
+from server.lib.rsync_itemize import OUT_FORMAT_ARG, TransferStats, run_rsync_itemized
 from server.lib.set_owner_group_permissions import set_owner_group_permissions
+from server.lib.smb_mounts import SMBMountManager, build_active_smb_shares
+from server.lib.ssh_control import SSHControlManager
 from server.lib.openvdm import OpenVDM, DEFAULT_CRUISE_CONFIG_FN, DEFAULT_MD5_SUMMARY_FN, DEFAULT_MD5_SUMMARY_MD5_FN
 
+TRANSFER_PHASES = [('connection test', 10), ('listing', 10), ('transfer', 80)]
 
-def build_filelist(gearman_worker, source_dir): # pylint: disable=too-many-branches
+
+def build_filelist(gearman_worker, source_dir):
     """
     Build list of files to transfer
     """
 
     return_files = {'include':[], 'exclude':[], 'new':[], 'updated':[]}
 
-    filters = build_filters(gearman_worker)
+    filters = compile_filters(build_filters(gearman_worker))
 
-    for root, _, filenames in os.walk(source_dir): # pylint: disable=too-many-nested-blocks
+    for root, _, filenames in os.walk(source_dir):
         for filename in filenames:
 
             filepath = os.path.join(root, filename)
@@ -71,39 +76,19 @@ def build_filelist(gearman_worker, source_dir): # pylint: disable=too-many-branc
                 logging.debug("%s is a symlink, skipping", filename)
                 continue
 
-            exclude = False
-            ignore = False
-            for ignore_filter in filters['ignoreFilter'].split(','):
-                #logging.debug(filt)
-                if fnmatch.fnmatch(filepath, ignore_filter):
-                    logging.debug("%s ignored by ignore filter", filename)
-                    ignore = True
-                    break
-            if not ignore:
-                for include_filter in filters['includeFilter'].split(','):
-                    if fnmatch.fnmatch(filepath, include_filter):
-                        for exclude_filter in filters['excludeFilter'].split(','):
-                            if fnmatch.fnmatch(filepath, exclude_filter):
-                                logging.debug("%s excluded by exclude filter", filename)
-                                return_files['exclude'].append(filepath)
-                                exclude = True
-                                break
-                        if not exclude and not is_ascii(filepath):
-                            logging.debug("%s is not an ascii-encoded unicode string", filename)
-                            return_files['exclude'].append(filepath)
-                            exclude = True
-                            break
-
-                        if exclude:
-                            break
-
-                if not exclude:
-                    logging.debug("%s is a valid file for transfer", filepath)
-                    return_files['include'].append(filepath)
-
-            # if include or exclude or ignore:
-            #     logging.debug("{} excluded because file does not match any of the filters".format(filename))
-            #     return_files['exclude'].append(os.path.join(root, filename))
+            verdict = filters.verdict(filepath)
+
+            if verdict == IGNORE:
+                logging.debug("%s ignored by ignore filter", filename)
+                continue
+
+            if verdict == EXCLUDE:
+                logging.debug("%s excluded by filters", filename)
+                return_files['exclude'].append(filepath)
+                continue
+
+            logging.debug("%s is a valid file for transfer", filepath)
+            return_files['include'].append(filepath)
 
     return_files['include'] = [filename.split(source_dir + '/',1).pop() for filename in return_files['include']]
     return_files['exclude'] = [filename.split(source_dir + '/',1).pop() for filename in return_files['exclude']]
@@ -181,7 +166,7 @@ def build_exclude_filterlist(gearman_worker):
     return exclude_filterlist
 
 
-def transfer_local_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-statements
+def transfer_local_dest_dir(gearman_worker, progress): # pylint: disable=too-many-locals,too-many-statements
     """
     Copy cruise data to a local directory
     """
@@ -194,6 +179,7 @@ def transfer_local_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
     logging.debug('Destination Dir: %s', dest_dir)
 
     logging.debug("Building file list")
+    progress.start_phase('listing')
     files = build_filelist(gearman_worker, cruise_dir)
 
     # Create temp directory
@@ -219,48 +205,27 @@ def transfer_local_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
 
     proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-    for line in proc.stdout:
+    for line in proc.stdout.splitlines():
         if line.startswith('Number of regular files transferred:'):
-            file_count = int(line.split(':')[1])
+            file_count = int(line.split(':')[1].replace(',', ''))
 
     bandwidth_imit = '--bwlimit=' + gearman_worker.cruise_data_transfer['bandwidthLimit'] if gearman_worker.cruise_data_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
 
-    command = ['rsync', '-trimv', bandwidth_imit, '--exclude-from=' + rsync_exclude_list_filepath, cruise_dir, dest_dir]
-
-    logging.debug('Transfer Command: %s', ' '.join(command))
-
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    while True:
+    command = ['rsync', '-trmv', OUT_FORMAT_ARG, bandwidth_imit, '--exclude-from=' + rsync_exclude_list_filepath, cruise_dir, dest_dir]
 
-        line = proc.stdout.readline().rstrip('\n')
-        err_line = proc.stderr.readline().rstrip('\n')
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-        if err_line:
-            logging.warning("Err Line: %s", err_line)
-        if line:
-            logging.debug("Line: %s", line)
+    for event in run_rsync_itemized([command], lambda: gearman_worker.stop, transfer_stats):
 
-        if proc.poll() is not None:
-            break
-
-        # if not line:
-        #     continue
-
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     # files['new'] = [os.path.join('/', gearman_worker.cruise_id, filename) for filename in files['new']]
     # files['updated'] = [os.path.join('/', gearman_worker.cruise_id, filename) for filename in files['updated']]
@@ -275,10 +240,10 @@ def transfer_local_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
         logging.error("Error setting ownership/permissions for cruise data at destination: %s", os.path.join(dest_dir, gearman_worker.cruise_id))
         return output_results
 
-    return { 'verdict': True, 'files': files }
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
-def transfer_smb_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-statements
+def transfer_smb_dest_dir(gearman_worker, progress): # pylint: disable=too-many-locals,too-many-statements
     """
     Copy cruise data to a samba server
     """
@@ -288,33 +253,16 @@ def transfer_smb_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-ma
     cruise_dir = os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_id)
 
     logging.debug("Building file list")
+    progress.start_phase('listing')
     files = build_filelist(gearman_worker, cruise_dir)
 
-    # Create temp directory
-    tmpdir = tempfile.mkdtemp()
-
-    # Create mountpoint
-    mntpoint = os.path.join(tmpdir, 'mntpoint')
-    os.mkdir(mntpoint, 0o755)
-
     # Mount SMB Share
     logging.debug("Mounting SMB Share")
 
-    ver_test_command = ['smbclient', '-L', gearman_worker.cruise_data_transfer['smbServer'], '-W', gearman_worker.cruise_data_transfer['smbDomain'], '-m', 'SMB2', '-g', '-N'] if gearman_worker.cruise_data_transfer['smbUser'] == 'guest' else ['smbclient', '-L', gearman_worker.cruise_data_transfer['smbServer'], '-W', gearman_worker.cruise_data_transfer['smbDomain'], '-m', 'SMB2', '-g', '-U', gearman_worker.cruise_data_transfer['smbUser'] + '%' + gearman_worker.cruise_data_transfer['smbPass']]
-    logging.debug("SMB version test command: %s", ' '.join(ver_test_command))
-
-    vers="2.1"
-    proc = subprocess.run(ver_test_command, capture_output=True, text=True, check=False)
-
-    for line in proc.stdout.splitlines():
-        if line.startswith('OS=[Windows 5.1]'):
-            vers="1.0"
-            break
-
-    mount_command = ['sudo', 'mount', '-t', 'cifs', gearman_worker.cruise_data_transfer['smbServer'], mntpoint, '-o', 'rw' + ',guest' + ',domain=' + gearman_worker.cruise_data_transfer['smbDomain'] + ',vers=' + vers] if gearman_worker.cruise_data_transfer['smbUser'] == 'guest' else ['sudo', 'mount', '-t', 'cifs', gearman_worker.cruise_data_transfer['smbServer'], mntpoint, '-o', 'rw' + ',username=' + gearman_worker.cruise_data_transfer['smbUser'] + ',password=' + gearman_worker.cruise_data_transfer['smbPass'] + ',domain=' + gearman_worker.cruise_data_transfer['smbDomain'] + ',vers=' + vers]
-    logging.debug("Mount command: %s", ' '.join(mount_command))
-
-    subprocess.run(mount_command, capture_output=True, text=True, check=False)
+    mount_results = gearman_worker.smb_mounts.acquire(gearman_worker.cruise_data_transfer['smbServer'], gearman_worker.cruise_data_transfer['smbDomain'], gearman_worker.cruise_data_transfer['smbUser'], gearman_worker.cruise_data_transfer['smbPass'], 'rw', active_shares=build_active_smb_shares(gearman_worker.ovdm))
+    if not mount_results['verdict']:
+        return {'verdict': False, 'reason': mount_results['reason'], 'files': files}
+    mntpoint = mount_results['mntpoint']
 
     # Create temp directory
     tmpdir = tempfile.mkdtemp()
@@ -340,61 +288,36 @@ def transfer_smb_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-ma
 
     proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-    for line in proc.stdout:
+    for line in proc.stdout.splitlines():
         if line.startswith('Number of regular files transferred:'):
-            file_count = int(line.split(':')[1])
+            file_count = int(line.split(':')[1].replace(',', ''))
             break
 
     bandwidth_imit = '--bwlimit=' + gearman_worker.cruise_data_transfer['bandwidthLimit'] if gearman_worker.cruise_data_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
 
-    command = ['rsync', '-trimv', bandwidth_imit, '--exclude-from=' + rsync_exclude_list_filepath, cruise_dir, os.path.join(mntpoint, gearman_worker.cruise_data_transfer['destDir']).rstrip('/') if gearman_worker.cruise_data_transfer['destDir'] != '/' else mntpoint]
-
-    logging.debug('Transfer Command: %s', ' '.join(command))
+    command = ['rsync', '-trmv', OUT_FORMAT_ARG, bandwidth_imit, '--exclude-from=' + rsync_exclude_list_filepath, cruise_dir, os.path.join(mntpoint, gearman_worker.cruise_data_transfer['destDir']).rstrip('/') if gearman_worker.cruise_data_transfer['destDir'] != '/' else mntpoint]
 
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    while True:
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-        line = proc.stdout.readline().rstrip('\n')
-        err_line = proc.stderr.readline().rstrip('\n')
+    for event in run_rsync_itemized([command], lambda: gearman_worker.stop, transfer_stats):
 
-        if err_line:
-            logging.warning("Err Line: %s", err_line)
-        if line:
-            logging.debug("Line: %s", line)
-
-        if proc.poll() is not None:
-            break
-
-        # if not line:
-        #     continue
-
-        if line.startswith( '>f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '>f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     # Cleanup
-    time.sleep(2)
-
-    logging.debug("Unmount SMB Share")
-    subprocess.call(['umount', mntpoint])
     shutil.rmtree(tmpdir)
 
-    return { 'verdict': True, 'files': files }
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
-def transfer_rsync_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals,too-many-statements
+def transfer_rsync_dest_dir(gearman_worker, progress): # pylint: disable=too-many-locals,too-many-statements
     """
     Copy cruise data to a rsync server
     """
@@ -404,6 +327,7 @@ def transfer_rsync_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
     cruise_dir = os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_id)
 
     logging.debug("Building file list")
+    progress.start_phase('listing')
     files = build_filelist(gearman_worker, cruise_dir)
 
     dest_dir = gearman_worker.cruise_data_transfer['destDir'].rstrip('/')
@@ -453,9 +377,9 @@ def transfer_rsync_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
 
     proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-    for line in proc.stdout:
+    for line in proc.stdout.splitlines():
         if line.startswith('Number of regular files transferred:'):
-            file_count = int(line.split(':')[1])
+            file_count = int(line.split(':')[1].replace(',', ''))
             break
 
     bandwidth_imit = '--bwlimit=' + gearman_worker.cruise_data_transfer['bandwidthLimit'] if gearman_worker.cruise_data_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
@@ -465,43 +389,21 @@ def transfer_rsync_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
     # command = ['rsync', '-a', bandwidthLimit, '--no-motd', '--password-file=' + rsync_password_filepath, os.path.join(tmpdir, gearman_worker.cruise_id), 'rsync://' + gearman_worker.cruise_data_transfer['rsyncUser'] + '@' + gearman_worker.cruise_data_transfer['rsyncServer'] + dest_dir + '/']
     # popen = subprocess.Popen(command, stdout=subprocess.PIPE)
 
-    command = ['rsync', '-trimv', bandwidth_imit, '--no-motd', '--exclude-from=' + rsync_exclude_list_filepath, '--password-file=' + rsync_password_filepath, cruise_dir, 'rsync://' + gearman_worker.cruise_data_transfer['rsyncUser'] + '@' + gearman_worker.cruise_data_transfer['rsyncServer'] + dest_dir + '/']
-
-    logging.debug('Transfer Command: %s', ' '.join(command))
-
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    command = ['rsync', '-trmv', OUT_FORMAT_ARG, bandwidth_imit, '--no-motd', '--exclude-from=' + rsync_exclude_list_filepath, '--password-file=' + rsync_password_filepath, cruise_dir, 'rsync://' + gearman_worker.cruise_data_transfer['rsyncUser'] + '@' + gearman_worker.cruise_data_transfer['rsyncServer'] + dest_dir + '/']
 
-    while True:
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-        line = proc.stdout.readline().rstrip('\n')
-        err_line = proc.stderr.readline().rstrip('\n')
+    for event in run_rsync_itemized([command], lambda: gearman_worker.stop, transfer_stats):
 
-        if err_line:
-            logging.warning("Err Line: %s", err_line)
-        if line:
-            logging.debug("Line: %s", line)
-
-        if proc.poll() is not None:
-            break
-
-        # if not line:
-        #     continue
-
-        if line.startswith( '<f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '<f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     # files['new'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['new']]
     # files['updated'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['updated']]
@@ -509,10 +411,10 @@ def transfer_rsync_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-
     # Cleanup
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
-def transfer_ssh_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-many-locals
+def transfer_ssh_dest_dir(gearman_worker, progress): # pylint: disable=too-many-locals
     """
     Copy cruise data to a ssh server
     """
@@ -522,6 +424,7 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-ma
     cruise_dir = os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_id)
 
     logging.debug("Building file list")
+    progress.start_phase('listing')
     files = build_filelist(gearman_worker, cruise_dir)
 
     dest_dir = gearman_worker.cruise_data_transfer['destDir'].rstrip('/')
@@ -545,15 +448,15 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-ma
 
     file_index = 0
     file_count = 1 # avoids divide by 0 error
-    command = ['rsync', '-trimnv', '--stats', '--exclude-from=' + ssh_excludelist_filepath, '-e', 'ssh', cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':', dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'rsync', '-trimnv', '--exclude-from=' + ssh_excludelist_filepath, '-e', 'ssh', cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir]
+    command = ['rsync', '-trimnv', '--stats', '--exclude-from=' + ssh_excludelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']), cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':', dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'rsync', '-trimnv', '--exclude-from=' + ssh_excludelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']), cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir]
 
     logging.debug('File count Command: %s', ' '.join(command))
 
     proc = subprocess.run(command, capture_output=True, text=True, check=False)
 
-    for line in proc.stdout:
+    for line in proc.stdout.splitlines():
         if line.startswith('Number of regular files transferred:'):
-            file_count = int(line.split(':')[1])
+            file_count = int(line.split(':')[1].replace(',', ''))
             break
 
     bandwidth_imit = '--bwlimit=' + gearman_worker.cruise_data_transfer['bandwidthLimit'] if gearman_worker.cruise_data_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
@@ -563,43 +466,21 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-ma
     # proc = subprocess.Popen(command, stdout=subprocess.PIPE)
     # proc.communicate()
 
-    command = ['rsync', '-trimv', bandwidth_imit, '--exclude-from=' + ssh_excludelist_filepath, '-e', 'ssh', cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'rsync', '-trimv', bandwidth_imit, '--exclude-from=' + ssh_excludelist_filepath, '-e', 'ssh', cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir]
-
-    logging.debug("Transfer Command: %s", ' '.join(command))
-
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-    while True:
+    command = ['rsync', '-trmv', OUT_FORMAT_ARG, bandwidth_imit, '--exclude-from=' + ssh_excludelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']), cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'rsync', '-trmv', OUT_FORMAT_ARG, bandwidth_imit, '--exclude-from=' + ssh_excludelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']), cruise_dir, gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir]
 
-        line = proc.stdout.readline().rstrip('\n')
-        err_line = proc.stderr.readline().rstrip('\n')
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-        if err_line:
-            logging.warning("Err Line: %s", err_line)
-        if line:
-            logging.debug("Line: %s", line)
+    for event in run_rsync_itemized([command], lambda: gearman_worker.stop, transfer_stats):
 
-        if proc.poll() is not None:
-            break
-
-        # if not line:
-        #    continue
-
-        if line.startswith( '<f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '<f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     # files['new'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['new']]
     # files['updated'] = [os.path.join(dest_dir.replace(cruise_dir, '').lstrip('/').rstrip('/'),filename) for filename in files['updated']]
@@ -607,7 +488,7 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job): # pylint: disable=too-ma
     # Cleanup
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
 class OVDMGearmanWorker(python3_gearman.GearmanWorker):
@@ -617,7 +498,10 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
 
     def __init__(self):
         self.stop = False
+        self.retire = False
         self.ovdm = OpenVDM()
+        self.ssh_control = SSHControlManager(self.ovdm.get_ssh_control_persist())
+        self.smb_mounts = SMBMountManager()
         self.cruise_id = self.ovdm.get_cruise_id()
         self.system_status = self.ovdm.get_system_status()
         self.cruise_data_transfer = {}
@@ -716,9 +600,33 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
         """
         self.stop = True
         logging.warning("Quitting worker...")
+        self.ssh_control.close_all()
+        self.smb_mounts.release()
         self.shutdown()
 
 
+    def retire_worker(self):
+        """
+        Function to quit the worker once the current job is complete
+        """
+        self.retire = True
+        logging.warning("Retiring worker...")
+
+
+    def after_poll(self, any_activity): # pylint: disable=unused-argument
+        """
+        Function run after each poll of the Gearman server, returning False
+        stops the worker
+        """
+        if self.retire:
+            logging.warning("Worker retired")
+            self.ssh_control.close_all()
+            self.smb_mounts.release()
+            return False
+
+        return True
+
+
 def task_run_cruise_data_transfer(gearman_worker, current_job):
     """
     Run the cruise data transfer
@@ -737,8 +645,10 @@ def task_run_cruise_data_transfer(gearman_worker, current_job):
     logging.debug("Setting transfer status to 'Running'")
     gearman_worker.ovdm.set_running_cruise_data_transfer(gearman_worker.cruise_data_transfer['cruiseDataTransferID'], os.getpid(), current_job.handle)
 
+    progress = ProgressReporter(gearman_worker, current_job, TRANSFER_PHASES)
+
     logging.info("Testing configuration")
-    gearman_worker.send_job_status(current_job, 1, 10)
+    progress.start_phase('connection test')
 
     gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
 
@@ -760,18 +670,16 @@ def task_run_cruise_data_transfer(gearman_worker, current_job):
         job_results['parts'].append({"partName": "Connection Test", "result": "Fail", "reason": results_obj['parts'][-1]['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(current_job, 2, 10)
-
     logging.info("Transferring files")
     output_results = None
     if gearman_worker.cruise_data_transfer['transferType'] == "1": # Local Directory
-        output_results = transfer_local_dest_dir(gearman_worker, current_job)
+        output_results = transfer_local_dest_dir(gearman_worker, progress)
     elif  gearman_worker.cruise_data_transfer['transferType'] == "2": # Rsync Server
-        output_results = transfer_rsync_dest_dir(gearman_worker, current_job)
+        output_results = transfer_rsync_dest_dir(gearman_worker, progress)
     elif  gearman_worker.cruise_data_transfer['transferType'] == "3": # SMB Server
-        output_results = transfer_smb_dest_dir(gearman_worker, current_job)
+        output_results = transfer_smb_dest_dir(gearman_worker, progress)
     elif  gearman_worker.cruise_data_transfer['transferType'] == "4": # SSH Server
-        output_results = transfer_ssh_dest_dir(gearman_worker, current_job)
+        output_results = transfer_ssh_dest_dir(gearman_worker, progress)
     else:
         logging.error("Unknown Transfer Type")
         job_results['parts'].append({"partName": "Transfer Files", "result": "Fail", "reason": "Unknown transfer type"})
@@ -784,8 +692,11 @@ def task_run_cruise_data_transfer(gearman_worker, current_job):
 
     logging.debug("Transfer completed successfully")
     job_results['files'] = output_results['files']
+    job_results['transferStats'] = output_results['stats']
     job_results['parts'].append({"partName": "Transfer Files", "result": "Pass"})
 
+    logging.info("%s file(s) transferred, %s bytes at %s MB/s", job_results['transferStats']['fileCount'], job_results['transferStats']['bytesTransferred'], job_results['transferStats']['throughput'])
+
     if len(job_results['files']['new']) > 0:
         logging.debug("%s file(s) added", len(job_results['files']['new']))
     if len(job_results['files']['updated']) > 0:
@@ -793,7 +704,7 @@ def task_run_cruise_data_transfer(gearman_worker, current_job):
     if len(job_results['files']['exclude']) > 0:
         logging.debug("%s file(s) intentionally skipped", len(job_results['files']['exclude']))
 
-    gearman_worker.send_job_status(current_job, 9, 10)
+    progress.complete()
 
     time.sleep(2)
 
@@ -842,8 +753,16 @@ if __name__ == "__main__":
         logging.warning("INT Signal Received")
         new_worker.quit_worker()
 
+    def sigusr1_handler(_signo, _stack_frame):
+        """
+        Signal Handler for USR1
+        """
+        logging.warning("USR1 Signal Received")
+        new_worker.retire_worker()
+
     signal.signal(signal.SIGQUIT, sigquit_handler)
     signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGUSR1, sigusr1_handler)
 
     logging.info("Registering worker tasks...")
 
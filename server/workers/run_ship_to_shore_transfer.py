@@ -37,7 +37,6 @@ import tempfile
 import shutil
 import json
 import time
-import fnmatch
 import subprocess
 import signal
 import logging
@@ -47,10 +46,17 @@ import python3_gearman
 
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
+from server.lib.file_filters import compile_filters
 from server.lib.output_json_data_to_file import output_json_data_to_file
+from server.lib.progress import ProgressReporter
+from server.lib.rsync_itemize import OUT_FORMAT_ARG, TransferStats, run_rsync_itemized
 from server.lib.set_owner_group_permissions import set_owner_group_permissions
+from server.lib.ssh_control import SSHControlManager
 from server.lib.openvdm import OpenVDM
 
+TRANSFER_PHASES = [('connection test', 10), ('listing', 10), ('transfer', 70), ('post-processing', 10)]
+
+
 def build_filelist(gearman_worker):
     """
     Build the list of files for the ship-to-shore transfer
@@ -81,12 +87,13 @@ def build_filelist(gearman_worker):
 
     cruise_dir = os.path.join(gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_id)
 
+    filters = compile_filters({'includeFilter': ','.join(proc_filters['includeFilter'])})
+
     return_files = {'include':[], 'new':[], 'updated':[], 'exclude':[]}
     for root, _, filenames in os.walk(cruise_dir):
         for filename in filenames:
-            for include_filter in proc_filters['includeFilter']:
-                if fnmatch.fnmatch(os.path.join(root, filename), include_filter):
-                    return_files['include'].append(os.path.join(root, filename))
+            if filters.is_included(os.path.join(root, filename)):
+                return_files['include'].append(os.path.join(root, filename))
 
     return_files['include'] = [filename.replace(cruise_dir + '/', '', 1) for filename in return_files['include']]
 
@@ -115,7 +122,7 @@ def build_filters(gearman_worker, raw_filters):
     return return_filters
 
 
-def transfer_ssh_dest_dir(gearman_worker, gearman_job):
+def transfer_ssh_dest_dir(gearman_worker, progress):
     """
     Transfer the files to a destination on a ssh server
     """
@@ -123,6 +130,7 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job):
     logging.debug("Transfer to SSH Server")
 
     logging.debug("Building file list")
+    progress.start_phase('listing')
     output_results = build_filelist(gearman_worker)
 
     if not output_results['verdict']:
@@ -155,38 +163,21 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job):
 
     bw_limit = '--bwlimit=' + gearman_worker.cruise_data_transfer['bandwidthLimit'] if gearman_worker.cruise_data_transfer['bandwidthLimit'] != '0' else '--bwlimit=20000000' # 20GB/s a.k.a. stupid big
 
-    command = ['rsync', '-trim', bw_limit, '--files-from=' + ssh_includelist_filepath, '-e', 'ssh', gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'rsync', '-trim', bw_limit, '--files-from=' + ssh_includelist_filepath, '-e', 'ssh', gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir]
-
-    logging.debug("Transfer Command: %s", ' '.join(command))
-
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
-
-    while True:
+    command = ['rsync', '-trm', OUT_FORMAT_ARG, bw_limit, '--files-from=' + ssh_includelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']), gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'rsync', '-trm', OUT_FORMAT_ARG, bw_limit, '--files-from=' + ssh_includelist_filepath, '-e', gearman_worker.ssh_control.rsync_rsh(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']), gearman_worker.shipboard_data_warehouse_config['shipboardDataWarehouseBaseDir'], gearman_worker.cruise_data_transfer['sshUser'] + '@' + gearman_worker.cruise_data_transfer['sshServer'] + ':' + dest_dir]
 
-        line = proc.stdout.readline().rstrip('\n')
+    progress.start_phase('transfer')
+    transfer_stats = TransferStats()
 
-        if proc.poll() is not None:
-            break
+    for event in run_rsync_itemized([command], lambda: gearman_worker.stop, transfer_stats):
 
-        if not line:
-            continue
-
-        logging.debug("Line: %s", line)
-        if line.startswith( '<f+++++++++' ):
-            filename = line.split(' ',1)[1]
-            files['new'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+        if event.is_new_file():
+            files['new'].append(event.filename)
             file_index += 1
-        elif line.startswith( '<f.' ):
-            filename = line.split(' ',1)[1]
-            files['updated'].append(filename)
-            gearman_worker.send_job_status(gearman_job, int(20 + 70*float(file_index)/float(file_count)), 100)
+            progress.update(file_index, file_count)
+        elif event.is_updated_file():
+            files['updated'].append(event.filename)
             file_index += 1
-
-        if gearman_worker.stop:
-            logging.debug("Stopping")
-            proc.terminate()
-            break
+            progress.update(file_index, file_count)
 
     # files['new'] = [os.path.join(destDir.replace(cruiseDir, '').lstrip('/').rstrip('/'),filename) for filename in files['new']]
     # files['updated'] = [os.path.join(destDir.replace(cruiseDir, '').lstrip('/').rstrip('/'),filename) for filename in files['updated']]
@@ -194,7 +185,7 @@ def transfer_ssh_dest_dir(gearman_worker, gearman_job):
     # Cleanup
     shutil.rmtree(tmpdir)
 
-    return {'verdict': True, 'files': files}
+    return {'verdict': True, 'files': files, 'stats': transfer_stats.results()}
 
 
 class OVDMGearmanWorker(python3_gearman.GearmanWorker):
@@ -204,7 +195,9 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
 
     def __init__(self):
         self.stop = False
+        self.retire = False
         self.ovdm = OpenVDM()
+        self.ssh_control = SSHControlManager(self.ovdm.get_ssh_control_persist())
         self.cruise_id = self.ovdm.get_cruise_id()
         self.system_status = self.ovdm.get_system_status()
         self.transfer_start_date = None
@@ -312,9 +305,31 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
         """
         self.stop = True
         logging.warning("Quitting worker...")
+        self.ssh_control.close_all()
         self.shutdown()
 
 
+    def retire_worker(self):
+        """
+        Function to quit the worker once the current job is complete
+        """
+        self.retire = True
+        logging.warning("Retiring worker...")
+
+
+    def after_poll(self, any_activity): # pylint: disable=unused-argument
+        """
+        Function run after each poll of the Gearman server, returning False
+        stops the worker
+        """
+        if self.retire:
+            logging.warning("Worker retired")
+            self.ssh_control.close_all()
+            return False
+
+        return True
+
+
 def task_run_ship_to_shore_transfer(gearman_worker, current_job): # pylint: disable=too-many-statements
     """
     Perform the ship-to-shore transfer
@@ -333,8 +348,10 @@ def task_run_ship_to_shore_transfer(gearman_worker, current_job): # pylint: disa
     logging.debug("Setting transfer status to 'Running'")
     gearman_worker.ovdm.set_running_cruise_data_transfer(gearman_worker.cruise_data_transfer['cruiseDataTransferID'], os.getpid(), current_job.handle)
 
+    progress = ProgressReporter(gearman_worker, current_job, TRANSFER_PHASES)
+
     logging.info("Testing configuration")
-    gearman_worker.send_job_status(current_job, 1, 10)
+    progress.start_phase('connection test')
 
     gm_client = python3_gearman.GearmanClient([gearman_worker.ovdm.get_gearman_server()])
 
@@ -356,12 +373,10 @@ def task_run_ship_to_shore_transfer(gearman_worker, current_job): # pylint: disa
         job_results['parts'].append({"partName": "Connection Test", "result": "Fail", "reason": results_obj['parts'][-1]['reason']})
         return json.dumps(job_results)
 
-    gearman_worker.send_job_status(current_job, 2, 10)
-
     logging.info("Transferring files")
     output_results = None
     if  gearman_worker.cruise_data_transfer['transferType'] == "4": # SSH Server
-        output_results = transfer_ssh_dest_dir(gearman_worker, current_job)
+        output_results = transfer_ssh_dest_dir(gearman_worker, progress)
     else:
         logging.error("Unknown Transfer Type")
         job_results['parts'].append({"partName": "Transfer Files", "result": "Fail", "reason": "Unknown transfer type"})
@@ -374,8 +389,11 @@ def task_run_ship_to_shore_transfer(gearman_worker, current_job): # pylint: disa
 
     logging.debug("Transfer completed successfully")
     job_results['files'] = output_results['files']
+    job_results['transferStats'] = output_results['stats']
     job_results['parts'].append({"partName": "Transfer Files", "result": "Pass"})
 
+    logging.info("%s file(s) transferred, %s bytes at %s MB/s", job_results['transferStats']['fileCount'], job_results['transferStats']['bytesTransferred'], job_results['transferStats']['throughput'])
+
     if len(job_results['files']['new']) > 0:
         logging.debug("%s file(s) added", len(job_results['files']['new']))
     if len(job_results['files']['updated']) > 0:
@@ -383,7 +401,7 @@ def task_run_ship_to_shore_transfer(gearman_worker, current_job): # pylint: disa
     if len(job_results['files']['exclude']) > 0:
         logging.debug("%s file(s) intentionally skipped", len(job_results['files']['exclude']))
 
-    gearman_worker.send_job_status(current_job, 9, 10)
+    progress.start_phase('post-processing')
 
     if job_results['files']['new'] or job_results['files']['updated']:
 
@@ -413,7 +431,7 @@ def task_run_ship_to_shore_transfer(gearman_worker, current_job): # pylint: disa
             job_results['parts'].append({"partName": "Set OpenVDM config file ownership/permissions", "result": "Fail", "reason": output_results['reason']})
             return json.dumps(job_results)
 
-    gearman_worker.send_job_status(current_job, 10, 10)
+    progress.complete()
 
     time.sleep(2)
 
@@ -462,8 +480,16 @@ if __name__ == "__main__":
         logging.warning("INT Signal Received")
         new_worker.quit_worker()
 
+    def sigusr1_handler(_signo, _stack_frame):
+        """
+        Signal Handler for USR1
+        """
+        logging.warning("USR1 Signal Received")
+        new_worker.retire_worker()
+
     signal.signal(signal.SIGQUIT, sigquit_handler)
     signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGUSR1, sigusr1_handler)
 
     logging.info("Registering worker tasks...")
 
@@ -6,12 +6,16 @@ FILE:  scheduler.py
 DESCRIPTION:  This program handles the scheduling of the transfer-related Gearman
     tasks.
 
-    USAGE: scheduler.py [--interval <interval>] <siteRoot>
+    USAGE: scheduler.py [--interval <interval>] [--jitter <jitter>] <siteRoot>
 
 ARGUMENTS: --interval <interval> The interval in minutes between transfer job
             submissions.  If this argument is not provided the default inteval
             is 5 minutes
 
+           --jitter <jitter> The maximum random offset in seconds applied to
+            each transfer's schedule so the jobs are not all submitted at the
+            same instant.
+
             <siteRoot> The base URL to the OpenVDM installation on the Shipboard
              Data Warehouse.
 
@@ -43,16 +47,382 @@ along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>
 
 import sys
 import time
+import heapq
+import random
 import argparse
 import json
 import logging
 from os.path import dirname, realpath
-from python3_gearman import GearmanClient
+from python3_gearman import GearmanAdminClient, GearmanClient, PRIORITY_LOW, PRIORITY_NONE
+from python3_gearman.constants import JOB_COMPLETE, JOB_UNKNOWN
 
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
+from server.lib.file_manifest import count_files
 from server.lib.openvdm import OpenVDM
 
+STARTUP_DELAY = 10 # seconds
+
+REFRESH_INTERVAL = 60 # seconds
+
+BACKPRESSURE_RETRY_DELAY = 60 # seconds
+
+OUTSTANDING_POLL_INTERVAL = 5 # seconds
+
+# python3_gearman does not read the socket at all with a poll_timeout of 0
+JOB_POLL_TIMEOUT = 0.01 # seconds
+
+SCHEDULED_TASKS = ['runCollectionSystemTransfer', 'runCruiseDataTransfer', 'runShipToShoreTransfer']
+
+
+class TransferScheduler():
+    """
+    Submits the transfer jobs on a fixed cadence.  Each transfer has its own
+    next-run deadline on the monotonic clock, held in a heap.  Deadlines
+    advance in whole intervals from the previous deadline so the schedule does
+    not drift with the time spent submitting jobs.  Each transfer is given a
+    random phase offset of up to jitter seconds so the jobs are not all
+    submitted at the same instant.
+
+    Jobs are submitted with a unique key per transfer so the Gearman server
+    coalesces them with a queued or running job for the same transfer, and
+    transfers the API reports as running are skipped.  While more than
+    queue_threshold jobs are waiting on the Gearman server the low-priority
+    transfers are held back.
+
+    Collection system transfers are scheduled adaptively.  Their jobs are
+    submitted in the foreground and the next run is scheduled from the job's
+    results: minInterval after a transfer that found new files (catch-up),
+    otherwise the transfer interval, doubled after each further run without
+    new files up to maxInterval.  maxInterval defaults to the transfer
+    interval so transfers only back off when it is configured.
+    """
+
+    def __init__(self, ovdm, interval, jitter, queue_threshold):
+
+        self.ovdm = ovdm
+        self.interval = interval
+        self.jitter = min(jitter, interval)
+        self.queue_threshold = queue_threshold
+        self.gm_client = GearmanClient([self.ovdm.get_gearman_server()])
+        self.gm_admin_client = GearmanAdminClient([self.ovdm.get_gearman_server()])
+
+        self.transfers = {}
+        self.deadlines = {}
+        self.cadences = {}
+        self.outstanding = {}
+        self.schedule = []
+        self.next_refresh = 0
+
+
+    def _build_transfers(self):
+        """
+        Return a dict of transfer key: job definition for every transfer that
+        should be scheduled
+        """
+
+        transfers = {}
+
+        for collection_system_transfer in self.ovdm.get_active_collection_system_transfers():
+            transfers['collectionSystemTransfer_' + str(collection_system_transfer['collectionSystemTransferID'])] = {
+                'task': "runCollectionSystemTransfer",
+                'longName': collection_system_transfer['longName'],
+                'priority': PRIORITY_NONE,
+                'running': collection_system_transfer['status'] == "1",
+                'adaptive': True,
+                'settings': self.ovdm.get_collection_system_transfer_settings(collection_system_transfer['name']),
+                'data': {
+                    'collectionSystemTransfer': {
+                        'collectionSystemTransferID': collection_system_transfer['collectionSystemTransferID']
+                    }
+                }
+            }
+
+        for cruise_data_transfer in self.ovdm.get_cruise_data_transfers():
+            transfers['cruiseDataTransfer_' + str(cruise_data_transfer['cruiseDataTransferID'])] = {
+                'task': "runCruiseDataTransfer",
+                'longName': cruise_data_transfer['longName'],
+                'priority': PRIORITY_LOW,
+                'running': cruise_data_transfer['status'] == "1",
+                'adaptive': False,
+                'data': {
+                    'cruiseDataTransfer': {
+                        'cruiseDataTransferID': cruise_data_transfer['cruiseDataTransferID']
+                    }
+                }
+            }
+
+        for required_cruise_data_transfer in self.ovdm.get_required_cruise_data_transfers():
+            if required_cruise_data_transfer['name'] == 'SSDW':
+                transfers['shipToShoreTransfer'] = {
+                    'task': "runShipToShoreTransfer",
+                    'longName': required_cruise_data_transfer['longName'],
+                    'priority': PRIORITY_LOW,
+                    'running': required_cruise_data_transfer['status'] == "1",
+                    'adaptive': False,
+                    'data': {}
+                }
+
+        return transfers
+
+
+    def refresh(self, now):
+        """
+        Re-read the transfers from the OpenVDM API.  New transfers are
+        scheduled within the jitter window, removed transfers are dropped from
+        the schedule.
+        """
+
+        try:
+            transfers = self._build_transfers()
+
+        except Exception as err:
+            logging.error("Unable to retrieve the transfers from the OpenVDM API")
+            logging.debug(str(err))
+            return
+
+        for key in transfers:
+            if key not in self.deadlines and key not in self.outstanding:
+                self._reschedule(key, now + random.uniform(0, self.jitter))
+
+        for key in list(self.deadlines.keys()):
+            if key not in transfers:
+                del self.deadlines[key]
+
+        for key in list(self.cadences.keys()):
+            if key not in transfers:
+                del self.cadences[key]
+
+        self.transfers = transfers
+
+
+    def get_waiting_jobs(self):
+        """
+        Return the number of transfer jobs waiting for a worker on the Gearman
+        server, or None if the status could not be retrieved
+        """
+
+        try:
+            return sum(max(int(task_status['queued']) - int(task_status['running']), 0) for task_status in self.gm_admin_client.get_status() if task_status['task'] in SCHEDULED_TASKS)
+
+        except Exception as err:
+            logging.warning("Unable to retrieve the job queue status from the Gearman server")
+            logging.debug(str(err))
+            return None
+
+
+    def _reschedule(self, key, deadline):
+        """
+        Set the next deadline for the transfer
+        """
+
+        self.deadlines[key] = deadline
+        heapq.heappush(self.schedule, (deadline, key))
+
+
+    def submit_due(self, now):
+        """
+        Submit the jobs for every transfer whose deadline has passed as a
+        single batch and schedule their next runs
+        """
+
+        due = []
+
+        while len(self.schedule) > 0 and self.schedule[0][0] <= now:
+            deadline, key = heapq.heappop(self.schedule)
+
+            # entry for a transfer that has been removed or re-scheduled
+            if self.deadlines.get(key) != deadline:
+                continue
+
+            due.append((deadline, key))
+
+        if len(due) == 0:
+            return
+
+        hold_back = False
+
+        if any(self.transfers[key]['priority'] == PRIORITY_LOW for _, key in due):
+            waiting_jobs = self.get_waiting_jobs()
+            hold_back = waiting_jobs is not None and waiting_jobs >= self.queue_threshold
+
+            if hold_back:
+                logging.warning("%s job(s) waiting on the Gearman server, holding back low-priority transfers", waiting_jobs)
+
+        jobs = []
+
+        for deadline, key in due:
+            transfer = self.transfers[key]
+
+            if hold_back and transfer['priority'] == PRIORITY_LOW:
+                logging.info("Holding back %s job for: %s", transfer['task'], transfer['longName'])
+                self._reschedule(key, now + BACKPRESSURE_RETRY_DELAY)
+                continue
+
+            if transfer['running']:
+                logging.info("Transfer in-progress, skipping %s job for: %s", transfer['task'], transfer['longName'])
+                self._reschedule(key, now + self._get_cadence(key) if transfer['adaptive'] else self._next_fixed_deadline(deadline, now))
+                continue
+
+            logging.info("Submitting %s job for: %s", transfer['task'], transfer['longName'])
+            jobs.append((key, {'task': transfer['task'], 'data': json.dumps(transfer['data']), 'unique': key, 'priority': transfer['priority']}))
+
+            # adaptive transfers are re-scheduled once their job completes
+            if transfer['adaptive']:
+                del self.deadlines[key]
+            else:
+                self._reschedule(key, self._next_fixed_deadline(deadline, now))
+
+        adaptive_jobs = [(key, job) for key, job in jobs if self.transfers[key]['adaptive']]
+        background_jobs = [job for key, job in jobs if not self.transfers[key]['adaptive']]
+
+        try:
+            if len(background_jobs) > 0:
+                self.gm_client.submit_multiple_jobs(background_jobs, background=True, wait_until_complete=False)
+
+        except Exception as err:
+            logging.error("Unable to submit %s job(s) to the Gearman server", len(background_jobs))
+            logging.debug(str(err))
+
+        try:
+            if len(adaptive_jobs) > 0:
+                job_requests = self.gm_client.submit_multiple_jobs([job for _, job in adaptive_jobs], background=False, wait_until_complete=False)
+                self.outstanding.update({key: job_request for (key, _), job_request in zip(adaptive_jobs, job_requests)})
+
+        except Exception as err:
+            logging.error("Unable to submit %s job(s) to the Gearman server", len(adaptive_jobs))
+            logging.debug(str(err))
+
+            for key, _ in adaptive_jobs:
+                self._reschedule(key, now + self._get_cadence(key))
+
+
+    def _next_fixed_deadline(self, deadline, now):
+        """
+        Return the next deadline for a transfer on the fixed cadence
+        """
+
+        next_deadline = deadline + self.interval
+        if next_deadline <= now:
+            # skip the runs missed while the scheduler was stalled
+            next_deadline += self.interval * ((now - next_deadline) // self.interval + 1)
+
+        return next_deadline
+
+
+    def _get_cadence_limits(self, key):
+        """
+        Return the (base, max) interval between runs of an adaptive transfer.
+        The base is the transfer interval, the max is maxInterval or the
+        transfer interval when maxInterval is not set.
+        """
+
+        settings = self.transfers[key]['settings']
+
+        max_cadence = max(settings['maxInterval'] if settings['maxInterval'] is not None else self.interval, settings['minInterval'])
+        base_cadence = min(max(self.interval, settings['minInterval']), max_cadence)
+
+        return base_cadence, max_cadence
+
+
+    def _get_cadence(self, key):
+        """
+        Return the current interval between runs of an adaptive transfer
+        """
+
+        if key not in self.cadences:
+            self.cadences[key] = self._get_cadence_limits(key)[0]
+
+        return self.cadences[key]
+
+
+    def _update_cadence(self, key, results_obj, now):
+        """
+        Schedule the next run of an adaptive transfer based on the results of
+        its last job
+        """
+
+        settings = self.transfers[key]['settings']
+        cadence = self._get_cadence(key)
+        base_cadence, max_cadence = self._get_cadence_limits(key)
+
+        try:
+            passed = results_obj['parts'][-1]['result'] == "Pass"
+            file_count = count_files(results_obj['files'], 'new') + count_files(results_obj['files'], 'updated')
+
+        except (TypeError, KeyError, IndexError):
+            passed = False
+            file_count = 0
+
+        if file_count > 0:
+            logging.info("%s file(s) transferred for %s, catching up", file_count, self.transfers[key]['longName'])
+            self.cadences[key] = settings['minInterval']
+
+        elif passed:
+            # back to the transfer interval after catching up, then back off
+            self.cadences[key] = base_cadence if cadence < base_cadence else min(cadence * 2, max_cadence)
+            logging.debug("No new files for %s, next run in %s seconds", self.transfers[key]['longName'], self.cadences[key])
+
+        self._reschedule(key, now + self.cadences[key])
+
+
+    def check_outstanding(self, now):
+        """
+        Check on the submitted adaptive transfer jobs and schedule the next
+        run of each completed transfer
+        """
+
+        if len(self.outstanding) == 0:
+            return
+
+        try:
+            self.gm_client.wait_until_jobs_completed(list(self.outstanding.values()), poll_timeout=JOB_POLL_TIMEOUT)
+
+        except Exception as err:
+            logging.error("Lost connection to the Gearman server while waiting for transfer jobs")
+            logging.debug(str(err))
+
+        for key, job_request in list(self.outstanding.items()):
+            if not job_request.complete and job_request.state != JOB_UNKNOWN:
+                continue
+
+            del self.outstanding[key]
+
+            if key not in self.transfers:
+                continue
+
+            try:
+                results_obj = json.loads(job_request.result) if job_request.state == JOB_COMPLETE else None
+            except (TypeError, ValueError):
+                results_obj = None
+
+            self._update_cadence(key, results_obj, now)
+
+
+    def run(self):
+        """
+        Submit the transfer jobs forever
+        """
+
+        while True:
+            now = time.monotonic()
+
+            if now >= self.next_refresh:
+                self.refresh(now)
+                self.next_refresh = now + REFRESH_INTERVAL
+
+            self.check_outstanding(now)
+            self.submit_due(now)
+
+            next_wake = min(self.next_refresh, self.schedule[0][0]) if len(self.schedule) > 0 else self.next_refresh
+
+            if len(self.outstanding) > 0:
+                next_wake = min(next_wake, now + OUTSTANDING_POLL_INTERVAL)
+            delay = max(next_wake - time.monotonic(), 0)
+
+            logging.debug("Waiting %.1f seconds until the next scheduled event", delay)
+            time.sleep(delay)
+
 
 if __name__ == "__main__":
 
@@ -60,6 +430,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='OpenVDM Data Transfer Scheduler')
     parser.add_argument('-i', '--interval', default=openVDM.get_transfer_interval(), metavar='interval', type=int, help='interval in minutes')
+    parser.add_argument('-j', '--jitter', default=30, metavar='jitter', type=int, help='maximum random offset in seconds')
     parser.add_argument('-v', '--verbosity', dest='verbosity',
                         default=0, action='count',
                         help='Increase output verbosity')
@@ -78,62 +449,8 @@ if __name__ == "__main__":
     logging.getLogger().setLevel(LOG_LEVELS[parsed_args.verbosity])
 
     logging.debug("Creating Geaman Client...")
-    gm_client = GearmanClient([openVDM.get_gearman_server()])
-
-    time.sleep(10)
-
-    while True:
-
-        CURRENT_SEC = 0
-        while True:
-            t = time.gmtime()
-            if CURRENT_SEC < t.tm_sec:
-                CURRENT_SEC = t.tm_sec
-                time.sleep(60-t.tm_sec)
-            else:
-                break
-
-        collection_system_transfers = openVDM.get_active_collection_system_transfers()
-        for collection_system_transfer in collection_system_transfers:
-            logging.info("Submitting collection system transfer job for: %s", collection_system_transfer['longName'])
-
-            gmData = {
-                'collectionSystemTransfer': {
-                    'collectionSystemTransferID': collection_system_transfer['collectionSystemTransferID']
-                }
-            }
-
-            completed_job_request = gm_client.submit_job("runCollectionSystemTransfer", json.dumps(gmData), background=True)
-
-            time.sleep(2)
-
-
-        cruise_data_transfers = openVDM.get_cruise_data_transfers()
-        for cruise_data_transfer in cruise_data_transfers:
-            logging.info("Submitting cruise data transfer job for: %s", cruise_data_transfer['longName'])
-
-            gmData = {
-                'cruiseDataTransfer': {
-                    'cruiseDataTransferID': cruise_data_transfer['cruiseDataTransferID']
-                }
-            }
-
-            completed_job_request = gm_client.submit_job("runCruiseDataTransfer", json.dumps(gmData), background=True)
-
-            time.sleep(2)
-
-        required_cruise_data_transfers = openVDM.get_required_cruise_data_transfers()
-        for required_cruise_data_transfer in required_cruise_data_transfers:
-            if required_cruise_data_transfer['name'] == 'SSDW':
-                logging.info("Submitting cruise data transfer job for: %s", required_cruise_data_transfer['longName'])
-
-                gmData = {
-                }
-
-                completed_job_request = gm_client.submit_job("runShipToShoreTransfer", json.dumps(gmData), background=True)
+    transfer_scheduler = TransferScheduler(openVDM, parsed_args.interval * 60, parsed_args.jitter, openVDM.get_scheduler_queue_threshold())
 
-            time.sleep(2)
+    time.sleep(STARTUP_DELAY)
 
-        delay = parsed_args.interval * 60 - len(collection_system_transfers) * 2 - len(cruise_data_transfers) * 2 - 2
-        logging.info("Waiting %s seconds until next round of tasks are queued", delay)
-        time.sleep(delay)
+    transfer_scheduler.run()
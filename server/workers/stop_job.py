@@ -176,15 +176,16 @@ def task_stop_job(gearman_worker, gearman_job):
                 job_results['parts'].append({"partName": "Stopped Job", "result": "Fail", "reason": "Error killing PID: {} --> {}".format(gearman_worker.job_info['pid'], err) })
 
         finally:
-            if gearman_worker.job_info['type'] == 'collectionSystemTransfer':
-                gearman_worker.ovdm.set_idle_collection_system_transfer(gearman_worker.job_info['id'])
-                gearman_worker.ovdm.send_msg("Manual Stop of transfer", gearman_worker.job_info['name'])
-            elif gearman_worker.job_info['type'] == 'cruiseDataTransfer':
-                gearman_worker.ovdm.set_idle_cruise_data_transfer(gearman_worker.job_info['id'])
-                gearman_worker.ovdm.send_msg("Manual Stop of transfer", gearman_worker.job_info['name'])
-            elif gearman_worker.job_info['type'] == 'task':
-                gearman_worker.ovdm.set_idle_task(gearman_worker.job_info['id'])
-                gearman_worker.ovdm.send_msg("Manual Stop of task", gearman_worker.job_info['name'])
+            with gearman_worker.ovdm.batch():
+                if gearman_worker.job_info['type'] == 'collectionSystemTransfer':
+                    gearman_worker.ovdm.set_idle_collection_system_transfer(gearman_worker.job_info['id'])
+                    gearman_worker.ovdm.send_msg("Manual Stop of transfer", gearman_worker.job_info['name'])
+                elif gearman_worker.job_info['type'] == 'cruiseDataTransfer':
+                    gearman_worker.ovdm.set_idle_cruise_data_transfer(gearman_worker.job_info['id'])
+                    gearman_worker.ovdm.send_msg("Manual Stop of transfer", gearman_worker.job_info['name'])
+                elif gearman_worker.job_info['type'] == 'task':
+                    gearman_worker.ovdm.set_idle_task(gearman_worker.job_info['id'])
+                    gearman_worker.ovdm.send_msg("Manual Stop of task", gearman_worker.job_info['name'])
 
             job_results['parts'].append({"partName": "Stopped Job", "result": "Pass"})
     else:
@@ -47,7 +47,10 @@ import python3_gearman
 
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
+from server.lib.connection_tests import ConnectionTestCache, build_test_fingerprint, build_test_key
 from server.lib.openvdm import OpenVDM
+from server.lib.smb_mounts import SMBMountManager, build_active_smb_shares
+from server.lib.ssh_control import SSHControlManager
 
 def build_dest_dir(gearman_worker):
     """
@@ -100,10 +103,6 @@ def test_smb_source_dir(gearman_worker):
 
     return_val = []
 
-    # Create temp directory
-    tmpdir = tempfile.mkdtemp()
-
-
     # Verify the server exists
     server_test_command = ['smbclient', '-L', gearman_worker.collection_system_transfer['smbServer'], '-W', gearman_worker.collection_system_transfer['smbDomain'], '-m', 'SMB2', '-g', '-N'] if gearman_worker.collection_system_transfer['smbUser'] == 'guest' else ['smbclient', '-L', gearman_worker.collection_system_transfer['smbServer'], '-W', gearman_worker.collection_system_transfer['smbDomain'], '-m', 'SMB2', '-g', '-U', gearman_worker.collection_system_transfer['smbUser'] + '%' + gearman_worker.collection_system_transfer['smbPass']]
     logging.debug('SMB Server test command: %s', ' '.join(server_test_command))
@@ -135,36 +134,22 @@ def test_smb_source_dir(gearman_worker):
 
     return_val.append({"partName": "SMB Server", "result": "Pass"})
 
-    # Create mountpoint
-    mntpoint = os.path.join(tmpdir, 'mntpoint')
-    os.mkdir(mntpoint, 0o755)
-
-
     # Mount SMB Share
-    mount_command = ['sudo', 'mount', '-t', 'cifs', gearman_worker.collection_system_transfer['smbServer'], mntpoint, '-o', 'ro'+',guest'+',domain='+gearman_worker.collection_system_transfer['smbDomain']+',vers='+vers] if gearman_worker.collection_system_transfer['smbUser'] == 'guest' else ['sudo', 'mount', '-t', 'cifs', gearman_worker.collection_system_transfer['smbServer'], mntpoint, '-o', 'ro'+',username='+gearman_worker.collection_system_transfer['smbUser']+',password='+gearman_worker.collection_system_transfer['smbPass']+',domain='+gearman_worker.collection_system_transfer['smbDomain']+',vers='+vers]
-
-    logging.debug("Mount command: %s", ' '.join(mount_command))
-
-    proc = subprocess.run(mount_command, capture_output=True, check=False)
+    mount_results = gearman_worker.smb_mounts.acquire(gearman_worker.collection_system_transfer['smbServer'], gearman_worker.collection_system_transfer['smbDomain'], gearman_worker.collection_system_transfer['smbUser'], gearman_worker.collection_system_transfer['smbPass'], 'ro', vers, active_shares=build_active_smb_shares(gearman_worker.ovdm))
 
-    if proc.returncode != 0:
+    if not mount_results['verdict']:
         logging.warning("Connection test failed")
         return_val.extend([
             {"partName": "SMB Share", "result": "Fail", "reason": "Could not connect to SMB Share: {} as {}".format( gearman_worker.collection_system_transfer['smbServer'],  gearman_worker.collection_system_transfer['smbUser'])},
             {"partName": "Source Directory", "result": "Fail", "reason": "Could not connect to SMB Share: {} as {}".format( gearman_worker.collection_system_transfer['smbServer'],  gearman_worker.collection_system_transfer['smbUser'])}
         ])
 
-        # Unmount SMB Share
-        if os.path.ismount(mntpoint):
-            subprocess.run(['sudo', 'umount', mntpoint], check=False)
-
-        # Cleanup
-        shutil.rmtree(tmpdir)
-
         return return_val
 
     return_val.append({"partName": "SMB Share", "result": "Pass"})
 
+    mntpoint = mount_results['mntpoint']
+
     source_dir = os.path.join(mntpoint, build_source_dir(gearman_worker))
 
     logging.debug('Source Dir: %s', source_dir)
@@ -174,13 +159,6 @@ def test_smb_source_dir(gearman_worker):
         logging.warning("Source Directory Test Failed")
         return_val.append({"partName": "Source Directory", "result": "Fail", "reason": "Unable to find source directory: {} within the SMB Share: {}".format(source_dir, gearman_worker.collection_system_transfer['smbServer'])})
 
-    # Unmount SMB Share
-    if os.path.ismount(mntpoint):
-        subprocess.run(['sudo', 'umount', mntpoint], check=False)
-
-    # Cleanup
-    shutil.rmtree(tmpdir)
-
     return return_val
 
 
@@ -259,7 +237,7 @@ def test_ssh_source_dir(gearman_worker):
     """
     return_val = []
 
-    server_test_command = ['ssh', gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PasswordAuthentication=no', 'ls'] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'ssh', gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls']
+    server_test_command = ['ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']) + [gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PasswordAuthentication=no', 'ls'] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']) + [gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls']
 
     logging.debug('Server test command: %s', ' '.join(server_test_command))
 
@@ -279,7 +257,7 @@ def test_ssh_source_dir(gearman_worker):
     source_dir = build_source_dir(gearman_worker)
     logging.debug('Source Dir: %s', source_dir)
 
-    source_test_command = ['ssh', gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PasswordAuthentication=no', 'ls', source_dir] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'ssh', gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls', source_dir]
+    source_test_command = ['ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']) + [gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PasswordAuthentication=no', 'ls', source_dir] if gearman_worker.collection_system_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.collection_system_transfer['sshPass'], 'ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.collection_system_transfer['sshUser'], gearman_worker.collection_system_transfer['sshServer']) + [gearman_worker.collection_system_transfer['sshServer'], '-l', gearman_worker.collection_system_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls', source_dir]
 
     logging.debug('Source test command: %s', ' '.join(source_test_command))
 
@@ -320,6 +298,9 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
     def __init__(self):
         self.stop = False
         self.ovdm = OpenVDM()
+        self.ssh_control = SSHControlManager(self.ovdm.get_ssh_control_persist())
+        self.smb_mounts = SMBMountManager()
+        self.connection_tests = ConnectionTestCache(self.ovdm.get_connection_test_ttl())
         self.cruise_id = self.ovdm.get_cruise_id()
         self.lowering_id = self.ovdm.get_lowering_id()
         self.collection_system_transfer = {}
@@ -417,6 +398,8 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
         """
         self.stop = True
         logging.warning("Quitting worker...")
+        self.ssh_control.close_all()
+        self.smb_mounts.release()
         self.shutdown()
 
 
@@ -460,6 +443,9 @@ def task_test_collection_system_transfer(gearman_worker, current_job):
     if verdict:
         job_results['parts'].append({"partName": "Final Verdict", "result": "Pass"})
 
+    if 'collectionSystemTransferID' in gearman_worker.collection_system_transfer:
+        gearman_worker.connection_tests.put(build_test_key(gearman_worker.collection_system_transfer), build_test_fingerprint(gearman_worker.collection_system_transfer, gearman_worker.cruise_id, gearman_worker.lowering_id), job_results)
+
     gearman_worker.send_job_status(current_job, 4, 4)
 
     return json.dumps(job_results)
@@ -46,6 +46,8 @@ import python3_gearman
 sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
 
 from server.lib.openvdm import OpenVDM
+from server.lib.smb_mounts import SMBMountManager, build_active_smb_shares
+from server.lib.ssh_control import SSHControlManager
 
 def write_test(dest_dir):
     """
@@ -112,9 +114,6 @@ def test_smb_dest_dir(gearman_worker):
 
     return_val = []
 
-    # Create temp directory
-    tmpdir = tempfile.mkdtemp()
-
     # Verify the server exists
     server_test_command = ['smbclient', '-L', gearman_worker.cruise_data_transfer['smbServer'], '-W', gearman_worker.cruise_data_transfer['smbDomain'], '-m', 'SMB2', '-g', '-N'] if gearman_worker.cruise_data_transfer['smbUser'] == 'guest' else ['smbclient', '-L', gearman_worker.cruise_data_transfer['smbServer'], '-W', gearman_worker.cruise_data_transfer['smbDomain'], '-m', 'SMB2', '-g', '-U', gearman_worker.cruise_data_transfer['smbUser'] + '%' + gearman_worker.cruise_data_transfer['smbPass']]
     logging.debug("Server test command: %s", ' '.join(server_test_command))
@@ -146,31 +145,22 @@ def test_smb_dest_dir(gearman_worker):
 
     return_val.append({"partName": "SMB Server", "result": "Pass"})
 
-    # Create mountpoint
-    mntpoint = os.path.join(tmpdir, 'mntpoint')
-    os.mkdir(mntpoint, 0o755)
-
     # Mount SMB Share
-    mount_command = ['mount', '-t', 'cifs', gearman_worker.cruise_data_transfer['smbServer'], mntpoint, '-o', 'rw'+',guest'+',domain='+gearman_worker.cruise_data_transfer['smbDomain']+',vers='+vers] if gearman_worker.cruise_data_transfer['smbUser'] == 'guest' else ['mount', '-t', 'cifs', gearman_worker.cruise_data_transfer['smbServer'], mntpoint, '-o', 'rw'+',username='+gearman_worker.cruise_data_transfer['smbUser']+',password='+gearman_worker.cruise_data_transfer['smbPass']+',domain='+gearman_worker.cruise_data_transfer['smbDomain']+',vers='+vers]
+    mount_results = gearman_worker.smb_mounts.acquire(gearman_worker.cruise_data_transfer['smbServer'], gearman_worker.cruise_data_transfer['smbDomain'], gearman_worker.cruise_data_transfer['smbUser'], gearman_worker.cruise_data_transfer['smbPass'], 'rw', vers, active_shares=build_active_smb_shares(gearman_worker.ovdm))
 
-    logging.debug("Mount command: %s", ' '.join(mount_command))
-
-    proc = subprocess.run(mount_command, capture_output=True, check=False)
-
-    if proc.returncode != 0:
+    if not mount_results['verdict']:
         return_val.extend([
             {"partName": "SMB Share", "result": "Fail", "reason": "Could not connect to SMB Share: {} as {}".format(gearman_worker.cruise_data_transfer['smbServer'], gearman_worker.cruise_data_transfer['smbUser'])},
             {"partName": "Destination Directory", "result": "Fail", "reason": "Could not connect to SMB Share: {} as {}".format(gearman_worker.cruise_data_transfer['smbServer'], gearman_worker.cruise_data_transfer['smbUser'])},
             {"partName": "Write Test", "result": "Fail", "reason": "Could not connect to SMB Share: {} as {}".format(gearman_worker.cruise_data_transfer['smbServer'], gearman_worker.cruise_data_transfer['smbUser'])}
         ])
 
-        # Cleanup
-        shutil.rmtree(tmpdir)
-
         return return_val
 
     return_val.append({"partName": "SMB Share", "result": "Pass"})
 
+    mntpoint = mount_results['mntpoint']
+
     dest_dir = os.path.join(mntpoint, gearman_worker.cruise_data_transfer['destDir'])
     if not os.path.isdir(dest_dir):
         return_val.append({"partName": "Destination Directory", "result": "Fail", "reason": "Unable to find destination directory: {} within the SMB Share: {}".format(gearman_worker.cruise_data_transfer['destDir'], gearman_worker.cruise_data_transfer['smbServer'])})
@@ -184,14 +174,6 @@ def test_smb_dest_dir(gearman_worker):
         else:
             return_val.append({"partName": "Write Test", "result": "Pass"})
 
-
-    # Unmount SMB Share
-    if os.path.ismount(mntpoint):
-        subprocess.call(['sudo', 'umount', mntpoint])
-
-    # Cleanup
-    shutil.rmtree(tmpdir)
-
     return return_val
 
 
@@ -310,7 +292,7 @@ def test_ssh_dest_dir(gearman_worker):
 
     return_val = []
 
-    server_test_command = ['ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'ls'] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls']
+    server_test_command = ['ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'ls'] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls']
 
     logging.debug("Connection test command: %s", ' '.join(server_test_command))
 
@@ -328,7 +310,7 @@ def test_ssh_dest_dir(gearman_worker):
 
     dest_dir = gearman_worker.cruise_data_transfer['destDir']
 
-    dest_test_command = ['ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'ls', dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls', dest_dir]
+    dest_test_command = ['ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'ls', dest_dir] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'ls', dest_dir]
 
     logging.debug("Destination test command: %s", dest_test_command)
 
@@ -344,7 +326,7 @@ def test_ssh_dest_dir(gearman_worker):
 
     return_val.append({"partName": "Destination Directory", "result": "Pass"})
 
-    write_test_command = ['ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'touch ' + os.path.join(dest_dir, 'writeTest.txt')] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'touch ' + os.path.join(dest_dir, 'writeTest.txt')]
+    write_test_command = ['ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'touch ' + os.path.join(dest_dir, 'writeTest.txt')] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'touch ' + os.path.join(dest_dir, 'writeTest.txt')]
 
     logging.debug("Write test command: %s", write_test_command)
 
@@ -355,7 +337,7 @@ def test_ssh_dest_dir(gearman_worker):
 
         return return_val
 
-    write_cleanup_command = ['ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'rm ' + os.path.join(dest_dir, 'writeTest.txt')] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh', gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'rm ' + os.path.join(dest_dir, 'writeTest.txt')]
+    write_cleanup_command = ['ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', 'PasswordAuthentication=no', 'rm ' + os.path.join(dest_dir, 'writeTest.txt')] if gearman_worker.cruise_data_transfer['sshUseKey'] == '1' else ['sshpass', '-p', gearman_worker.cruise_data_transfer['sshPass'], 'ssh'] + gearman_worker.ssh_control.ssh_options(gearman_worker.cruise_data_transfer['sshUser'], gearman_worker.cruise_data_transfer['sshServer']) + [gearman_worker.cruise_data_transfer['sshServer'], '-l', gearman_worker.cruise_data_transfer['sshUser'], '-o', 'StrictHostKeyChecking=no', '-o', 'PubkeyAuthentication=no', 'rm ' + os.path.join(dest_dir, 'writeTest.txt')]
 
     logging.debug("Write test cleanup command: %s", ' '.join(write_cleanup_command))
 
@@ -389,6 +371,8 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
     def __init__(self):
         self.stop = False
         self.ovdm = OpenVDM()
+        self.ssh_control = SSHControlManager(self.ovdm.get_ssh_control_persist())
+        self.smb_mounts = SMBMountManager()
         self.cruise_id = self.ovdm.get_cruise_id()
         self.cruise_data_transfer = {}
         self.shipboard_data_warehouse_config = self.ovdm.get_shipboard_data_warehouse_config()
@@ -481,6 +465,8 @@ class OVDMGearmanWorker(python3_gearman.GearmanWorker):
         """
         self.stop = True
         logging.warning("Quitting worker...")
+        self.ssh_control.close_all()
+        self.smb_mounts.release()
         self.shutdown()
 
 
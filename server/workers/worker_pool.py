@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+
+FILE:  worker_pool.py
+
+DESCRIPTION:  This program runs pools of OpenVDM worker processes.  The number
+    of processes in each pool is adjusted between the pool's minimum and
+    maximum based on the number of jobs queued on the Gearman server for the
+    pool's tasks.  The pools are defined in the workerPools section of
+    openvdm.yaml.
+
+USAGE: worker_pool.py [--interval <interval>] [--scale-down-delay <delay>]
+
+ARGUMENTS: --interval <interval> The interval in seconds between checks of the
+            Gearman job queue.
+
+           --scale-down-delay <delay> The number of seconds the queue must
+            stay below the number of running processes before processes are
+            retired.
+
+     BUGS:
+    NOTES: Processes are retired with SIGUSR1 and exit once their current job
+           is complete.  The pooled programs should be removed from the
+           openvdm supervisor group while worker_pool.py is running.
+   AUTHOR:  Webb Pinner
+  COMPANY:  Capable Solutions
+  VERSION:  2.5
+  CREATED:  2021-06-01
+ REVISION:  2021-06-01
+
+LICENSE INFO: Open Vessel Data Management v2.5 (OpenVDMv2)
+Copyright (C) OceanDataRat.org 2021
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/gpl-3.0.html>.
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import logging
+import subprocess
+from os.path import dirname, realpath
+from python3_gearman import GearmanAdminClient
+
+sys.path.append(dirname(dirname(dirname(realpath(__file__)))))
+
+from server.lib.openvdm import OpenVDM
+
+INSTALL_ROOT = dirname(dirname(dirname(realpath(__file__))))
+
+# nice --> scheduling priority of the pool's processes
+# limit --> maximum number of processes shared by all pools of the class, None
+#     for no limit
+RESOURCE_CLASSES = {
+    'io': {'nice': 0, 'limit': None},
+    'cpu': {'nice': 10, 'limit': os.cpu_count() or 1}
+}
+
+DEFAULT_RESOURCE_CLASS = 'io'
+
+
+class WorkerPool():
+    """
+    A pool of processes running the same worker script
+    """
+
+    def __init__(self, pool_config, verbosity):
+
+        self.name = pool_config['name']
+        self.script = os.path.join(INSTALL_ROOT, pool_config['script'])
+        self.tasks = pool_config['tasks']
+        self.resource_class = pool_config.get('resourceClass', DEFAULT_RESOURCE_CLASS)
+        self.min_workers = int(pool_config.get('minWorkers', 1))
+        self.max_workers = max(int(pool_config.get('maxWorkers', self.min_workers)), self.min_workers)
+        self.verbosity = verbosity
+
+        if self.resource_class not in RESOURCE_CLASSES:
+            logging.warning("Unknown resource class for the %s pool: %s, using %s", self.name, self.resource_class, DEFAULT_RESOURCE_CLASS)
+            self.resource_class = DEFAULT_RESOURCE_CLASS
+
+        self.procs = []
+        self.retiring = []
+        self.below_target_since = None
+
+
+    def reap(self):
+        """
+        Remove the processes that have exited
+        """
+
+        for proc in [proc for proc in self.procs if proc.poll() is not None]:
+            logging.warning("%s worker (pid: %s) exited unexpectedly with code %s", self.name, proc.pid, proc.returncode)
+            self.procs.remove(proc)
+
+        for proc in [proc for proc in self.retiring if proc.poll() is not None]:
+            logging.info("%s worker (pid: %s) retired", self.name, proc.pid)
+            self.retiring.remove(proc)
+
+
+    def spawn(self):
+        """
+        Start a new worker process, returns whether the process was started
+        """
+
+        command = [sys.executable, self.script] + ['-v'] * self.verbosity
+
+        nice = RESOURCE_CLASSES[self.resource_class]['nice']
+        if nice > 0:
+            command = ['nice', '-n', str(nice)] + command
+
+        logging.debug("Starting %s worker: %s", self.name, ' '.join(command))
+
+        try:
+            proc = subprocess.Popen(command, cwd=INSTALL_ROOT)
+        except OSError as err:
+            logging.error("Unable to start %s worker: %s", self.name, str(err))
+            return False
+
+        logging.info("Started %s worker (pid: %s)", self.name, proc.pid)
+        self.procs.append(proc)
+
+        return True
+
+
+    def retire(self):
+        """
+        Retire the most recently started worker process once its current job is
+        complete
+        """
+
+        proc = self.procs.pop()
+        logging.info("Retiring %s worker (pid: %s)", self.name, proc.pid)
+        proc.send_signal(signal.SIGUSR1)
+        self.retiring.append(proc)
+
+
+    def scale(self, target, scale_down_delay):
+        """
+        Start or retire worker processes to reach the target number of
+        processes.  Processes are only retired once the target has been below
+        the number of running processes for scale_down_delay seconds.
+        """
+
+        while len(self.procs) < target:
+            if not self.spawn():
+                break
+
+        if len(self.procs) <= target:
+            self.below_target_since = None
+            return
+
+        if self.below_target_since is None:
+            self.below_target_since = time.monotonic()
+            return
+
+        if time.monotonic() - self.below_target_since < scale_down_delay:
+            return
+
+        while len(self.procs) > target:
+            self.retire()
+
+        self.below_target_since = None
+
+
+    def stop(self):
+        """
+        Stop all worker processes
+        """
+
+        for proc in self.procs + self.retiring:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGINT)
+
+        for proc in self.procs + self.retiring:
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                logging.warning("%s worker (pid: %s) did not stop, killing", self.name, proc.pid)
+                proc.kill()
+
+        self.procs = []
+        self.retiring = []
+
+
+class WorkerPoolManager():
+    """
+    Sizes the worker pools based on the number of queued jobs for each pool's
+    tasks
+    """
+
+    def __init__(self, ovdm, verbosity):
+
+        self.ovdm = ovdm
+        self.admin_client = GearmanAdminClient([self.ovdm.get_gearman_server()])
+        self.pools = [WorkerPool(pool_config, verbosity) for pool_config in self.ovdm.get_worker_pools()]
+        self.running = True
+
+
+    def get_queue_depths(self):
+        """
+        Return a dict of task: number of queued + running jobs, or None if the
+        status could not be retrieved from the Gearman server
+        """
+
+        try:
+            return {task_status['task']: int(task_status['queued']) for task_status in self.admin_client.get_status()}
+
+        except Exception as err:
+            logging.error("Unable to retrieve the job queue status from the Gearman server")
+            logging.debug(str(err))
+            return None
+
+
+    def build_targets(self, queue_depths):
+        """
+        Return the target number of processes for each pool.  Every pool gets
+        at least its minimum, the remaining capacity of each resource class is
+        handed out to the pools with the most queued jobs first.
+        """
+
+        targets = {}
+        demands = {}
+
+        for pool in self.pools:
+            demand = sum(queue_depths.get(task, 0) for task in pool.tasks)
+            targets[pool.name] = pool.min_workers
+            demands[pool.name] = min(max(demand, pool.min_workers), pool.max_workers)
+
+        for resource_class, class_config in RESOURCE_CLASSES.items():
+            class_pools = sorted([pool for pool in self.pools if pool.resource_class == resource_class], key=lambda pool: demands[pool.name] - targets[pool.name], reverse=True)
+
+            available = None if class_config['limit'] is None else class_config['limit'] - sum(targets[pool.name] for pool in class_pools)
+
+            for pool in class_pools:
+                extra = demands[pool.name] - targets[pool.name]
+
+                if available is not None:
+                    extra = max(min(extra, available), 0)
+                    available -= extra
+
+                targets[pool.name] += extra
+
+        return targets
+
+
+    def run(self, interval, scale_down_delay):
+        """
+        Manage the worker pools until stopped
+        """
+
+        if len(self.pools) == 0:
+            logging.warning("No worker pools defined in the workerPools section of the configuration file")
+
+        for pool in self.pools:
+            logging.info("Pool: %s, tasks: %s, %s class, %s-%s workers", pool.name, ', '.join(pool.tasks), pool.resource_class, pool.min_workers, pool.max_workers)
+            pool.scale(pool.min_workers, scale_down_delay)
+
+        while self.running:
+
+            for pool in self.pools:
+                pool.reap()
+
+            queue_depths = self.get_queue_depths()
+
+            if queue_depths is not None:
+                targets = self.build_targets(queue_depths)
+
+                for pool in self.pools:
+                    pool.scale(targets[pool.name], scale_down_delay)
+
+            else:
+                for pool in self.pools:
+                    pool.scale(max(len(pool.procs), pool.min_workers), scale_down_delay)
+
+            time.sleep(interval)
+
+        logging.info("Stopping worker pools")
+
+        for pool in self.pools:
+            pool.stop()
+
+
+    def stop(self):
+        """
+        Stop managing the worker pools
+        """
+
+        self.running = False
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='OpenVDM Worker Pool Manager')
+    parser.add_argument('--interval', default=5, metavar='interval', type=int, help='seconds between job queue checks')
+    parser.add_argument('--scale-down-delay', default=60, metavar='scale_down_delay', type=int, help='seconds before idle workers are retired')
+    parser.add_argument('-v', '--verbosity', dest='verbosity',
+                        default=0, action='count',
+                        help='Increase output verbosity')
+
+    parsed_args = parser.parse_args()
+
+    ############################
+    # Set up logging before we do any other argument parsing (so that we
+    # can log problems with argument parsing).
+
+    LOGGING_FORMAT = '%(asctime)-15s %(levelname)s - %(message)s'
+    logging.basicConfig(format=LOGGING_FORMAT)
+
+    LOG_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+    parsed_args.verbosity = min(parsed_args.verbosity, max(LOG_LEVELS))
+    logging.getLogger().setLevel(LOG_LEVELS[parsed_args.verbosity])
+
+    logging.debug("Creating Worker Pool Manager...")
+    worker_pool_manager = WorkerPoolManager(OpenVDM(), parsed_args.verbosity)
+
+    def sigint_handler(_signo, _stack_frame):
+        """
+        Signal Handler for INT and TERM
+        """
+        logging.warning("Stop Signal Received")
+        worker_pool_manager.stop()
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGTERM, sigint_handler)
+
+    worker_pool_manager.run(parsed_args.interval, parsed_args.scale_down_delay)
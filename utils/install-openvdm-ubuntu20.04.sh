@@ -166,7 +166,7 @@ function install_packages {
     apt-get update
 
     apt install -y openssh-server sshpass rsync curl git samba smbclient \
-        cifs-utils gearman-job-server libgearman-dev nodejs libnode-dev \
+        cifs-utils inotify-tools gearman-job-server libgearman-dev nodejs libnode-dev \
         node-gyp npm python3 python3-dev python3-pip python3-venv libgdal-dev \
         gdal-bin libgeos-dev supervisor mysql-server mysql-client ntp \
         apache2 libapache2-mod-wsgi-py3 libapache2-mod-php7.3 php7.3 php7.3-cli \
@@ -282,6 +282,16 @@ autostart=true
 autorestart=true
 stopsignal=INT
 
+[program:directory_watcher]
+command=${VENV_BIN}/python server/workers/directory_watcher.py
+directory=${INSTALL_ROOT}/openvdm
+redirect_stderr=true
+stdout_logfile=/var/log/openvdm/directory_watcher.log
+user=root
+autostart=false
+autorestart=true
+stopsignal=INT
+
 [program:lowering]
 command=${VENV_BIN}/python server/workers/lowering.py
 directory=${INSTALL_ROOT}/openvdm
@@ -418,8 +428,19 @@ autostart=true
 autorestart=true
 stopsignal=INT
 
+[program:worker_pool]
+command=${VENV_BIN}/python server/workers/worker_pool.py
+directory=${INSTALL_ROOT}/openvdm
+redirect_stderr=true
+stdout_logfile=/var/log/openvdm/worker_pool.log
+user=root
+autostart=false
+autorestart=true
+stopsignal=INT
+stopwaitsecs=60
+
 [group:openvdm]
-programs=cruise,cruise_directory,data_dashboard,lowering,lowering_directory,md5_summary,post_hooks,reboot_reset,run_collection_system_transfer,run_cruise_data_transfer,run_ship_to_shore_transfer,scheduler,size_cacher,stop_job,test_collection_system_transfer,test_cruise_data_transfer
+programs=cruise,cruise_directory,data_dashboard,directory_watcher,lowering,lowering_directory,md5_summary,post_hooks,reboot_reset,run_collection_system_transfer,run_cruise_data_transfer,run_ship_to_shore_transfer,scheduler,size_cacher,stop_job,test_collection_system_transfer,test_cruise_data_transfer,worker_pool
 
 EOF
     echo "Starting new supervisor processes"
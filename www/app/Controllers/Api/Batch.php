@@ -0,0 +1,130 @@
+<?php
+/*
+ * api/batch - RESTful api interface for applying several OpenVDM status
+ * updates in a single request.
+ *
+ * @license   http://opensource.org/licenses/GPL-3.0
+ * @author Webb Pinner - oceandatarat@gmail.com - http://www.oceandatarat.org
+ * @version 2.5
+ * @date 2021-06-01
+ */
+
+namespace Controllers\Api;
+use Core\Controller;
+
+class Batch extends Controller {
+
+    private $_tasksModel;
+    private $_collectionSystemTransfersModel;
+    private $_cruiseDataTransfersModel;
+    private $_messageModel;
+    private $_gearmanModel;
+
+    public function __construct(){
+        $this->_tasksModel = new \Models\Config\Tasks();
+        $this->_collectionSystemTransfersModel = new \Models\Config\CollectionSystemTransfers();
+        $this->_cruiseDataTransfersModel = new \Models\Config\CruiseDataTransfers();
+        $this->_messageModel = new \Models\Config\Messages();
+        $this->_gearmanModel = new \Models\Api\Gearman();
+    }
+
+    // update - apply a JSON encoded list of operations, each operation is an
+    // object with an 'op' name, an optional 'id' and optional 'data'.  The
+    // operations are applied in order, the status of each is returned.
+    public function update(){
+
+        $return = array();
+
+        if(!isset($_POST['operations'])){
+            $return['status'] = 'error';
+            $return['message'] = 'missing POST data';
+            echo json_encode($return);
+            return;
+        }
+
+        $operations = json_decode($_POST['operations'], true);
+
+        if(!is_array($operations)){
+            $return['status'] = 'error';
+            $return['message'] = 'invalid operations';
+            echo json_encode($return);
+            return;
+        }
+
+        $return['status'] = 'success';
+        $return['results'] = array();
+
+        foreach($operations as $operation) {
+            $result = $this->_applyOperation($operation);
+            if($result['status'] != 'success'){
+                $return['status'] = 'error';
+            }
+            array_push($return['results'], $result);
+        }
+
+        echo json_encode($return);
+    }
+
+    private function _applyOperation($operation){
+
+        $id = isset($operation['id']) ? $operation['id'] : null;
+        $data = isset($operation['data']) && is_array($operation['data']) ? $operation['data'] : array();
+        $op = isset($operation['op']) ? $operation['op'] : '';
+
+        switch($op) {
+            case 'setErrorTask':
+                $this->_tasksModel->setErrorTask($id);
+                break;
+            case 'setRunningTask':
+                if(!isset($data['jobPid'])){
+                    return array('status' => 'error', 'message' => 'missing jobPid');
+                }
+                $this->_tasksModel->setRunningTask($id, $data['jobPid']);
+                break;
+            case 'setIdleTask':
+                $this->_tasksModel->setIdleTask($id);
+                break;
+            case 'setErrorCollectionSystemTransfer':
+                $this->_collectionSystemTransfersModel->setErrorCollectionSystemTransfer($id);
+                break;
+            case 'setRunningCollectionSystemTransfer':
+                if(!isset($data['jobPid'])){
+                    return array('status' => 'error', 'message' => 'missing jobPid');
+                }
+                $this->_collectionSystemTransfersModel->setRunningCollectionSystemTransfer($id, $data['jobPid']);
+                break;
+            case 'setIdleCollectionSystemTransfer':
+                $this->_collectionSystemTransfersModel->setIdleCollectionSystemTransfer($id);
+                break;
+            case 'setErrorCruiseDataTransfer':
+                $this->_cruiseDataTransfersModel->setErrorCruiseDataTransfer($id);
+                break;
+            case 'setRunningCruiseDataTransfer':
+                if(!isset($data['jobPid'])){
+                    return array('status' => 'error', 'message' => 'missing jobPid');
+                }
+                $this->_cruiseDataTransfersModel->setRunningCruiseDataTransfer($id, $data['jobPid']);
+                break;
+            case 'setIdleCruiseDataTransfer':
+                $this->_cruiseDataTransfersModel->setIdleCruiseDataTransfer($id);
+                break;
+            case 'newJob':
+                if(!isset($data['jobPid'])){
+                    return array('status' => 'error', 'message' => 'missing jobPid');
+                }
+                $this->_gearmanModel->insertJob(array('jobHandle' => $id, 'jobPid' => $data['jobPid'], 'jobName' => (isset($data['jobName']) ? $data['jobName'] : $id)));
+                break;
+            case 'newMessage':
+                if(!isset($data['messageTitle'])){
+                    return array('status' => 'error', 'message' => 'missing messageTitle');
+                }
+                $this->_messageModel->insertMessage(array('messageTitle' => $data['messageTitle'], 'messageBody' => (isset($data['messageBody']) ? $data['messageBody'] : '')));
+                break;
+            default:
+                return array('status' => 'error', 'message' => 'unknown operation: ' . $op);
+        }
+
+        return array('status' => 'success');
+    }
+
+}
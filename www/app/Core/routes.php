@@ -203,6 +203,8 @@ Router::any('api/gearman/getJobs', 'Controllers\Api\Gearman@getJobs');
 Router::any('api/gearman/getJob/(:num)', 'Controllers\Api\Gearman@getJob');
 Router::any('api/gearman/clearAllJobsFromDB', 'Controllers\Api\Gearman@clearAllJobsFromDB');
 
+Router::post('api/batch/update', 'Controllers\Api\Batch@update');
+
 Router::any('', 'Controllers\Welcome@index');
 /* Module routes. */
 $hooks = Hooks::get();